@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""Generate a synthetic RIRIS dataset and stream it into the backend table.
+
+Items match what the files API writes (file records plus one usage item per user), with
+heavy-tailed per-user file counts and sizes and a configurable status mix. Users are
+split across worker processes; each worker writes through its own batch_writer, which
+re-sends unprocessed items, and the client retries throttling with adaptive backoff.
+Output is deterministic for a given --seed, so datasets can be rebuilt exactly.
+
+    # 10M-ish items into DynamoDB Local (table created from template.yaml)
+    python scripts/generate-ddb-test-data.py --endpoint-url http://localhost:8000 \\
+        --create-table --users 100000 --files-per-user 100 --workers 8
+
+    # measure the generator alone
+    python scripts/generate-ddb-test-data.py --users 10000 --dry-run
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+BACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+S3_PREFIX = "files"
+USAGE_SK = "usage"
+USAGE_STATUSES = ("uploading", "ready")
+PENDING_INDEX_SHARDS = 8  # must match the files function
+DOWNLOAD_COUNTER_SHARDS = 4
+DEFAULT_STATUS_MIX = "ready=85,uploading=5,deleted=8,aborted=1,rejected=1"
+CONTENT_TYPES = (
+    ("image/jpeg", ".jpg", 30),
+    ("image/png", ".png", 15),
+    ("application/pdf", ".pdf", 20),
+    ("application/zip", ".zip", 10),
+    ("video/mp4", ".mp4", 10),
+    ("application/octet-stream", ".bin", 15),
+)
+REPORT_EVERY_SECONDS = 5.0
+
+_progress = None  # multiprocessing.Value shared with workers (items written)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def parse_status_mix(value: str) -> dict[str, float]:
+    """"ready=85,uploading=5" -> weights. Raises ValueError on bad input."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if not name.strip() or float(weight) < 0:
+            raise ValueError(f"bad status weight: {part!r}")
+        mix[name.strip()] = float(weight)
+    if not sum(mix.values()):
+        raise ValueError("status weights must not all be zero")
+    return mix
+
+
+def heavy_tailed_size(rng: random.Random, median_bytes: int) -> int:
+    # Log-normal around the median with a long tail into the GB range.
+    return max(1, min(int(rng.lognormvariate(math.log(median_bytes), 2.0)), 20 * 1024 ** 3))
+
+
+def user_items(user: int, args, status_mix: dict[str, float], now: datetime):
+    """Yield one user's file records followed by their usage item. Deterministic per (seed, user)."""
+    rng = random.Random(f"{args.seed}:{user}")
+    owner = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    statuses, weights = list(status_mix), list(status_mix.values())
+    types = [t[:2] for t in CONTENT_TYPES]
+    type_weights = [t[2] for t in CONTENT_TYPES]
+    usage = {"fileCount": 0, "usedBytes": 0, "readyCount": 0, "readyBytes": 0}
+
+    # Heavy-tailed per-user file counts: a few users own most files.
+    n_files = max(1, int(rng.paretovariate(1.5) * args.files_per_user / 3))
+    for _ in range(min(n_files, args.max_files_per_user)):
+        file_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        created = now - timedelta(seconds=rng.uniform(0, args.days * 86400))
+        expires = created + timedelta(days=rng.choice((1, 7, 7, 7, 14, 30)))
+        status = rng.choices(statuses, weights)[0]
+        content_type, ext = rng.choices(types, type_weights)[0]
+        size = heavy_tailed_size(rng, args.median_size)
+        item = {
+            "PK": f"u#{owner}",
+            "SK": f"f#{file_id}",
+            "fileId": file_id,
+            "ownerId": owner,
+            "email": f"{owner[:8]}@example.com",
+            "s3Prefix": S3_PREFIX,
+            "s3Key": f"{S3_PREFIX}/{owner}/{file_id}",
+            "originalFileName": f"file-{file_id[:8]}{ext}",
+            "contentType": content_type,
+            "sizeBytes": size,
+            "status": status,
+            "downloadShards": DOWNLOAD_COUNTER_SHARDS,
+            "createdAt": _iso(created),
+            "expiresAt": _iso(expires),
+            "expiresAtEpoch": int(expires.timestamp()),
+            "passwordRequired": False,
+            "usageTracked": True,
+        }
+        if status == "uploading":
+            item["pendingShard"] = f"up#{int(file_id.replace('-', '')[:8], 16) % PENDING_INDEX_SHARDS}"
+        elif status == "ready":
+            item["readyAt"] = _iso(created + timedelta(seconds=rng.uniform(1, 120)))
+            item["storedBytes"] = size
+            item["etag"] = f"{rng.getrandbits(128):032x}"
+        else:
+            item[f"{status}At"] = _iso(created + timedelta(seconds=rng.uniform(1, 3600)))
+
+        if status in USAGE_STATUSES:
+            usage["fileCount"] += 1
+            usage["usedBytes"] += size
+            if status == "ready":
+                usage["readyCount"] += 1
+                usage["readyBytes"] += size
+        yield item
+
+    yield {"PK": f"u#{owner}", "SK": USAGE_SK, **usage, "updatedAt": _iso(now)}
+
+
+def _table(args):
+    import boto3
+    from botocore.config import Config
+
+    session = boto3.Session(profile_name=args.profile, region_name=args.region)
+    kwargs = {"config": Config(retries={"mode": "adaptive", "max_attempts": 10}, max_pool_connections=4)}
+    if args.endpoint_url:
+        kwargs["endpoint_url"] = args.endpoint_url
+        if session.get_credentials() is None:  # DynamoDB Local accepts any credentials
+            kwargs.update(aws_access_key_id="local", aws_secret_access_key="local")
+    return session.resource("dynamodb", **kwargs).Table(args.table)
+
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+
+
+def load_users(first: int, last: int, args, status_mix: dict[str, float], now: datetime) -> tuple[int, int]:
+    """Worker: generate and write users [first, last). Returns (items, bytes of item data, approx.)."""
+    table = None if args.dry_run else _table(args)
+    written = approx_bytes = pending = 0
+
+    def flush_progress():
+        nonlocal pending
+        if _progress is not None and pending:
+            with _progress.get_lock():
+                _progress.value += pending
+            pending = 0
+
+    def write_all(put):
+        nonlocal written, approx_bytes, pending
+        for user in range(first, last):
+            for item in user_items(user, args, status_mix, now):
+                put(item)
+                written += 1
+                pending += 1
+                approx_bytes += sum(len(k) + len(str(v)) for k, v in item.items())
+                if pending >= 1000:
+                    flush_progress()
+
+    if table is None:
+        write_all(lambda item: None)
+    else:
+        with table.batch_writer() as batch:
+            write_all(lambda item: batch.put_item(Item=item))
+    flush_progress()
+    return written, approx_bytes
+
+
+def create_table(args) -> None:
+    """Create the table from BackendTable in template.yaml (for local endpoints)."""
+    import yaml
+
+    class _CfnLoader(yaml.SafeLoader):
+        pass
+
+    _CfnLoader.add_multi_constructor("!", lambda loader, suffix, node: None)
+    with open(os.path.join(BACK_DIR, "template.yaml"), encoding="utf-8") as f:
+        props = yaml.load(f, Loader=_CfnLoader)["Resources"]["BackendTable"]["Properties"]
+
+    table = _table(args)
+    kwargs = {
+        "TableName": args.table,
+        "BillingMode": "PAY_PER_REQUEST",
+        "AttributeDefinitions": props["AttributeDefinitions"],
+        "KeySchema": props["KeySchema"],
+    }
+    # Indexes behind a false condition load as None (the tag constructors are stubbed out).
+    indexes = [i for i in props.get("GlobalSecondaryIndexes") or () if i and "IndexName" in i]
+    if indexes:
+        kwargs["GlobalSecondaryIndexes"] = indexes
+    try:
+        table.meta.client.create_table(**kwargs)
+    except table.meta.client.exceptions.ResourceInUseException:
+        print(f"Table '{args.table}' already exists.")
+        return
+    table.meta.client.get_waiter("table_exists").wait(TableName=args.table)
+    print(f"Created table '{args.table}'.")
+
+
+def _report(items: int, approx_bytes: int, started: float, final: bool = False) -> None:
+    elapsed = max(time.monotonic() - started, 1e-9)
+    line = f"{items:>12,} items  {elapsed:8.1f}s  {items / elapsed:10,.0f} items/s"
+    if final:
+        line += f"  ~{approx_bytes / 1024 ** 2:,.0f} MiB"
+    print(line, flush=True)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--table", default="riris-backend-files-data")
+    p.add_argument("--region", default="eu-central-1")
+    p.add_argument("--profile", default=None)
+    p.add_argument("--endpoint-url", default=None, help="e.g. http://localhost:8000 for DynamoDB Local")
+    p.add_argument("--create-table", action="store_true", help="create the table from template.yaml first")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--files-per-user", type=int, default=50, help="mean files per user (Pareto-distributed)")
+    p.add_argument("--max-files-per-user", type=int, default=100_000)
+    p.add_argument("--status-mix", default=DEFAULT_STATUS_MIX, help="status=weight,... (default: %(default)s)")
+    p.add_argument("--median-size", type=int, default=2 * 1024 * 1024, help="median file size in bytes")
+    p.add_argument("--days", type=float, default=30, help="spread createdAt over the last N days")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="worker processes")
+    p.add_argument("--dry-run", action="store_true", help="generate only; measures generator throughput")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        status_mix = parse_status_mix(args.status_mix)
+    except ValueError as e:
+        print(f"❌ --status-mix: {e}", file=sys.stderr)
+        return 2
+
+    if args.create_table and not args.dry_run:
+        create_table(args)
+
+    now = datetime.now(timezone.utc)
+    workers = max(1, min(args.workers, args.users))
+    # Contiguous user ranges, several per worker so a heavy user range does not stall the tail.
+    chunks = max(1, min(args.users, workers * 8))
+    bounds = [args.users * i // chunks for i in range(chunks + 1)]
+
+    progress = multiprocessing.Value("q", 0)
+    started = last_report = time.monotonic()
+    total_items = total_bytes = 0
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(progress,)) as pool:
+        futures = {
+            pool.submit(load_users, bounds[i], bounds[i + 1], args, status_mix, now): (bounds[i], bounds[i + 1])
+            for i in range(chunks) if bounds[i] < bounds[i + 1]
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=REPORT_EVERY_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    items, approx_bytes = future.result()
+                    total_items += items
+                    total_bytes += approx_bytes
+                except Exception as e:  # keep the other ranges going; report at the end
+                    failures.append((futures[future], e))
+            if not done or time.monotonic() - last_report >= REPORT_EVERY_SECONDS:
+                _report(progress.value, 0, started)
+                last_report = time.monotonic()
+
+    _report(total_items, total_bytes, started, final=True)
+    for (first, last), e in failures:
+        print(f"❌ users [{first}, {last}) failed after {type(e).__name__}: {e}", file=sys.stderr)
+    if failures:
+        print(f"❌ {len(failures)} of {len(futures)} user ranges failed; rerun with the same --seed "
+              "to rewrite them (puts are idempotent).", file=sys.stderr)
+        return 1
+
+    target = "generated (dry run)" if args.dry_run else f"loaded into table '{args.table}'"
+    print(f"✅ {total_items:,} items {target}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
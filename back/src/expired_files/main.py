@@ -0,0 +1,212 @@
+"""Lambda handler for RIRIS files removed by DynamoDB TTL (table stream consumer)."""
+
+import os
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+
+TABLE_NAME = os.environ["BACKEND_TABLE"]
+FILES_BUCKET = os.environ.get("FILES_BUCKET")
+S3_PREFIX = os.environ.get("S3_PREFIX", "files")
+S3_DELETE_BATCH = 1000  # DeleteObjects limit
+# Files distribution (cloudfront download mode): expired objects are invalidated at the edge.
+CLOUDFRONT_DISTRIBUTION_ID = os.environ.get("CLOUDFRONT_DISTRIBUTION_ID", "")
+CLOUDFRONT_INVALIDATION_BATCH = 1000  # paths per CreateInvalidation (3000 may be in progress)
+DDB_WRITE_BATCH = 25  # BatchWriteItem limit
+# Per-user usage aggregate maintained together with the files function (same SK).
+USAGE_SK = "usage"
+USAGE_STATUSES = ("uploading", "ready")
+# These statuses already removed the object (or never had one).
+OBJECTLESS_STATUSES = ("deleted", "rejected", "aborted")
+
+# Created on first use: importing boto3 dominates cold start.
+ddb_client = None
+s3_client = None
+cloudfront_client = None
+
+
+def _ddb_client():
+    global ddb_client
+    if ddb_client is None:
+        import boto3
+        ddb_client = boto3.client("dynamodb")
+    return ddb_client
+
+
+def _s3_client():
+    global s3_client
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+    return s3_client
+
+
+def _cloudfront_client():
+    global cloudfront_client
+    if cloudfront_client is None:
+        import boto3
+        cloudfront_client = boto3.client("cloudfront")
+    return cloudfront_client
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _s(image: dict, name: str) -> str | None:
+    value = image.get(name)
+    return value.get("S") if value else None
+
+
+def _n(image: dict, name: str) -> int:
+    value = image.get(name)
+    return int(value["N"]) if value and "N" in value else 0
+
+
+def _is_ttl_removal(rec: dict) -> bool:
+    """REMOVE records written by the TTL service itself (the event source filter matches the same)."""
+    identity = rec.get("userIdentity") or {}
+    return (rec.get("eventName") == "REMOVE" and identity.get("type") == "Service"
+            and identity.get("principalId") == "dynamodb.amazonaws.com")
+
+
+def _expired_file(rec: dict) -> dict | None:
+    """The file record a TTL removal carried (stream OldImage), or None for anything else."""
+    if not _is_ttl_removal(rec):
+        return None
+    image = rec.get("dynamodb", {}).get("OldImage") or {}
+    sk = _s(image, "SK") or ""
+    if not sk.startswith("f#"):
+        return None
+    file_id = _s(image, "fileId") or sk[2:]
+    return {
+        "sequence": rec.get("dynamodb", {}).get("SequenceNumber"),
+        "PK": _s(image, "PK"),
+        "fileId": file_id,
+        "status": _s(image, "status"),
+        "s3Key": _s(image, "s3Key") or f"{_s(image, 's3Prefix') or S3_PREFIX}/{file_id}",
+        "sizeBytes": _n(image, "sizeBytes"),
+        "storedBytes": _n(image, "storedBytes"),
+        "downloadShards": _n(image, "downloadShards"),
+        "usageTracked": image.get("usageTracked", {}).get("BOOL", False),
+    }
+
+
+def _delete_objects(keys: list[str]) -> set[str]:
+    """Delete objects with DeleteObjects, 1000 keys per call. Returns the keys that failed."""
+    failed = set()
+    for i in range(0, len(keys), S3_DELETE_BATCH):
+        chunk = keys[i:i + S3_DELETE_BATCH]
+        resp = _s3_client().delete_objects(
+            Bucket=FILES_BUCKET,
+            Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+        )
+        for error in resp.get("Errors", []):
+            logger.error("Failed to delete s3://%s/%s: %s", FILES_BUCKET, error.get("Key"), error.get("Code"))
+            failed.add(error.get("Key"))
+    return failed
+
+
+def _invalidate_cdn(keys: list[str]) -> None:
+    """Invalidate expired objects on the files distribution. Best-effort: a failure only
+    leaves cached copies at the edge until their cache TTL runs out."""
+    if not CLOUDFRONT_DISTRIBUTION_ID or not keys:
+        return
+    paths = sorted({f"/{quote(k)}" for k in keys})
+    for i in range(0, len(paths), CLOUDFRONT_INVALIDATION_BATCH):
+        chunk = paths[i:i + CLOUDFRONT_INVALIDATION_BATCH]
+        try:
+            _cloudfront_client().create_invalidation(
+                DistributionId=CLOUDFRONT_DISTRIBUTION_ID,
+                InvalidationBatch={"Paths": {"Quantity": len(chunk), "Items": chunk},
+                                   "CallerReference": str(uuid.uuid4())},
+            )
+        except Exception:
+            logger.exception("Failed to invalidate %d path(s) on the files distribution", len(chunk))
+
+
+def _delete_counter_shards(files: list[dict]) -> None:
+    """Download counter shards (dc#<fileId>#<n>) have no TTL of their own; drop them with the file."""
+    keys = [
+        {"PK": {"S": f"dc#{f['fileId']}#{shard}"}, "SK": {"S": "dc"}}
+        for f in files for shard in range(f["downloadShards"])
+    ]
+    for i in range(0, len(keys), DDB_WRITE_BATCH):
+        requests = {TABLE_NAME: [{"DeleteRequest": {"Key": k}} for k in keys[i:i + DDB_WRITE_BATCH]]}
+        for _ in range(5):
+            requests = _ddb_client().batch_write_item(RequestItems=requests).get("UnprocessedItems")
+            if not requests:
+                break
+        else:
+            logger.warning("Counter shards left behind: %s", json.dumps(requests)[:500])
+
+
+def _release_usage(item: dict) -> None:
+    """Give back what the expired file held in its owner's usage item (as the files function does)."""
+    expr = "ADD fileCount :n, usedBytes :b"
+    values = {":n": {"N": "-1"}, ":b": {"N": str(-item["sizeBytes"])},
+              ":ts": {"S": _iso(datetime.now(timezone.utc))}}
+    if item["status"] == "ready":
+        expr += ", readyCount :n, readyBytes :rb"
+        values[":rb"] = {"N": str(-item["storedBytes"])}
+    _ddb_client().update_item(
+        TableName=TABLE_NAME,
+        Key={"PK": {"S": item["PK"]}, "SK": {"S": USAGE_SK}},
+        UpdateExpression=f"{expr} SET updatedAt = :ts",
+        ExpressionAttributeValues=values,
+    )
+
+
+def process(records: list) -> dict:
+    """Clean up after TTL-removed file records; returns a report with batchItemFailures.
+
+    Objects go first, in DeleteObjects batches (idempotent, so replays are harmless). Usage
+    releases are not idempotent, so they run in stream order and stop at the first failure:
+    that record's sequence number is reported, and the stream resumes there without
+    releasing anything twice.
+    """
+    files = [f for f in (_expired_file(rec) for rec in records) if f]
+    report = {"received": len(records), "expired": len(files), "objectsDeleted": 0, "usageReleased": 0,
+              "batchItemFailures": []}
+    if not files:
+        return report
+
+    with_objects = [f for f in files if f["status"] not in OBJECTLESS_STATUSES]
+    failed_keys = set()
+    if FILES_BUCKET and with_objects:
+        failed_keys = _delete_objects([f["s3Key"] for f in with_objects])
+        report["objectsDeleted"] = len(with_objects) - len(failed_keys)
+        _invalidate_cdn([f["s3Key"] for f in with_objects if f["s3Key"] not in failed_keys])
+
+    try:
+        _delete_counter_shards([f for f in files if f["downloadShards"]])
+    except ClientError as e:
+        logger.error("Failed to delete download counter shards: %s", e)
+
+    for f in files:
+        if f["s3Key"] in failed_keys:
+            report["batchItemFailures"].append({"itemIdentifier": f["sequence"]})
+            break
+        if not (f["usageTracked"] and f["status"] in USAGE_STATUSES):
+            continue
+        try:
+            _release_usage(f)
+            report["usageReleased"] += 1
+        except ClientError as e:
+            logger.error("Failed to release usage for fileId=%s: %s", f["fileId"], e)
+            report["batchItemFailures"].append({"itemIdentifier": f["sequence"]})
+            break
+    return report
+
+
+def handler(event, context):  # pylint: disable=unused-argument
+    """Lambda handler for the table stream (TTL removals only, see the event source filter)."""
+    report = process(event.get("Records", []))
+    logger.info("Expired files processed: %s", json.dumps({k: v for k, v in report.items() if k != "batchItemFailures"}))
+    return {"batchItemFailures": report["batchItemFailures"]}
@@ -1,32 +1,370 @@
 """Lambda handler for RIRIS files API."""
 
 import os
+import io
+import csv
 import json
+import hmac
+import base64
+import hashlib
 import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from decimal import Decimal
 from datetime import datetime, timezone, timedelta
-from dateutil import parser as dt_parser, tz
+from functools import partial
+from itertools import chain
+from types import MappingProxyType
+from urllib.parse import quote
 import uuid
 
-import boto3
-from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import metrics
 
 DEFAULT_EXPIRES_DAYS = int(os.getenv("DEFAULT_EXPIRES_DAYS", "7"))
 MAX_EXPIRES_DAYS = int(os.getenv("MAX_EXPIRES_DAYS", "30"))
 PRESIGN_PUT_EXPIRES_SECONDS = int(os.getenv("PRESIGN_PUT_EXPIRES_SECONDS", "900"))
 PRESIGN_GET_EXPIRES_SECONDS = int(os.getenv("PRESIGN_GET_EXPIRES_SECONDS", "900"))
-
-UTC = tz.UTC
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+# HMAC key for list cursors (a generated secret in the stack). Anything guessable would let
+# clients forge cursors, so there is no fallback: a missing key fails the cold start.
+CURSOR_SECRET = os.getenv("CURSOR_SECRET", "")
+if not CURSOR_SECRET:
+    raise RuntimeError("CURSOR_SECRET is not set")
+# Uploads larger than this get an S3 multipart upload instead of a single presigned PUT.
+MULTIPART_THRESHOLD_BYTES = int(os.getenv("MULTIPART_THRESHOLD_BYTES", str(100 * 1024 * 1024)))
+MULTIPART_PART_SIZE_BYTES = int(os.getenv("MULTIPART_PART_SIZE_BYTES", str(16 * 1024 * 1024)))
+MULTIPART_URL_BATCH = int(os.getenv("MULTIPART_URL_BATCH", "20"))
+S3_MIN_PART_SIZE_BYTES = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+S3_MAX_OBJECT_BYTES = 5 * 1024 ** 4
+
+FILE_CACHE_MAX_ENTRIES = int(os.getenv("FILE_CACHE_MAX_ENTRIES", "1024"))
+FILE_CACHE_TTL_SECONDS = float(os.getenv("FILE_CACHE_TTL_SECONDS", "30"))
+# Used for 404s and non-terminal items (e.g. 'uploading'), which other containers may change.
+FILE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("FILE_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+FILE_CACHE_STATS_EVERY = int(os.getenv("FILE_CACHE_STATS_EVERY", "100"))
+
+PRESIGN_GET_CACHE_MAX_ENTRIES = int(os.getenv("PRESIGN_GET_CACHE_MAX_ENTRIES", "1024"))
+# A cached download URL is only handed out while at least this much of its lifetime remains.
+PRESIGN_GET_MIN_REMAINING_SECONDS = int(
+    os.getenv("PRESIGN_GET_MIN_REMAINING_SECONDS", str(PRESIGN_GET_EXPIRES_SECONDS // 2))
+)
+
+# Download redirects: "s3" presigns a bucket URL; "cloudfront" signs a URL on the files
+# distribution so repeat downloads are served from edge caches. Both last
+# PRESIGN_GET_EXPIRES_SECONDS and share the URL cache.
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "s3")
+CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN", "")
+CLOUDFRONT_KEY_ID = os.getenv("CLOUDFRONT_KEY_ID", "")
+# SSM SecureString with the PEM private key of the distribution's trusted key group.
+CLOUDFRONT_PRIVATE_KEY_PARAM = os.getenv("CLOUDFRONT_PRIVATE_KEY_PARAM", "")
+# Deleted objects are invalidated on the distribution so edge caches stop serving them.
+CLOUDFRONT_DISTRIBUTION_ID = os.getenv("CLOUDFRONT_DISTRIBUTION_ID", "")
+CLOUDFRONT_INVALIDATION_BATCH = 1000  # paths per CreateInvalidation (3000 may be in progress)
+
+# Download counters are spread over N items (PK=dc#<fileId>#<n>) so a hot link is not
+# serialized on one item's write capacity. The shard count is fixed per file at upload time.
+DOWNLOAD_COUNTER_SHARDS = int(os.getenv("DOWNLOAD_COUNTER_SHARDS", "4"))
+# > 0 buffers increments in the container and flushes them at most this often (best-effort:
+# increments still buffered when a container is reclaimed are lost).
+DOWNLOAD_COUNTER_FLUSH_SECONDS = float(os.getenv("DOWNLOAD_COUNTER_FLUSH_SECONDS", "0"))
+# Shard totals are folded onto the file item (shardDownloads) so listings never read shards.
+# A container folds a given file at most this often; the listed count lags by about as much.
+DOWNLOAD_COUNTER_FOLD_SECONDS = float(os.getenv("DOWNLOAD_COUNTER_FOLD_SECONDS", "30"))
+
+# Write-sharding of the sparse "pending uploads" index (GSI2); must match the reaper.
+PENDING_INDEX_SHARDS = int(os.getenv("PENDING_INDEX_SHARDS", "8"))
+
+BULK_DELETE_MAX = int(os.getenv("BULK_DELETE_MAX", "1000"))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "8"))
+# Per-user usage aggregate: one item per user (PK u#<sub>, SK "usage"), kept in step with
+# file records by transactions. 0 disables the respective quota.
+USAGE_SK = "usage"
+# Sparse index on contentKey (owner#sha256#size) for upload deduplication.
+CHECKSUM_INDEX = "GSI3"
+# fileId index. GSI4 projects only what the download and mark-ready paths read (see
+# template.yaml); GSI1 (ALL) is read only while LegacyFileIdIndex=read.
+FILE_ID_INDEX = os.getenv("FILE_ID_INDEX", "GSI4")
+# Read from the table by key when an index item lacks them (public metadata).
+PUBLIC_METADATA_FIELDS = ("originalFileName", "contentType", "createdAt", "passwordRequired")
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_BYTES", "0"))
+USER_QUOTA_FILES = int(os.getenv("USER_QUOTA_FILES", "0"))
+# Statuses whose files hold a share of the user's usage (released on delete/abort).
+USAGE_STATUSES = ("uploading", "ready")
+# Numeric copy of expiresAt (epoch seconds): the table's TTL attribute, and what read paths compare.
+EXPIRY_TTL_ATTRIBUTE = "expiresAtEpoch"
+TRANSACT_MAX_ITEMS = 100  # TransactWriteItems limit
+
+# Admin listing (parallel scan). Keep the time budget well below the function timeout.
+ADMIN_SCAN_SEGMENTS = int(os.getenv("ADMIN_SCAN_SEGMENTS", "8"))
+ADMIN_SCAN_PAGE_ITEMS = int(os.getenv("ADMIN_SCAN_PAGE_ITEMS", "1000"))
+ADMIN_SCAN_TIME_BUDGET_SECONDS = float(os.getenv("ADMIN_SCAN_TIME_BUDGET_SECONDS", "6"))
+# Upper bound for one batch upload init; keeps the response well below Lambda's 6 MB limit.
+BATCH_UPLOAD_MAX = int(os.getenv("BATCH_UPLOAD_MAX", "1000"))
+# Inventory exports run off the request path: POST /files/export records a pending export
+# (SK x#<exportId>) and invokes EXPORT_FUNCTION_NAME asynchronously. That worker streams the
+# inventory to <EXPORT_PREFIX>/<ownerId>/ in parts of EXPORT_PART_BYTES, so memory stays flat
+# however many files the user has; GET /files/export/{id} reports the outcome.
+EXPORT_FUNCTION_NAME = os.getenv("EXPORT_FUNCTION_NAME", "")
+EXPORT_PREFIX = os.getenv("EXPORT_PREFIX", "exports")
+# Export records and objects live for a day (see the ExpireInventoryExports lifecycle rule).
+EXPORT_RECORD_TTL_SECONDS = int(os.getenv("EXPORT_RECORD_TTL_SECONDS", str(24 * 3600)))
+# A pending export older than the worker timeout can no longer finish; it is reported as failed.
+EXPORT_STALE_SECONDS = int(os.getenv("EXPORT_STALE_SECONDS", "960"))
+EXPORT_PART_BYTES = max(int(os.getenv("EXPORT_PART_BYTES", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+EXPORT_PAGE_ITEMS = int(os.getenv("EXPORT_PAGE_ITEMS", "1000"))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+S3_DELETE_BATCH = 1000  # DeleteObjects limit
+
+# Fraction of requests whose full event is logged when LOG_LEVEL=DEBUG.
+EVENT_LOG_SAMPLE_RATE = float(os.getenv("EVENT_LOG_SAMPLE_RATE", "0.1"))
+
+# Attributes emitted by GET /files; used as ProjectionExpression so we never read full items.
+USER_FILES_FIELDS = (
+    "fileId",
+    "originalFileName",
+    "contentType",
+    "sizeBytes",
+    "status",
+    "createdAt",
+    "expiresAt",
+    "passwordRequired",
+    "downloadCount",
+    "downloadedAt",
+    # not emitted; folded total of the download counter shards
+    "shardDownloads",
+)
+
+# Attributes projected by the admin scan; PK/SK double as the per-segment resume point.
+ADMIN_FILES_FIELDS = (
+    "PK",
+    "SK",
+    "fileId",
+    "ownerId",
+    "email",
+    "originalFileName",
+    "contentType",
+    "sizeBytes",
+    "status",
+    "createdAt",
+    "expiresAt",
+    "passwordRequired",
+)
 
 logger = logging.getLogger()
 logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
-s3 = boto3.client("s3")
-ddb = boto3.resource("dynamodb")
-table = ddb.Table(os.environ["BACKEND_TABLE"])
+# AWS clients are created on first use: importing boto3 dominates cold start, and
+# OPTIONS/405 responses never need it.
+s3 = None
+ddb = None
+table = None
+cloudfront_signer = None
+cloudfront = None
+lambda_client = None
+
+
+def _s3():
+    global s3
+    if s3 is None:
+        import boto3
+        s3 = boto3.client("s3")
+        metrics.instrument(s3)
+    return s3
+
+
+def _ddb():
+    global ddb
+    if ddb is None:
+        import boto3
+        ddb = boto3.resource("dynamodb")
+        metrics.instrument(ddb)
+    return ddb
+
+
+def _cloudfront():
+    global cloudfront
+    if cloudfront is None:
+        import boto3
+        cloudfront = boto3.client("cloudfront")
+        metrics.instrument(cloudfront)
+    return cloudfront
+
+
+def _lambda():
+    global lambda_client
+    if lambda_client is None:
+        import boto3
+        lambda_client = boto3.client("lambda")
+        metrics.instrument(lambda_client)
+    return lambda_client
+
+
+def _table():
+    global table
+    if table is None:
+        table = _ddb().Table(os.environ["BACKEND_TABLE"])
+    return table
+
+
+def _load_cloudfront_private_key() -> bytes:
+    import boto3
+    resp = boto3.client("ssm").get_parameter(Name=CLOUDFRONT_PRIVATE_KEY_PARAM, WithDecryption=True)
+    return resp["Parameter"]["Value"].encode()
+
+
+def _cloudfront_signer():
+    """CloudFront URL signer; the private key is fetched and parsed once per container."""
+    global cloudfront_signer
+    if cloudfront_signer is None:
+        from botocore.signers import CloudFrontSigner
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        key = serialization.load_pem_private_key(_load_cloudfront_private_key(), password=None)
+        # CloudFront verifies RSA-SHA1 (PKCS#1 v1.5) signatures.
+        cloudfront_signer = CloudFrontSigner(
+            CLOUDFRONT_KEY_ID, lambda message: key.sign(message, padding.PKCS1v15(), hashes.SHA1()))
+    return cloudfront_signer
+
+
+class _FileMetaCache:
+    """Warm-container LRU+TTL cache for fileId index lookups.
+
+    Stores the item dict, or None for a negative (404) entry. Entries live for
+    `ttl_seconds` when the item is in a terminal/stable state (ready, deleted,
+    expired) and for `negative_ttl_seconds` otherwise.
+    """
+
+    STABLE_STATUSES = ("ready", "deleted", "expired")
+
+    def __init__(self, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, file_id: str) -> tuple[bool, dict | None]:
+        """Return (found, item). found=False means the caller must query DynamoDB."""
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.get(file_id)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, item = entry
+            if expires_at <= self._clock():
+                del self._entries[file_id]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(file_id)
+            if item is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, item
+
+    def put(self, file_id: str, item: dict | None) -> None:
+        if self.max_entries <= 0:
+            return
+        stable = item is not None and item.get("status") in self.STABLE_STATUSES
+        ttl = self.ttl_seconds if stable else self.negative_ttl_seconds
+        with self._lock:
+            self._entries[file_id] = (self._clock() + ttl, item)
+            self._entries.move_to_end(file_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, file_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(file_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.lookups
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "negativeHits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hitRatio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+file_cache = _FileMetaCache(FILE_CACHE_MAX_ENTRIES, FILE_CACHE_TTL_SECONDS, FILE_CACHE_NEGATIVE_TTL_SECONDS)
+
+
+class _PresignedUrlCache:
+    """Warm-container LRU of signed download URLs keyed by (fileId, object key).
 
+    A URL is reused only while at least `min_remaining_seconds` of its signed lifetime is left,
+    so clients always get a comfortable window to start the download.
+    """
 
-def build_response(status_code, body):
+    def __init__(self, max_entries: int, min_remaining_seconds: float, clock=time.time):
+        self.max_entries = max_entries
+        self.min_remaining_seconds = min_remaining_seconds
+        self._clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_id: str, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get((file_id, key))
+            if entry is None or entry[0] - self._clock() < self.min_remaining_seconds:
+                self._entries.pop((file_id, key), None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end((file_id, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, file_id: str, key: str, url: str, signed_at: float, expires_in: int) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(file_id, key)] = (signed_at + expires_in, url)
+            self._entries.move_to_end((file_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, file_id: str) -> None:
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == file_id]:
+                del self._entries[cache_key]
+
+
+url_cache = _PresignedUrlCache(PRESIGN_GET_CACHE_MAX_ENTRIES, PRESIGN_GET_MIN_REMAINING_SECONDS)
+
+
+def build_response(status_code, body, headers: dict | None = None):
     """Builds standardized response."""
     return {
         "statusCode": status_code,
@@ -35,10 +373,49 @@ def build_response(status_code, body):
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE",
             "Access-Control-Allow-Headers": "Content-Type,Authorization",
+            **(headers or {}),
         },
         "body": json.dumps(body, default=str),
     }
 
+def _get_header(event, name: str) -> str | None:
+    """Case-insensitive request header lookup (HTTP/2 clients send lowercase names)."""
+    name = name.lower()
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+def _compute_etag(*parts) -> str:
+    """Weak ETag over the values a response is built from; hashing their repr is cheaper
+    than serializing the JSON body just to compare it."""
+    return f'W/"{hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()}"'
+
+def _etag_matches(event, etag: str) -> bool:
+    """If-None-Match check using weak comparison (RFC 9110 13.1.2)."""
+    header = _get_header(event, "If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+def build_conditional_response(event, body, etag: str):
+    """200 carrying an ETag, or a bodyless 304 when the client already has this version.
+
+    no-cache makes browsers revalidate every poll, sending If-None-Match on their own.
+    Compression is left to API Gateway (MinimumCompressionSize), which gzips for clients
+    that accept it without the Lambda having to return base64 binary bodies.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(event, etag):
+        metrics.count("NotModified")
+        response = build_response(304, None, headers)
+        response["headers"].pop("Content-Type")
+        response["body"] = ""
+        return response
+    return build_response(200, body, headers)
+
 def build_redirect(location: str):
     """Builds standardized 302 redirect response."""
     return {
@@ -56,15 +433,7 @@ def build_redirect(location: str):
 
 def is_admin_user(event):
     """Check if the user is a member of Admin group."""
-    claims = _get_claims(event)
-    groups = claims.get("cognito:groups", "")
-    # groups can be a comma-delimited string depending on authorizer configuration
-    return "Admins" in groups if groups else False
-
-def _get_sub(event) -> str | None:
-    """Extract Cognito user sub (stable identity)."""
-    claims = _get_claims(event)
-    return claims.get("sub")
+    return RequestContext.from_event(event).is_admin
 
 def _resolve_expiry_days(requested: int | None) -> int:
     """Resolve expiry days with defaults and max clamp."""
@@ -104,119 +473,946 @@ def _to_int(v):
     except (TypeError, ValueError):
         return None
 
-def _get_path_param_file_id(event) -> str | None:
-    """Extract fileId from pathParameters."""
-    return (event.get("pathParameters") or {}).get("id") or (event.get("pathParameters") or {}).get("fileId")
+def _object_key(item: dict) -> str:
+    """S3 key of a file's object: s3Key when recorded, else the legacy <prefix>/<fileId> layout."""
+    if item.get("s3Key"):
+        return item["s3Key"]
+    s3_prefix = item.get("s3Prefix") or os.getenv("S3_PREFIX", "files")
+    return f"{s3_prefix}/{item['fileId']}"
+
+def _pending_shard(file_id: str) -> str:
+    """GSI2 partition for an uploading item, spread by fileId (a UUID)."""
+    return f"up#{int(file_id.replace('-', '')[:8], 16) % PENDING_INDEX_SHARDS}"
+
+def _get_json_body(event) -> dict:
+    """Parse JSON request body (API GW proxy sends a string). Raises ValueError if invalid."""
+    body = event.get("body") or "{}"
+    payload = json.loads(body) if isinstance(body, str) else (body or {})
+    if not isinstance(payload, dict):
+        raise ValueError("Body must be a JSON object")
+    return payload
+
+
+def _resolve_limit(requested) -> int:
+    """Resolve page size with defaults and max clamp. Raises ValueError if not an integer."""
+    if requested is None or requested == "":
+        return LIST_DEFAULT_LIMIT
+    limit = int(requested)
+    if limit < 1:
+        limit = 1
+    if limit > LIST_MAX_LIMIT:
+        limit = LIST_MAX_LIMIT
+    return limit
+
+def _b64url(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign_cursor(payload: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET.encode("utf-8"), payload, hashlib.sha256).digest()
+
+def _encode_token(data) -> str:
+    """Encode a JSON-able value as an opaque, signed continuation token."""
+    payload = json.dumps(data, separators=(",", ":"), sort_keys=True, default=str).encode("utf-8")
+    return f"{_b64url(payload)}.{_b64url(_sign_cursor(payload))}"
+
+def _decode_token(cursor: str):
+    """Verify and decode a token from _encode_token. Raises ValueError if tampered."""
+    try:
+        payload_part, sig_part = cursor.split(".", 1)
+        payload = _b64url_decode(payload_part)
+        sig = _b64url_decode(sig_part)
+    except Exception as e:
+        raise ValueError("Malformed cursor") from e
+
+    if not hmac.compare_digest(sig, _sign_cursor(payload)):
+        raise ValueError("Bad cursor signature")
+    return json.loads(payload)
+
+def _encode_cursor(last_key: dict) -> str:
+    """Encode DynamoDB LastEvaluatedKey as an opaque, signed continuation token."""
+    return _encode_token(last_key)
+
+def _decode_cursor(cursor: str, pk: str) -> dict:
+    """Verify and decode a continuation token. Raises ValueError if tampered or foreign."""
+    key = _decode_token(cursor)
+    # Cursor must point into the caller's own partition, even if the signature is valid.
+    if not isinstance(key, dict) or set(key) != {"PK", "SK"} or key.get("PK") != pk:
+        raise ValueError("Cursor does not belong to caller")
+    if not str(key.get("SK", "")).startswith("f#"):
+        raise ValueError("Cursor does not point to a file item")
+    return key
 
 def _now_iso() -> str:
     """UTC timestamp in ISO8601."""
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
-def _get_claims(event) -> dict:
-    """Extract JWT claims from API GW authorizer (id_token)."""
-    return event.get("requestContext", {}).get("authorizer", {}).get("claims", {}) or {}
-
-
-def _get_owner_id(event) -> str | None:
-    """Return stable ownerId from JWT claims (Cognito sub)."""
-    claims = _get_claims(event)
-    return claims.get("sub")
-
+_EMPTY = MappingProxyType({})
+
+
+def _parse_groups(value) -> frozenset:
+    """cognito:groups arrives as a list, "A,B" or "[A B]" depending on the authorizer."""
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.strip("[]").replace(",", " ").split()
+    return frozenset(value)
+
+
+@dataclass(frozen=True, slots=True)
+class RequestContext:
+    """What a view needs from the API Gateway event, parsed once per request."""
+    event: dict
+    method: str
+    resource: str
+    claims: Mapping
+    owner_id: str | None
+    email: str | None
+    groups: frozenset
+    path_params: Mapping
+    query: Mapping
+
+    @classmethod
+    def from_event(cls, event: dict) -> "RequestContext":
+        claims = ((event.get("requestContext") or {}).get("authorizer") or {}).get("claims") or {}
+        return cls(
+            event=event,
+            method=event.get("httpMethod", ""),
+            resource=event.get("resource", ""),
+            claims=MappingProxyType(claims),
+            # Stable ownerId is the Cognito sub; email falls back to the username.
+            owner_id=claims.get("sub"),
+            email=claims.get("email") or claims.get("cognito:username"),
+            groups=_parse_groups(claims.get("cognito:groups")),
+            path_params=MappingProxyType(pp) if (pp := event.get("pathParameters")) else _EMPTY,
+            query=MappingProxyType(qs) if (qs := event.get("queryStringParameters")) else _EMPTY,
+        )
 
-def _get_email(event) -> str | None:
-    """Prefer 'email' claim; fallback to 'cognito:username' if needed."""
-    claims = _get_claims(event)
-    return claims.get("email") or claims.get("cognito:username")
+    @property
+    def is_admin(self) -> bool:
+        return "Admins" in self.groups
 
-def _now_utc() -> datetime:
-    return datetime.now(timezone.utc)
+    @property
+    def file_id(self) -> str | None:
+        return self.path_params.get("id") or self.path_params.get("fileId")
 
 def _parse_iso(ts: str) -> datetime | None:
-    # Keep minimal; if you already use dateutil elsewhere, you can swap this.
+    """Parse our ISO8601 timestamps; naive values are taken as UTC. None if malformed."""
     try:
         if ts.endswith("Z"):
             ts = ts[:-1] + "+00:00"
-        return datetime.fromisoformat(ts)
+        dt = datetime.fromisoformat(ts)
     except Exception:
         return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
-def _is_expired(item: dict) -> bool:
+def _expiry_epoch(item: dict) -> int | None:
+    """Expiry as epoch seconds; parsed from expiresAt only for records older than the TTL attribute."""
+    epoch = item.get(EXPIRY_TTL_ATTRIBUTE)
+    if epoch is not None:
+        return int(epoch)
     expires_at = item.get("expiresAt")
-    if not expires_at:
-        return False
-    dt = _parse_iso(str(expires_at))
-    return bool(dt and dt <= _now_utc())
+    dt = _parse_iso(str(expires_at)) if expires_at else None
+    return int(dt.timestamp()) if dt else None
+
+def _is_expired(item: dict) -> bool:
+    # TTL deletes lag expiry (typically by hours), so reads still check.
+    epoch = _expiry_epoch(item)
+    return epoch is not None and epoch <= int(time.time())
 
 def _get_item_by_file_id(file_id: str) -> dict | None:
-    """Lookup file metadata by fileId using GSI1 (PK=fileId)."""
-    resp = table.query(
-        IndexName="GSI1",
-        KeyConditionExpression=Key("fileId").eq(file_id),
-        Limit=1,
+    """Lookup file metadata by fileId using the fileId index, via the warm-container cache.
+
+    The item carries the index projection only; see _with_fields for the rest.
+    """
+    found, item = file_cache.get(file_id)
+    metrics.count("FileCacheHit" if found else "FileCacheMiss")
+    if not found:
+        from boto3.dynamodb.conditions import Key  # deferred with boto3 (cold start)
+        resp = _table().query(
+            IndexName=FILE_ID_INDEX,
+            KeyConditionExpression=Key("fileId").eq(file_id),
+            Limit=1,
+        )
+        items = resp.get("Items", [])
+        item = items[0] if items else None
+        file_cache.put(file_id, item)
+
+    # Plain counter check; the stats dict is only built when it is actually logged.
+    if FILE_CACHE_STATS_EVERY > 0 and file_cache.lookups % FILE_CACHE_STATS_EVERY == 0:
+        logger.info("fileId cache stats: %s", json.dumps(file_cache.stats()))
+    return item
+
+def _with_fields(item: dict, fields: tuple) -> dict | None:
+    """item plus `fields`, read from the table by key if the index did not project them.
+
+    The merged item replaces the cached one, so a warm container reads each file once.
+    None if the record is gone by now.
+    """
+    missing = [f for f in fields if f not in item]
+    if not missing:
+        return item
+    metrics.count("FileItemFetch")
+    resp = _table().get_item(
+        Key={"PK": item["PK"], "SK": item["SK"]},
+        ProjectionExpression=", ".join(f"#f{i}" for i in range(len(missing))),
+        ExpressionAttributeNames={f"#f{i}": f for i, f in enumerate(missing)},
+    )
+    if "Item" not in resp:
+        file_cache.invalidate(item["fileId"])
+        return None
+    # Absent attributes are stored as None so the next call does not fetch them again.
+    item = {**item, **{f: resp["Item"].get(f) for f in missing}}
+    file_cache.put(item["fileId"], item)
+    return item
+
+def _resolve_part_size(size_bytes: int) -> int:
+    """Part size for a multipart upload: configured size, grown so we stay within S3's part limit."""
+    part_size = max(MULTIPART_PART_SIZE_BYTES, S3_MIN_PART_SIZE_BYTES, -(-size_bytes // S3_MAX_PARTS))
+    # Round up to a whole MiB so clients can slice files cleanly.
+    mib = 1024 * 1024
+    return -(-part_size // mib) * mib
+
+def _presign_parts(bucket: str, key: str, upload_id: str, part_numbers) -> list[dict]:
+    """Presign upload_part URLs for the given part numbers."""
+    return [
+        {
+            "partNumber": n,
+            "url": _s3().generate_presigned_url(
+                ClientMethod="upload_part",
+                Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=PRESIGN_PUT_EXPIRES_SECONDS,
+            ),
+        }
+        for n in part_numbers
+    ]
+
+def _list_uploaded_parts(bucket: str, key: str, upload_id: str) -> list[dict]:
+    """List parts S3 already has for a multipart upload (used to resume and to complete)."""
+    parts = []
+    paginator = _s3().get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+        for p in page.get("Parts", []):
+            parts.append({"partNumber": p["PartNumber"], "etag": p["ETag"], "sizeBytes": p.get("Size")})
+    return parts
+
+def _get_owned_multipart_item(ctx: RequestContext):
+    """Resolve (item, error_response) for multipart companion endpoints (owner-only, uploading only)."""
+    owner_id = ctx.owner_id
+    file_id = ctx.file_id
+    if not file_id:
+        return None, build_response(400, {"message": "Missing fileId in path"})
+
+    # Owner check is implicit: only fetch within caller's partition.
+    resp = _table().get_item(Key={"PK": f"u#{owner_id}", "SK": f"f#{file_id}"})
+    item = resp.get("Item")
+    if not item:
+        return None, build_response(403, {"message": "Forbidden: owner access only"})
+    if item.get("uploadMode") != "multipart" or not item.get("uploadId"):
+        return None, build_response(400, {"message": "Not a multipart upload"})
+    if item.get("status") != "uploading":
+        return None, build_response(409, {"message": f"Upload is {item.get('status')}"})
+    return item, None
+
+def _multipart_location(item: dict) -> tuple[str, str]:
+    return os.environ["FILES_BUCKET"], _object_key(item)
+
+def multipart_parts(ctx: RequestContext):
+    """POST /files/{id}/parts: presign more part URLs.
+
+    Body: {"partNumbers": [..]} for explicit parts, or {} to resume: the response then lists
+    parts S3 already has and presigns the next batch of missing ones.
+    """
+    try:
+        item, error = _get_owned_multipart_item(ctx)
+        if error:
+            return error
+        try:
+            payload = _get_json_body(ctx.event)
+        except ValueError:
+            return build_response(400, {"message": "Invalid JSON body"})
+
+        bucket, key = _multipart_location(item)
+        part_count = _to_int(item.get("partCount"))
+        requested = payload.get("partNumbers")
+        uploaded = None
+
+        if requested is None:
+            uploaded = _list_uploaded_parts(bucket, key, item["uploadId"])
+            done = {p["partNumber"] for p in uploaded}
+            requested = [n for n in range(1, part_count + 1) if n not in done][:MULTIPART_URL_BATCH]
+        else:
+            try:
+                requested = sorted({int(n) for n in requested})
+            except (TypeError, ValueError):
+                return build_response(400, {"message": "partNumbers must be integers"})
+            if not requested or len(requested) > MULTIPART_URL_BATCH:
+                return build_response(400, {"message": f"Request 1..{MULTIPART_URL_BATCH} parts at a time"})
+            if requested[0] < 1 or requested[-1] > part_count:
+                return build_response(400, {"message": f"partNumbers must be within 1..{part_count}"})
+
+        body = {
+            "fileId": item["fileId"],
+            "partSizeBytes": _to_int(item.get("partSizeBytes")),
+            "partCount": part_count,
+            "parts": _presign_parts(bucket, key, item["uploadId"], requested),
+            "expiresInSeconds": PRESIGN_PUT_EXPIRES_SECONDS,
+        }
+        if uploaded is not None:
+            body["uploadedParts"] = uploaded
+        return build_response(200, body)
+
+    except Exception as e:
+        logger.exception("Failed to presign multipart parts")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def multipart_complete(ctx: RequestContext):
+    """POST /files/{id}/complete: complete a multipart upload.
+
+    Body: {"parts": [{"partNumber": 1, "etag": "..."}]}; if omitted, parts are listed from S3.
+    The ObjectCreated notification then marks the record ready as for single PUT uploads.
+    """
+    try:
+        item, error = _get_owned_multipart_item(ctx)
+        if error:
+            return error
+        try:
+            payload = _get_json_body(ctx.event)
+        except ValueError:
+            return build_response(400, {"message": "Invalid JSON body"})
+
+        bucket, key = _multipart_location(item)
+        parts = payload.get("parts")
+        if parts is None:
+            parts = _list_uploaded_parts(bucket, key, item["uploadId"])
+        try:
+            s3_parts = sorted(
+                ({"PartNumber": int(p["partNumber"]), "ETag": str(p["etag"])} for p in parts),
+                key=lambda p: p["PartNumber"],
+            )
+        except (KeyError, TypeError, ValueError):
+            return build_response(400, {"message": "parts must be a list of {partNumber, etag}"})
+
+        part_count = _to_int(item.get("partCount"))
+        if [p["PartNumber"] for p in s3_parts] != list(range(1, part_count + 1)):
+            return build_response(400, {"message": f"Expected parts 1..{part_count}", "received": len(s3_parts)})
+
+        try:
+            _s3().complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=item["uploadId"],
+                MultipartUpload={"Parts": s3_parts},
+            )
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall", "NoSuchUpload"):
+                return build_response(400, {"message": "Upload could not be completed", "error": code})
+            raise
+
+        return build_response(200, {"message": "completed", "fileId": item["fileId"]})
+
+    except Exception as e:
+        logger.exception("Failed to complete multipart upload")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def multipart_abort(ctx: RequestContext):
+    """POST /files/{id}/abort: abort a multipart upload and mark the record aborted."""
+    try:
+        item, error = _get_owned_multipart_item(ctx)
+        if error:
+            return error
+
+        bucket, key = _multipart_location(item)
+        try:
+            _s3().abort_multipart_upload(Bucket=bucket, Key=key, UploadId=item["uploadId"])
+        except ClientError as e:
+            # Already aborted/completed upload is fine; anything else is not.
+            if e.response.get("Error", {}).get("Code", "") != "NoSuchUpload":
+                raise
+
+        aborted = _set_status(item, "aborted", "abortedAt", _now_iso(), only_from=("uploading",))
+        file_cache.invalidate(item["fileId"])
+        if not aborted:
+            return build_response(409, {"message": "Upload is no longer in progress"})
+
+        return build_response(200, {"message": "aborted", "fileId": item["fileId"]})
+
+    except Exception as e:
+        logger.exception("Failed to abort multipart upload")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def _counter_shard_key(file_id: str, shard: int) -> dict:
+    return {"PK": f"dc#{file_id}#{shard}", "SK": "dc"}
+
+_pending_downloads: dict[str, list] = {}  # fileId -> [count, last downloadedAt, shards, file key]
+_pending_lock = threading.Lock()
+_last_counter_flush = time.monotonic()
+_unfolded: dict[str, tuple[dict, int]] = {}  # fileId -> (file key, shards) with unfolded increments
+_last_fold: dict[str, float] = {}  # fileId -> monotonic time this container last folded it
+
+def _add_download_shard(file_id: str, shards: int, count: int, downloaded_at: str) -> None:
+    """ADD count to one randomly chosen counter shard of a file.
+
+    Deleting a ready file closes its shards in the same transaction (_set_status), so this
+    fails with ConditionalCheckFailed for a stale cached item, like the single-item counter.
+    """
+    _table().update_item(
+        Key=_counter_shard_key(file_id, random.randrange(shards)),
+        UpdateExpression="ADD downloadCount :n SET downloadedAt = :now",
+        ConditionExpression="attribute_not_exists(closedAt)",
+        ExpressionAttributeValues={":n": count, ":now": downloaded_at},
     )
-    items = resp.get("Items", [])
-    return items[0] if items else None
 
-def admin_view(event):
-    """Returns files view for admin users.
+def _close_download_shards(item: dict, closed_at: str) -> list[dict]:
+    """TransactWriteItems entries that close a file's counter shards (see _add_download_shard)."""
+    shards = _to_int(item.get("downloadShards")) or 0
+    if shards <= 1:
+        return []
+    return [
+        {"Update": {
+            "TableName": _table().name,
+            "Key": _counter_shard_key(item["fileId"], n),
+            "UpdateExpression": "SET closedAt = :ts",
+            "ExpressionAttributeValues": {":ts": closed_at},
+        }}
+        for n in range(shards)
+    ]
+
+def _fold_download_shards(file_id: str, key: dict, shards: int) -> None:
+    """Copy the sum of a file's counter shards onto the file item (shardDownloads, downloadedAt).
+
+    The SET only ever raises the total, so concurrent or stale folds are harmless, and a
+    deleted file is not recreated.
+    """
+    count, last = 0, None
+    keys = [_counter_shard_key(file_id, n) for n in range(shards)]
+    for shard in _batch_get_keys(keys, "downloadCount, downloadedAt", {}):
+        count += _to_int(shard.get("downloadCount")) or 0
+        last = max(filter(None, (last, shard.get("downloadedAt"))), default=None)
+    if not count:
+        return
+    try:
+        _table().update_item(
+            Key=key,
+            UpdateExpression="SET shardDownloads = :n, downloadedAt = :last",
+            ConditionExpression="attribute_exists(PK) AND (attribute_not_exists(shardDownloads) OR shardDownloads < :n)",
+            ExpressionAttributeValues={":n": count, ":last": last},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+
+def _flush_download_counters(force: bool = False) -> None:
+    """Write buffered download increments (one update per file), then fold the shards of
+    files whose last fold in this container is older than DOWNLOAD_COUNTER_FOLD_SECONDS."""
+    global _last_counter_flush
+    now = time.monotonic()
+    with _pending_lock:
+        pending = {}
+        if force or now - _last_counter_flush >= DOWNLOAD_COUNTER_FLUSH_SECONDS:
+            pending = dict(_pending_downloads)
+            _pending_downloads.clear()
+            _last_counter_flush = now
+
+    for file_id, (count, downloaded_at, shards, key) in pending.items():
+        try:
+            _add_download_shard(file_id, shards, count, downloaded_at)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                logger.info("Dropped %s download(s) of closed fileId=%s", count, file_id)
+                file_cache.invalidate(file_id)
+                url_cache.invalidate(file_id)
+            else:
+                logger.exception("Failed to flush %s download(s) for fileId=%s", count, file_id)
+            continue
+        except Exception:
+            logger.exception("Failed to flush %s download(s) for fileId=%s", count, file_id)
+            continue
+        with _pending_lock:
+            _unfolded[file_id] = (key, shards)
+
+    with _pending_lock:
+        due = {file_id: v for file_id, v in _unfolded.items()
+               if force or now - _last_fold.get(file_id, float("-inf")) >= DOWNLOAD_COUNTER_FOLD_SECONDS}
+        for file_id in due:
+            del _unfolded[file_id]
+            _last_fold[file_id] = now
+        if len(_last_fold) > FILE_CACHE_MAX_ENTRIES:  # bound per-container state
+            _last_fold.clear()
+
+    for file_id, (key, shards) in due.items():
+        try:
+            _fold_download_shards(file_id, key, shards)
+        except Exception:
+            logger.exception("Failed to fold download counters for fileId=%s", file_id)
+            with _pending_lock:
+                _unfolded.setdefault(file_id, (key, shards))
+
+def _record_download(item: dict) -> None:
+    """Count one download of a ready item.
+
+    Items created before sharding (no downloadShards) keep the original single-item counter,
+    conditional on the item still being ready; sharded items write to a shard that deletion
+    closes. Either way a stale cached item raises ConditionalCheckFailed. Buffered increments
+    (DOWNLOAD_COUNTER_FLUSH_SECONDS > 0) are only checked at flush, so there a deleted file can
+    still be served until the file cache entry expires.
+    """
+    file_id = item["fileId"]
+    now = _now_iso()
+    shards = _to_int(item.get("downloadShards")) or 0
+
+    if shards <= 1:
+        _table().update_item(
+            Key={"PK": item["PK"], "SK": item["SK"]},
+            UpdateExpression="ADD downloadCount :one SET downloadedAt = :now",
+            ConditionExpression="#s = :ready",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":one": 1,
+                ":now": now,
+                ":ready": "ready",
+            },
+        )
+        return
+
+    key = {"PK": item["PK"], "SK": item["SK"]}
+    if DOWNLOAD_COUNTER_FLUSH_SECONDS <= 0:
+        _add_download_shard(file_id, shards, 1, now)
+        with _pending_lock:
+            _unfolded[file_id] = (key, shards)
+    else:
+        with _pending_lock:
+            entry = _pending_downloads.setdefault(file_id, [0, now, shards, key])
+            entry[0] += 1
+            entry[1] = now
+    _flush_download_counters()
+
+def _batch_get_keys(keys: list[dict], projection: str, names: dict) -> list[dict]:
+    """BatchGetItem in chunks of 100 keys, retrying UnprocessedKeys with backoff."""
+    table_name = _table().name
+    out = []
+    for i in range(0, len(keys), 100):
+        request = {table_name: {"Keys": keys[i:i + 100], "ProjectionExpression": projection}}
+        if names:  # DynamoDB rejects an empty ExpressionAttributeNames map
+            request[table_name]["ExpressionAttributeNames"] = names
+        for attempt in range(5):
+            resp = _ddb().batch_get_item(RequestItems=request)
+            out.extend(resp.get("Responses", {}).get(table_name, []))
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        else:
+            raise RuntimeError(f"BatchGetItem left {len(request[table_name]['Keys'])} keys unprocessed")
+    return out
+
+def _parse_admin_filters(params: dict) -> dict:
+    """status (comma-separated), minSize, maxSize. Raises ValueError on bad sizes."""
+    statuses = [v for v in (params.get("status") or "").split(",") if v]
+    min_size = params.get("minSize")
+    max_size = params.get("maxSize")
+    return {
+        "statuses": statuses,
+        "minSize": int(min_size) if min_size not in (None, "") else None,
+        "maxSize": int(max_size) if max_size not in (None, "") else None,
+    }
+
+def _admin_filter_expression(filters: dict):
+    """Server-side scan filter. Always restricted to file items (SK f#...), so download
+    counter shards and any other non-file items sharing the table never show up."""
+    from boto3.dynamodb.conditions import Attr  # deferred with boto3 (cold start)
+    expr = Attr("SK").begins_with("f#")
+    if filters["statuses"]:
+        expr = expr & Attr("status").is_in(filters["statuses"])
+    if filters["minSize"] is not None:
+        expr = expr & Attr("sizeBytes").gte(filters["minSize"])
+    if filters["maxSize"] is not None:
+        expr = expr & Attr("sizeBytes").lte(filters["maxSize"])
+    return expr
+
+def _scan_segment(segment: int, start_key: dict | None, want: int, filters: dict,
+                  deadline: float) -> tuple[list[dict], dict | None]:
+    """Scan one segment until it yields `want` matches, runs out, or the deadline passes.
+
+    Returns (items, resume key); a None resume key means the segment is exhausted. When a
+    page overshoots, the key of the last kept item is the resume point: a scan continues
+    right after any ExclusiveStartKey within its segment, so nothing is skipped.
+    """
+    kwargs = {
+        "TableName": _table().name,
+        "Segment": segment,
+        "TotalSegments": ADMIN_SCAN_SEGMENTS,
+        "FilterExpression": _admin_filter_expression(filters),
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(ADMIN_FILES_FIELDS))),
+        "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(ADMIN_FILES_FIELDS)},
+        "Limit": ADMIN_SCAN_PAGE_ITEMS,
+    }
+    items: list[dict] = []
+    key = start_key
+    while True:
+        if key:
+            kwargs["ExclusiveStartKey"] = key
+        # The resource's client is thread-safe and keeps the high-level (de)serialization.
+        page = _ddb().meta.client.scan(**kwargs)
+        items.extend(page.get("Items", []))
+        key = page.get("LastEvaluatedKey")
+        if len(items) >= want:
+            if len(items) > want:
+                items = items[:want]
+                key = {"PK": items[-1]["PK"], "SK": items[-1]["SK"]}
+            return items, key
+        if not key or time.monotonic() >= deadline:
+            return items, key
+
+def admin_view(ctx: RequestContext):
+    """Returns files of all users for admin users (GET /admin/files).
 
     Note: Not part of RIRIS base spec (7.3 is 'list my files').
     Keep as explicit extension.
+
+    A parallel scan: ADMIN_SCAN_SEGMENTS segments are read concurrently, each asked for its
+    exact share of `limit` (so a page never exceeds it). Filters (status, minSize, maxSize) are applied server-side.
+    Each request stops after ADMIN_SCAN_TIME_BUDGET_SECONDS, so pages can come back short
+    on a large table; clients follow nextCursor (per-segment positions) until it is null.
     """
-    if not is_admin_user(event):
-        return build_response(403, {"message": "Forbidden: Admin access only"})
+    params = ctx.query
+    try:
+        limit = _resolve_limit(params.get("limit"))
+        filters = _parse_admin_filters(params)
+    except (TypeError, ValueError):
+        return build_response(400, {"message": "Invalid limit or size filter"})
 
-    # We intentionally do not implement "list all users' files" here yet.
-    # That requires a different access pattern / index (or a scan) and is out of spec.
-    return build_response(501, {"message": "Not implemented for admins (out of scope for 7.3)"})
+    # Segment -> resume key (None = start of segment); exhausted segments are dropped.
+    positions: dict[int, dict | None] = {segment: None for segment in range(ADMIN_SCAN_SEGMENTS)}
+    cursor = params.get("cursor")
+    if cursor:
+        try:
+            token = _decode_token(cursor)
+            if not isinstance(token, dict) or token.get("n") != ADMIN_SCAN_SEGMENTS:
+                raise ValueError("Cursor from a different segment layout")
+            positions = {int(segment): key for segment, key in token["p"].items()}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Rejected invalid admin cursor")
+            return build_response(400, {"message": "Invalid cursor"})
 
+    try:
+        # limit // n per segment, one more for the first limit % n. Segments whose share is 0
+        # are not read this time; they keep their position for the next page.
+        ordered = sorted(positions)
+        base, extra = divmod(limit, max(len(ordered), 1))
+        shares = {segment: base + (i < extra) for i, segment in enumerate(ordered)}
+        deadline = time.monotonic() + ADMIN_SCAN_TIME_BUDGET_SECONDS
+        items: list[dict] = []
+        remaining: dict[int, dict | None] = {
+            segment: positions[segment] for segment in ordered if not shares[segment]
+        }
+        scanned = [segment for segment in ordered if shares[segment]]
+        if scanned:
+            with ThreadPoolExecutor(max_workers=min(ADMIN_SCAN_SEGMENTS, len(scanned))) as pool:
+                futures = {
+                    segment: pool.submit(_scan_segment, segment, positions[segment], shares[segment],
+                                         filters, deadline)
+                    for segment in scanned
+                }
+                for segment, future in sorted(futures.items()):
+                    segment_items, next_key = future.result()
+                    items.extend(segment_items)
+                    if next_key:
+                        remaining[segment] = next_key
+
+        out_items = [
+            {
+                **_map_file_item(item),
+                "ownerId": item.get("ownerId"),
+                "email": item.get("email"),
+            }
+            for item in items
+        ]
+        next_cursor = _encode_token({"n": ADMIN_SCAN_SEGMENTS, "p": remaining}) if remaining else None
+        return build_response(200, {"items": out_items, "nextCursor": next_cursor})
 
-def user_files_view(event):
-    """Returns files view for ordinary users (GET /files)."""
-    owner_id = _get_owner_id(event)
-    if not owner_id:
-        return build_response(401, {"message": "Unauthorized"})
+    except Exception as e:
+        logger.exception("Failed to fetch admin files view")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+
+def _user_files_query(owner_id: str, limit: int) -> dict:
+    """Query kwargs for one page of the owner's file items (USER_FILES_FIELDS only)."""
+    from boto3.dynamodb.conditions import Key  # deferred with boto3 (cold start)
+    return {
+        "KeyConditionExpression": Key("PK").eq(f"u#{owner_id}") & Key("SK").begins_with("f#"),
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(USER_FILES_FIELDS))),
+        "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(USER_FILES_FIELDS)},
+        "Limit": limit,
+    }
 
+def _shape_user_files(items: list[dict]) -> list[dict]:
+    """File items as the user sees them (spec 7.3), folded download counter shards included."""
+    out_items = []
+    for item in items:
+        out_items.append(
+            {
+                "fileId": item.get("fileId"),
+                "originalFileName": item.get("originalFileName"),
+                "contentType": item.get("contentType"),
+                "sizeBytes": _to_int(item.get("sizeBytes")),
+                "status": item.get("status"),
+                "createdAt": item.get("createdAt"),
+                "expiresAt": item.get("expiresAt"),
+                "passwordRequired": bool(item.get("passwordRequired", False)),
+                "downloadCount": (_to_int(item.get("downloadCount", 0)) or 0)
+                                 + (_to_int(item.get("shardDownloads", 0)) or 0),
+                "downloadedAt": item.get("downloadedAt"),
+            }
+        )
+    return out_items
+
+def user_files_view(ctx: RequestContext):
+    """Returns one page of files for ordinary users (GET /files?limit=&cursor=)."""
+    owner_id = ctx.owner_id
     pk = f"u#{owner_id}"
-    sk_prefix = "f#"
+    params = ctx.query
 
     try:
-        response = table.query(
-            KeyConditionExpression=Key("PK").eq(pk) & Key("SK").begins_with(sk_prefix)
-        )
-        items = response.get("Items", [])
-
-        # Shape the output strictly per spec 7.3
-        out_items = []
-        for item in items:
-            out_items.append(
-                {
-                    "fileId": item.get("fileId"),
-                    "originalFileName": item.get("originalFileName"),
-                    "contentType": item.get("contentType"),
-                    "sizeBytes": _to_int(item.get("sizeBytes")),
-                    "status": item.get("status"),
-                    "createdAt": item.get("createdAt"),
-                    "expiresAt": item.get("expiresAt"),
-                    "passwordRequired": bool(item.get("passwordRequired", False)),
-                    "downloadCount": _to_int(item.get("downloadCount", 0)),
-                    "downloadedAt": item.get("downloadedAt"),
-                }
-            )
+        limit = _resolve_limit(params.get("limit"))
+    except (TypeError, ValueError):
+        return build_response(400, {"message": "Invalid limit"})
+
+    query_kwargs = _user_files_query(owner_id, limit)
+
+    cursor = params.get("cursor")
+    if cursor:
+        try:
+            query_kwargs["ExclusiveStartKey"] = _decode_cursor(cursor, pk)
+        except ValueError:
+            logger.warning("Rejected invalid cursor for ownerId=%s", owner_id)
+            return build_response(400, {"message": "Invalid cursor"})
+
+    try:
+        response = _table().query(**query_kwargs)
+        out_items = _shape_user_files(response.get("Items", []))
+
+        last_key = response.get("LastEvaluatedKey")
+        next_cursor = _encode_cursor(last_key) if last_key else None
 
-        return build_response(200, {"items": out_items})
+        etag = _compute_etag(next_cursor, [tuple(i.values()) for i in out_items])
+        return build_conditional_response(ctx.event, {"items": out_items, "nextCursor": next_cursor}, etag)
 
     except Exception as e:
         logger.exception("Failed to fetch user files view")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
 
-def delete_file(event):
-    """Deletes a file (owner-only). Implements DELETE /files/{id}."""
-    owner_id = _get_owner_id(event)
-    if not owner_id:
-        return build_response(401, {"message": "Unauthorized"})
+def _iter_user_files(owner_id: str):
+    """Yield all of the owner's files, shaped as in the listing, one query page at a time."""
+    query_kwargs = _user_files_query(owner_id, EXPORT_PAGE_ITEMS)
+    while True:
+        response = _table().query(**query_kwargs)
+        yield from _shape_user_files(response.get("Items", []))
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+def _export_lines(rows, fmt: str):
+    """Encode rows as NDJSON lines or CSV records (header first), one bytes object each."""
+    if fmt == "ndjson":
+        for row in rows:
+            yield (json.dumps(row, separators=(",", ":")) + "\n").encode()
+        return
+    columns = None
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        if columns is None:
+            columns = list(row)
+            writer.writerow(columns)
+        writer.writerow(["" if row[c] is None else row[c] for c in columns])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+
+def _chunked(lines, size: int):
+    """Regroup byte strings into chunks of at least `size` bytes (the last may be shorter)."""
+    buf = bytearray()
+    for line in lines:
+        buf += line
+        if len(buf) >= size:
+            yield bytes(buf)
+            buf.clear()
+    yield bytes(buf)
+
+def _upload_stream(bucket: str, key: str, chunks, content_type: str) -> int:
+    """Write chunks to one S3 object: a single PUT if there is only one, else a multipart
+    upload with a part per chunk (aborted on failure). Returns the object size."""
+    chunks = iter(chunks)
+    first = next(chunks)
+    second = next(chunks, None)
+    if second is None:
+        _s3().put_object(Bucket=bucket, Key=key, Body=first, ContentType=content_type)
+        return len(first)
+
+    upload_id = _s3().create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+    try:
+        parts, size = [], 0
+        for number, chunk in enumerate(chain((first, second), chunks), start=1):
+            if not chunk:
+                continue  # the final chunk is empty when the data ended on a part boundary
+            resp = _s3().upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=chunk)
+            parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+            size += len(chunk)
+        _s3().complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        return size
+    except Exception:
+        try:
+            _s3().abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            logger.warning("Could not abort export upload %s", key, exc_info=True)
+        raise
+
+def _export_key(owner_id: str, export_id: str) -> dict:
+    return {"PK": f"u#{owner_id}", "SK": f"x#{export_id}"}
+
+def export_files(ctx: RequestContext):
+    """POST /files/export?format=ndjson|csv: start an export of the caller's whole inventory.
+
+    Records a pending export and hands it to the export worker (export_handler) with an
+    async invoke, so the request returns at once however large the inventory is. Returns 202
+    with the exportId to poll at GET /files/export/{id}.
+    """
+    owner_id = ctx.owner_id
+    fmt = (ctx.query.get("format") or "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return build_response(400, {"message": f"format must be one of: {', '.join(EXPORT_FORMATS)}"})
+
+    export_id = str(uuid.uuid4())
+    try:
+        _table().put_item(Item={
+            **_export_key(owner_id, export_id),
+            "exportId": export_id,
+            "ownerSub": owner_id,
+            "status": "pending",
+            "format": fmt,
+            "createdAt": _now_iso(),
+            EXPIRY_TTL_ATTRIBUTE: int(time.time()) + EXPORT_RECORD_TTL_SECONDS,
+        })
+        _lambda().invoke(
+            FunctionName=os.environ["EXPORT_FUNCTION_NAME"],
+            InvocationType="Event",
+            Payload=json.dumps({"ownerId": owner_id, "exportId": export_id, "format": fmt}).encode(),
+        )
+        return build_response(202, {"exportId": export_id, "status": "pending", "format": fmt})
+
+    except Exception as e:
+        logger.exception("Failed to start export for ownerId=%s", owner_id)
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
 
-    file_id = _get_path_param_file_id(event)
+def export_status(ctx: RequestContext):
+    """GET /files/export/{id}: an export's status, with a presigned download link once ready."""
+    export_id = ctx.file_id
+    if not export_id:
+        return build_response(400, {"message": "Missing exportId in path"})
+
+    try:
+        # Owner check is implicit: only fetch within caller's partition.
+        item = _table().get_item(Key=_export_key(ctx.owner_id, export_id)).get("Item")
+        if not item:
+            return build_response(404, {"message": "Export not found"})
+
+        status = item.get("status")
+        created = _parse_iso(item.get("createdAt") or "")
+        if status == "pending" and created and time.time() - created.timestamp() > EXPORT_STALE_SECONDS:
+            status = "failed"  # the worker timed out or was never invoked
+        body = {
+            "exportId": export_id,
+            "status": status,
+            "format": item.get("format"),
+            "createdAt": item.get("createdAt"),
+            "completedAt": item.get("completedAt"),
+        }
+        if status == "ready":
+            filename = f"riris-files-{item['createdAt'][:10]}.{item['format']}"
+            body.update({
+                "files": _to_int(item.get("files")),
+                "sizeBytes": _to_int(item.get("sizeBytes")),
+                "url": _s3().generate_presigned_url(
+                    ClientMethod="get_object",
+                    Params={"Bucket": os.environ["FILES_BUCKET"], "Key": item["s3Key"],
+                            "ResponseContentDisposition": f'attachment; filename="{filename}"'},
+                    ExpiresIn=PRESIGN_GET_EXPIRES_SECONDS,
+                ),
+                "expiresIn": PRESIGN_GET_EXPIRES_SECONDS,
+            })
+        return build_response(200, body)
+
+    except Exception as e:
+        logger.exception("Failed to read export %s", export_id)
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def _run_export(owner_id: str, export_id: str, fmt: str) -> dict:
+    """Page through the owner's partition and stream encoded rows into one S3 object."""
+    key = f"{EXPORT_PREFIX}/{owner_id}/{export_id}.{fmt}"
+    files = 0
+
+    def rows():
+        nonlocal files
+        for row in _iter_user_files(owner_id):
+            files += 1
+            yield row
+
+    size = _upload_stream(os.environ["FILES_BUCKET"], key,
+                          _chunked(_export_lines(rows(), fmt), EXPORT_PART_BYTES), EXPORT_FORMATS[fmt])
+    return {"s3Key": key, "files": files, "sizeBytes": size}
+
+def export_handler(event, context):  # pylint: disable=unused-argument
+    """Export worker (ExportFilesFunction), invoked asynchronously by export_files.
+
+    Writes the inventory and records the outcome on the export item; a failure is recorded
+    rather than raised, so Lambda does not retry a half-written export.
+    """
+    owner_id, export_id, fmt = event["ownerId"], event["exportId"], event["format"]
+    try:
+        outcome = {"status": "ready", **_run_export(owner_id, export_id, fmt)}
+    except Exception as e:
+        logger.exception("Failed to export files for ownerId=%s", owner_id)
+        outcome = {"status": "failed", "error": str(e)}
+    outcome["completedAt"] = _now_iso()
+
+    names = {f"#a{i}": name for i, name in enumerate(outcome)}
+    _table().update_item(
+        Key=_export_key(owner_id, export_id),
+        UpdateExpression="SET " + ", ".join(f"#a{i} = :a{i}" for i in range(len(outcome))),
+        ConditionExpression="attribute_exists(PK)",
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f":a{i}": value for i, value in enumerate(outcome.values())},
+    )
+    return {"exportId": export_id, "status": outcome["status"]}
+
+def _invalidate_cdn(object_keys: list[str]) -> None:
+    """Invalidate deleted objects on the files distribution (cloudfront mode). Best-effort:
+    until an invalidation completes, edge caches may still serve the object."""
+    if DOWNLOAD_MODE != "cloudfront" or not CLOUDFRONT_DISTRIBUTION_ID or not object_keys:
+        return
+    paths = sorted({f"/{quote(k)}" for k in object_keys})
+    for i in range(0, len(paths), CLOUDFRONT_INVALIDATION_BATCH):
+        chunk = paths[i:i + CLOUDFRONT_INVALIDATION_BATCH]
+        try:
+            _cloudfront().create_invalidation(
+                DistributionId=CLOUDFRONT_DISTRIBUTION_ID,
+                InvalidationBatch={"Paths": {"Quantity": len(chunk), "Items": chunk},
+                                   "CallerReference": str(uuid.uuid4())},
+            )
+            metrics.count("CdnInvalidatedPaths", len(chunk))
+        except Exception:
+            logger.exception("Failed to invalidate %d path(s) on the files distribution: %s",
+                             len(chunk), json.dumps(chunk[:20]))
+
+def delete_file(ctx: RequestContext):
+    """Deletes a file (owner-only). Implements DELETE /files/{id}."""
+    owner_id = ctx.owner_id
+    file_id = ctx.file_id
     if not file_id:
         return build_response(400, {"message": "Missing fileId in path"})
 
@@ -225,7 +1421,7 @@ def delete_file(event):
 
     try:
         # Owner check is implicit: only fetch within caller's partition.
-        resp = table.get_item(Key={"PK": pk, "SK": sk})
+        resp = _table().get_item(Key={"PK": pk, "SK": sk})
         item = resp.get("Item")
         if not item:
             # Not found under caller -> not allowed to delete
@@ -233,28 +1429,34 @@ def delete_file(event):
 
         # If already deleted, treat as idempotent delete
         status = item.get("status")
-        s3_prefix = item.get("s3Prefix") or os.getenv("S3_PREFIX", "files")
+        if status == "deleted":
+            return build_response(200, {"message": "deleted", "fileId": file_id})
         bucket = os.environ.get("FILES_BUCKET")
-        object_key = f"{s3_prefix}/{file_id}"
+        object_key = _object_key(item)
+
+        # A multipart upload still in flight keeps billing for its parts until aborted.
+        if bucket and status == "uploading" and item.get("uploadId"):
+            try:
+                _s3().abort_multipart_upload(Bucket=bucket, Key=object_key, UploadId=item["uploadId"])
+            except Exception:
+                logger.warning("Could not abort multipart upload for fileId=%s", file_id, exc_info=True)
 
         # Delete from S3 (best-effort idempotent; deleting non-existing is not fatal)
         if bucket:
 #            s3 = boto3.client("s3")
             try:
-                s3.delete_object(Bucket=bucket, Key=object_key)
+                _s3().delete_object(Bucket=bucket, Key=object_key)
             except Exception:
                 logger.exception("Failed to delete S3 object: s3://%s/%s", bucket, object_key)
                 # If S3 delete fails, we should not mark DDB deleted.
                 return build_response(500, {"message": "Internal server error", "error": "Failed to delete S3 object"})
+            _invalidate_cdn([object_key])
 
         # Update DDB status -> deleted
         # (Spec requires status updated to deleted; we also set deletedAt for traceability.)
-        table.update_item(
-            Key={"PK": pk, "SK": sk},
-            UpdateExpression="SET #st = :deleted, deletedAt = :ts",
-            ExpressionAttributeNames={"#st": "status"},
-            ExpressionAttributeValues={":deleted": "deleted", ":ts": _now_iso()},
-        )
+        _mark_deleted(item, _now_iso())
+        file_cache.invalidate(file_id)
+        url_cache.invalidate(file_id)
 
         return build_response(200, {"message": "deleted", "fileId": file_id})
 
@@ -262,9 +1464,124 @@ def delete_file(event):
         logger.exception("Failed to delete file")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
 
-def public_download(event):
+def _mark_deleted(item: dict, deleted_at: str) -> None:
+    """Set status=deleted on one item and release its usage (safe to call from threads)."""
+    _set_status(item, "deleted", "deletedAt", deleted_at)
+
+def bulk_delete_files(ctx: RequestContext):
+    """Deletes many files (owner-only). Implements DELETE /files with {"fileIds": [...]}.
+
+    Ownership is checked with BatchGetItem inside the caller's partition, objects are removed
+    with DeleteObjects (1000 keys per call) and records are marked deleted in parallel.
+    Results are reported per fileId; an id whose object could not be deleted is not marked.
+    """
+    owner_id = ctx.owner_id
+    try:
+        payload = _get_json_body(ctx.event)
+    except ValueError:
+        return build_response(400, {"message": "Invalid JSON body"})
+
+    file_ids = payload.get("fileIds")
+    if not isinstance(file_ids, list) or not file_ids or not all(isinstance(f, str) and f for f in file_ids):
+        return build_response(400, {"message": "fileIds must be a non-empty list of ids"})
+    file_ids = list(dict.fromkeys(file_ids))
+    if len(file_ids) > BULK_DELETE_MAX:
+        return build_response(400, {"message": f"At most {BULK_DELETE_MAX} fileIds per request"})
+
+    pk = f"u#{owner_id}"
+    results: dict[str, dict] = {}
+
+    try:
+        # Owner check is implicit: only fetch within caller's partition.
+        found = _batch_get_keys(
+            [{"PK": pk, "SK": f"f#{file_id}"} for file_id in file_ids],
+            "PK, SK, fileId, #st, s3Key, s3Prefix, uploadId, sizeBytes, storedBytes, usageTracked, downloadShards",
+            {"#st": "status"},
+        )
+        items = {item["fileId"]: item for item in found}
+        for file_id in file_ids:
+            if file_id not in items:
+                results[file_id] = {"fileId": file_id, "status": 403, "message": "Forbidden: owner access only"}
+
+        bucket = os.environ.get("FILES_BUCKET")
+        if bucket:
+            for item in items.values():
+                # A multipart upload still in flight keeps billing for its parts until aborted.
+                if item.get("status") == "uploading" and item.get("uploadId"):
+                    try:
+                        _s3().abort_multipart_upload(Bucket=bucket, Key=_object_key(item), UploadId=item["uploadId"])
+                    except Exception:
+                        logger.warning("Could not abort multipart upload for fileId=%s", item["fileId"], exc_info=True)
+
+            by_key = {_object_key(item): item["fileId"] for item in items.values()}
+            keys = list(by_key)
+            removed = set(keys)
+            for i in range(0, len(keys), S3_DELETE_BATCH):
+                chunk = keys[i:i + S3_DELETE_BATCH]
+                try:
+                    resp = _s3().delete_objects(
+                        Bucket=bucket,
+                        Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+                    )
+                    failed = [(e.get("Key"), e.get("Code")) for e in resp.get("Errors", [])]
+                except Exception as e:
+                    logger.exception("DeleteObjects failed for %d keys", len(chunk))
+                    failed = [(k, str(e)) for k in chunk]
+                for key, code in failed:
+                    removed.discard(key)
+                    # If S3 delete fails, we should not mark DDB deleted.
+                    file_id = by_key.get(key)
+                    if file_id:
+                        results[file_id] = {"fileId": file_id, "status": 500, "message": "Failed to delete S3 object",
+                                            "error": code}
+            _invalidate_cdn(sorted(removed))
+
+        for file_id, item in items.items():
+            if item.get("status") == "deleted" and file_id not in results:
+                results[file_id] = {"fileId": file_id, "status": 200, "message": "deleted"}
+        to_mark = [item for file_id, item in items.items() if file_id not in results]
+        deleted_at = _now_iso()
+        if to_mark:
+            with ThreadPoolExecutor(max_workers=max(1, min(BULK_WORKERS, len(to_mark)))) as pool:
+                futures = [(item, pool.submit(_mark_deleted, item, deleted_at)) for item in to_mark]
+                for item, future in futures:
+                    file_id = item["fileId"]
+                    try:
+                        future.result()
+                        results[file_id] = {"fileId": file_id, "status": 200, "message": "deleted"}
+                    except Exception as e:
+                        logger.error("Failed to mark fileId=%s deleted: %s", file_id, e)
+                        results[file_id] = {"fileId": file_id, "status": 500, "message": "Internal server error",
+                                            "error": str(e)}
+                    file_cache.invalidate(file_id)
+                    url_cache.invalidate(file_id)
+
+        ordered = [results[file_id] for file_id in file_ids]
+        return build_response(200, {
+            "deleted": sum(1 for r in ordered if r["status"] == 200),
+            "failed": sum(1 for r in ordered if r["status"] != 200),
+            "results": ordered,
+        })
+
+    except Exception as e:
+        logger.exception("Failed to bulk delete files")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def _signed_download_url(bucket: str, object_key: str, signed_at: float) -> str:
+    """Download URL valid for PRESIGN_GET_EXPIRES_SECONDS, per DOWNLOAD_MODE."""
+    if DOWNLOAD_MODE == "cloudfront":
+        expires = datetime.fromtimestamp(int(signed_at) + PRESIGN_GET_EXPIRES_SECONDS, timezone.utc)
+        return _cloudfront_signer().generate_presigned_url(
+            f"https://{CLOUDFRONT_DOMAIN}/{quote(object_key)}", date_less_than=expires)
+    return _s3().generate_presigned_url(
+        ClientMethod="get_object",
+        Params={"Bucket": bucket, "Key": object_key},
+        ExpiresIn=PRESIGN_GET_EXPIRES_SECONDS,
+    )
+
+def public_download(ctx: RequestContext):
     """Public download: GET /files/{id} -> 302 redirect to presigned S3 GET."""
-    file_id = (event.get("pathParameters") or {}).get("id") or (event.get("pathParameters") or {}).get("fileId")
+    file_id = ctx.file_id
     if not file_id:
         return build_response(400, {"message": "Missing fileId in path"})
 
@@ -285,31 +1602,28 @@ def public_download(event):
             return build_response(404, {"message": "Not found"})
 
         bucket = os.environ["FILES_BUCKET"]
-        s3_prefix = item.get("s3Prefix") or os.getenv("S3_PREFIX", "files")
-        object_key = f"{s3_prefix}/{file_id}"
+        object_key = _object_key(item)
 
         # Update DDB metrics (best-effort but atomic). Only for ready items.
         try:
-            table.update_item(
-                Key={"PK": item["PK"], "SK": item["SK"]},
-                UpdateExpression="ADD downloadCount :one SET downloadedAt = :now",
-                ConditionExpression="#s = :ready",
-                ExpressionAttributeNames={"#s": "status"},
-                ExpressionAttributeValues={
-                    ":one": 1,
-                    ":now": _now_iso(),
-                    ":ready": "ready",
-                },
-            )
+            _record_download(item)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                # Status changed under us (deleted/expired elsewhere): drop the stale entry, refuse.
+                file_cache.invalidate(file_id)
+                url_cache.invalidate(file_id)
+                return build_response(404, {"message": "Not found"})
+            logger.exception("Failed to update download metrics for fileId=%s", file_id)
         except Exception:
             # Do not block download if metrics update fails.
             logger.exception("Failed to update download metrics for fileId=%s", file_id)
 
-        url = s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": bucket, "Key": object_key},
-            ExpiresIn=int(os.getenv("PRESIGN_GET_EXPIRES_SECONDS", "900")),
-        )
+        url = url_cache.get(file_id, object_key)
+        metrics.count("UrlCacheHit" if url else "UrlCacheMiss")
+        if url is None:
+            signed_at = time.time()
+            url = _signed_download_url(bucket, object_key, signed_at)
+            url_cache.put(file_id, object_key, url, signed_at, PRESIGN_GET_EXPIRES_SECONDS)
 
         return build_redirect(url)
 
@@ -323,165 +1637,541 @@ def public_download(event):
         logger.exception("Failed public download")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
 
-def post_files(event):
-    """Initialize upload: create DDB record + return presigned PUT URL."""
-    owner_id = _get_sub(event)
-    email = _get_email(event)
+def _usage_reserve(pk: str, count: int, size: int) -> dict | None:
+    """Transaction entry adding count files / size bytes to the user's usage.
 
-    if not owner_id:
-        return build_response(401, {"message": "Unauthorized"})
+    The quota check is a condition on the same update, so concurrent uploads cannot overshoot
+    it. (Conditions cannot do arithmetic, hence the precomputed room.) None if the request
+    could never fit.
+    """
+    values = {":n": count, ":b": size, ":ts": _now_iso()}
+    conditions = []
+    if USER_QUOTA_BYTES:
+        if size > USER_QUOTA_BYTES:
+            return None
+        conditions.append("(attribute_not_exists(usedBytes) OR usedBytes <= :roomBytes)")
+        values[":roomBytes"] = USER_QUOTA_BYTES - size
+    if USER_QUOTA_FILES:
+        if count > USER_QUOTA_FILES:
+            return None
+        conditions.append("(attribute_not_exists(fileCount) OR fileCount <= :roomFiles)")
+        values[":roomFiles"] = USER_QUOTA_FILES - count
+
+    update = {
+        "TableName": _table().name,
+        "Key": {"PK": pk, "SK": USAGE_SK},
+        "UpdateExpression": "ADD fileCount :n, usedBytes :b SET updatedAt = :ts",
+        "ExpressionAttributeValues": values,
+    }
+    if conditions:
+        update["ConditionExpression"] = " AND ".join(conditions)
+    return {"Update": update}
+
+def _holds_usage(item: dict) -> bool:
+    """Records written before usage tracking never added to the aggregate, so never subtract them."""
+    return bool(item.get("usageTracked")) and item.get("status") in USAGE_STATUSES
+
+def _usage_release(item: dict) -> dict:
+    """Transaction entry giving back what a file holds; ready files also leave the ready totals."""
+    expr = "ADD fileCount :n, usedBytes :b"
+    values = {":n": -1, ":b": -(_to_int(item.get("sizeBytes")) or 0), ":ts": _now_iso()}
+    if item.get("status") == "ready":
+        expr += ", readyCount :n, readyBytes :rb"
+        values[":rb"] = -(_to_int(item.get("storedBytes")) or 0)
+    return {"Update": {
+        "TableName": _table().name,
+        "Key": {"PK": item["PK"], "SK": USAGE_SK},
+        "UpdateExpression": f"{expr} SET updatedAt = :ts",
+        "ExpressionAttributeValues": values,
+    }}
+
+def _transaction_conflict(e: ClientError, index: int) -> bool:
+    """True if a TransactWriteItems call was cancelled by the condition on entry `index`."""
+    if e.response.get("Error", {}).get("Code", "") != "TransactionCanceledException":
+        return False
+    reasons = e.response.get("CancellationReasons") or []
+    return index < len(reasons) and reasons[index].get("Code") == "ConditionalCheckFailed"
+
+def _set_status(item: dict, status: str, stamp_attr: str, stamp: str, only_from: tuple | None = None) -> bool:
+    """Move a file out of its current status, releasing its usage in the same transaction.
+
+    The status condition keeps a concurrent change (e.g. the upload completing) from being
+    overwritten with stale usage numbers; in that case the record is re-read and retried,
+    unless its new status is not in `only_from`. Returns False if nothing was changed.
+    """
+    client = _ddb().meta.client  # thread-safe, keeps plain Python values (unlike the resource)
+    key = {"PK": item["PK"], "SK": item["SK"]}
+    for attempt in range(3):
+        update = {
+            "TableName": _table().name,
+            "Key": key,
+            "UpdateExpression": f"SET #st = :new, {stamp_attr} = :ts REMOVE pendingShard",
+            "ConditionExpression": "#st = :old",
+            "ExpressionAttributeNames": {"#st": "status"},
+            "ExpressionAttributeValues": {":new": status, ":old": item.get("status"), ":ts": stamp},
+        }
+        entries = [{"Update": update}]
+        if _holds_usage(item):
+            entries.append(_usage_release(item))
+        if item.get("status") == "ready":
+            entries.extend(_close_download_shards(item, stamp))
+        try:
+            client.transact_write_items(TransactItems=entries)
+            return True
+        except ClientError as e:
+            if not _transaction_conflict(e, 0) or attempt == 2:
+                raise
+        item = client.get_item(TableName=_table().name, Key=key).get("Item")
+        if not item or item.get("status") == status or (only_from and item.get("status") not in only_from):
+            return False
+
+def _usage_view(ctx: RequestContext):
+    """GET /usage: the caller's file count and bytes plus quotas - one GetItem."""
+    owner_id = ctx.owner_id
 
     try:
-        body = event.get("body") or "{}"
-        payload = json.loads(body) if isinstance(body, str) else (body or {})
-        original_file_name = payload.get("originalFileName")
-        content_type = payload.get("contentType") or "application/octet-stream"
-        size_bytes = payload.get("sizeBytes")
-        expires_in_days = payload.get("expiresInDays")
-
-        if not original_file_name:
-            return build_response(400, {"message": "Missing originalFileName"})
-        if size_bytes is None:
-            return build_response(400, {"message": "Missing sizeBytes"})
-
-        days = _resolve_expiry_days(expires_in_days)
-        created_at = _now_iso()
-        expires_at = (
-                datetime.now(timezone.utc) + timedelta(days=days)
-        ).isoformat().replace("+00:00", "Z")
-
-        file_id = str(uuid.uuid4())
-        pk = f"u#{owner_id}"
-        sk = f"f#{file_id}"
-        s3_prefix = os.environ.get("S3_PREFIX", "files")
-        bucket = os.environ["FILES_BUCKET"]
-        key = f"{s3_prefix}/{file_id}"
-
-        item = {
-            "PK": pk,
-            "SK": sk,
-            "fileId": file_id,
-            "ownerId": owner_id,
-            "email": email,
-            "s3Prefix": s3_prefix,
-            "originalFileName": original_file_name,
-            "contentType": content_type,
-            "sizeBytes": int(size_bytes),
-            "status": "uploading",
-            "createdAt": created_at,
-            "expiresAt": expires_at,
-            # future feature
-            "passwordRequired": False,
+        usage = _table().get_item(Key={"PK": f"u#{owner_id}", "SK": USAGE_SK}).get("Item") or {}
+        return build_response(200, {
+            "fileCount": _to_int(usage.get("fileCount")) or 0,
+            "usedBytes": _to_int(usage.get("usedBytes")) or 0,
+            "readyCount": _to_int(usage.get("readyCount")) or 0,
+            "readyBytes": _to_int(usage.get("readyBytes")) or 0,
+            "quotaBytes": USER_QUOTA_BYTES or None,
+            "quotaFiles": USER_QUOTA_FILES or None,
+        })
+    except Exception as e:
+        logger.exception("Failed to fetch usage")
+        return build_response(500, {"message": "Internal server error", "error": str(e)})
+
+def _abort_multipart_quietly(bucket: str, item: dict) -> None:
+    try:
+        _s3().abort_multipart_upload(Bucket=bucket, Key=item["s3Key"], UploadId=item["uploadId"])
+    except Exception:
+        logger.warning("Could not abort multipart upload for fileId=%s", item["fileId"], exc_info=True)
+
+def _put_with_usage(items: list[dict]) -> bool:
+    """Write new upload records and reserve their usage in one transaction (<= 99 items).
+    False if the quota does not allow them."""
+    reserve = _usage_reserve(items[0]["PK"], len(items), sum(item["sizeBytes"] for item in items))
+    if reserve is None:
+        return False
+    entries = [
+        {"Put": {"TableName": _table().name, "Item": item, "ConditionExpression": "attribute_not_exists(PK)"}}
+        for item in items
+    ]
+    try:
+        _ddb().meta.client.transact_write_items(TransactItems=entries + [reserve])
+        return True
+    except ClientError as e:
+        if _transaction_conflict(e, len(entries)):
+            return False
+        raise
+
+def _parse_upload_request(payload) -> tuple[dict | None, str | None]:
+    """Validate one file descriptor. Returns (fields, None) or (None, error message)."""
+    if not isinstance(payload, dict):
+        return None, "Entry must be a JSON object"
+    original_file_name = payload.get("originalFileName")
+    size_bytes = payload.get("sizeBytes")
+
+    if not original_file_name:
+        return None, "Missing originalFileName"
+    if size_bytes is None:
+        return None, "Missing sizeBytes"
+    try:
+        size_bytes = int(size_bytes)
+    except (TypeError, ValueError):
+        return None, "Invalid sizeBytes"
+    if size_bytes < 0 or size_bytes > S3_MAX_OBJECT_BYTES:
+        return None, "sizeBytes out of range"
+
+    sha256 = None
+    if payload.get("sha256"):
+        sha256 = _normalize_sha256(payload["sha256"])
+        if not sha256:
+            return None, "Invalid sha256"
+
+    return {
+        "originalFileName": original_file_name,
+        "contentType": payload.get("contentType") or "application/octet-stream",
+        "sizeBytes": size_bytes,
+        "expiresInDays": payload.get("expiresInDays"),
+        "sha256": sha256,
+    }, None
+
+def _normalize_sha256(value) -> str | None:
+    """SHA-256 as hex or base64 -> base64, the form S3 uses for ChecksumSHA256."""
+    if not isinstance(value, str):
+        return None
+    try:
+        digest = bytes.fromhex(value) if len(value) == 64 else base64.b64decode(value, validate=True)
+    except ValueError:
+        return None
+    return base64.b64encode(digest).decode("ascii") if len(digest) == 32 else None
+
+def _content_key(owner_id: str, sha256: str, size_bytes: int) -> str:
+    # Scoped to the owner: no probing for other users' content, no objects shared across
+    # users (deleting one record would take the object away from the other).
+    return f"{owner_id}#{sha256}#{size_bytes}"
+
+def _find_duplicate(owner_id: str, sha256: str, size_bytes: int) -> dict | None:
+    """A ready, unexpired file of the owner with this exact content, via the checksum index.
+
+    Only single-PUT uploads are indexed: S3 verified their checksum when the object was
+    written, so a hit is known to be identical content. Safe to call from threads.
+    """
+    resp = _ddb().meta.client.query(
+        TableName=_table().name,
+        IndexName=CHECKSUM_INDEX,
+        KeyConditionExpression="contentKey = :k",
+        ExpressionAttributeValues={":k": _content_key(owner_id, sha256, size_bytes)},
+    )
+    for item in resp.get("Items", []):
+        if item.get("status") == "ready" and not _is_expired(item):
+            return item
+    return None
+
+def _already_present(item: dict) -> dict:
+    """Init response for content the owner already has: no record, no upload."""
+    return {
+        "fileId": item["fileId"],
+        "alreadyPresent": True,
+        "originalFileName": item.get("originalFileName"),
+        "upload": {"method": "NONE"},
+    }
+
+def _new_upload_item(owner_id: str, email: str | None, fields: dict) -> dict:
+    """Build the 'uploading' record for a validated file descriptor."""
+    days = _resolve_expiry_days(fields["expiresInDays"])
+    expires = datetime.now(timezone.utc) + timedelta(days=days)
+    expires_at = expires.isoformat().replace("+00:00", "Z")
+
+    file_id = str(uuid.uuid4())
+    s3_prefix = os.environ.get("S3_PREFIX", "files")
+    return {
+        "PK": f"u#{owner_id}",
+        "SK": f"f#{file_id}",
+        "fileId": file_id,
+        "ownerId": owner_id,
+        "email": email,
+        "s3Prefix": s3_prefix,
+        # Owner-scoped key: the object-created handler derives PK/SK from it without an index query.
+        "s3Key": f"{s3_prefix}/{owner_id}/{file_id}",
+        "originalFileName": fields["originalFileName"],
+        "contentType": fields["contentType"],
+        "sizeBytes": fields["sizeBytes"],
+        "status": "uploading",
+        # Sparse GSI2 key: present only while uploading, so the upload reaper can find
+        # stale uploads by index instead of a scan. Removed on every status change.
+        "pendingShard": _pending_shard(file_id),
+        "downloadShards": DOWNLOAD_COUNTER_SHARDS,
+        "createdAt": _now_iso(),
+        "expiresAt": expires_at,
+        # DynamoDB TTL removes the record after expiry; ExpiredFilesFunction then deletes the object.
+        EXPIRY_TTL_ATTRIBUTE: int(expires.timestamp()),
+        # future feature
+        "passwordRequired": False,
+        # Counted in the usage item; see _holds_usage.
+        "usageTracked": True,
+        **_checksum_attributes(owner_id, fields),
+    }
+
+def _checksum_attributes(owner_id: str, fields: dict) -> dict:
+    """Checksum attributes; only single-PUT uploads (S3-verified) enter the checksum index."""
+    if not fields.get("sha256"):
+        return {}
+    attrs = {"checksumSha256": fields["sha256"]}
+    if fields["sizeBytes"] <= MULTIPART_THRESHOLD_BYTES:
+        attrs["contentKey"] = _content_key(owner_id, fields["sha256"], fields["sizeBytes"])
+    return attrs
+
+def _start_multipart(bucket: str, item: dict) -> None:
+    """Create the S3 multipart upload for a large file and record it on the item."""
+    part_size = _resolve_part_size(item["sizeBytes"])
+    mpu = _s3().create_multipart_upload(Bucket=bucket, Key=item["s3Key"], ContentType=item["contentType"])
+    item.update({
+        "uploadMode": "multipart",
+        "uploadId": mpu["UploadId"],
+        "partSizeBytes": part_size,
+        "partCount": -(-item["sizeBytes"] // part_size),
+    })
+
+def _upload_instructions(bucket: str, item: dict) -> dict:
+    """The "upload" part of the init response: a presigned PUT, or the first batch of part URLs."""
+    if item.get("uploadMode") == "multipart":
+        first_batch = range(1, min(item["partCount"], MULTIPART_URL_BATCH) + 1)
+        return {
+            "method": "MULTIPART",
+            "partSizeBytes": item["partSizeBytes"],
+            "partCount": item["partCount"],
+            "parts": _presign_parts(bucket, item["s3Key"], item["uploadId"], first_batch),
+            "expiresInSeconds": PRESIGN_PUT_EXPIRES_SECONDS
         }
 
-        table.put_item(Item=item)
+    params = {
+        "Bucket": bucket,
+        "Key": item["s3Key"],
+        "ContentType": item["contentType"],
+    }
+    headers = {
+        "Content-Type": item["contentType"]
+    }
+    if item.get("checksumSha256"):
+        # Signed into the URL: the client must send it and S3 rejects a body that does not match.
+        params["ChecksumSHA256"] = item["checksumSha256"]
+        headers["x-amz-checksum-sha256"] = item["checksumSha256"]
+
+    presigned = _s3().generate_presigned_url(
+        ClientMethod="put_object",
+        Params=params,
+        ExpiresIn=PRESIGN_PUT_EXPIRES_SECONDS,
+    )
+    return {
+        "method": "PUT",
+        "url": presigned,
+        "headers": headers,
+        "expiresInSeconds": PRESIGN_PUT_EXPIRES_SECONDS
+    }
 
-        presigned = s3.generate_presigned_url(
-            ClientMethod="put_object",
-            Params={
-                "Bucket": bucket,
-                "Key": key,
-                "ContentType": content_type,
-            },
-            ExpiresIn=PRESIGN_PUT_EXPIRES_SECONDS,
-        )
+def post_files(ctx: RequestContext):
+    """Initialize upload: create DDB record + return presigned PUT URL.
+
+    Files above MULTIPART_THRESHOLD_BYTES get an S3 multipart upload instead; the response
+    then carries the first batch of presigned part URLs (see multipart_parts/complete/abort).
+    A JSON array of file descriptors initializes many uploads at once (see _post_files_batch).
+    """
+    owner_id = ctx.owner_id
+    email = ctx.email
+    try:
+        body = ctx.event.get("body") or "{}"
+        payload = json.loads(body) if isinstance(body, str) else (body or {})
+        if isinstance(payload, list):
+            return _post_files_batch(owner_id, email, payload)
+
+        fields, error = _parse_upload_request(payload)
+        if error:
+            return build_response(400, {"message": error})
+
+        if fields["sha256"]:
+            duplicate = _find_duplicate(owner_id, fields["sha256"], fields["sizeBytes"])
+            if duplicate:
+                metrics.count("DedupHit")
+                return build_response(200, _already_present(duplicate))
+
+        item = _new_upload_item(owner_id, email, fields)
+        bucket = os.environ["FILES_BUCKET"]
+        if item["sizeBytes"] > MULTIPART_THRESHOLD_BYTES:
+            _start_multipart(bucket, item)
+        if not _put_with_usage([item]):
+            if item.get("uploadId"):
+                _abort_multipart_quietly(bucket, item)
+            return build_response(403, {"message": "Storage quota exceeded"})
 
         return build_response(200, {
-            "fileId": file_id,
-            "upload": {
-                "method": "PUT",
-                "url": presigned,
-                "headers": {
-                    "Content-Type": content_type
-                },
-                "expiresInSeconds": PRESIGN_PUT_EXPIRES_SECONDS
-            }
+            "fileId": item["fileId"],
+            "upload": _upload_instructions(bucket, item),
         })
 
     except Exception as e:
         logger.exception("Failed to initialize upload")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
 
-def public_file_metadata(event):
+def _post_files_batch(owner_id: str, email: str | None, entries: list):
+    """Initialize many uploads in one call (e.g. a dropped folder).
+
+    Entries are validated individually; valid ones are written in transactions of up to 99
+    records plus one usage update (so the quota holds for the whole chunk) and get their
+    upload URLs in the same response. Results keep the request order and carry the index.
+    Entries whose sha256 matches content the owner already has come back alreadyPresent.
+    """
+    if not entries:
+        return build_response(400, {"message": "Empty file list"})
+    if len(entries) > BATCH_UPLOAD_MAX:
+        return build_response(400, {"message": f"At most {BATCH_UPLOAD_MAX} files per request"})
+
+    bucket = os.environ["FILES_BUCKET"]
+    parsed = [_parse_upload_request(entry) for entry in entries]
+
+    # Checksum lookups run concurrently; one indexed query per entry that has a sha256.
+    duplicates: dict[int, dict] = {}
+    lookups = {i: fields for i, (fields, _) in enumerate(parsed) if fields and fields["sha256"]}
+    if lookups:
+        with ThreadPoolExecutor(max_workers=max(1, min(BULK_WORKERS, len(lookups)))) as pool:
+            futures = {
+                i: pool.submit(_find_duplicate, owner_id, fields["sha256"], fields["sizeBytes"])
+                for i, fields in lookups.items()
+            }
+            duplicates = {i: dup for i, future in futures.items() if (dup := future.result())}
+        metrics.count("DedupHit", len(duplicates))
+
+    results: list[dict] = []
+    items: list[dict] = []
+    for index, (fields, error) in enumerate(parsed):
+        if error:
+            results.append({"index": index, "status": 400, "message": error})
+            continue
+        if index in duplicates:
+            results.append({"index": index, "status": 200, **_already_present(duplicates[index])})
+            continue
+        item = _new_upload_item(owner_id, email, fields)
+        if item["sizeBytes"] > MULTIPART_THRESHOLD_BYTES:
+            try:
+                _start_multipart(bucket, item)
+            except Exception as e:
+                logger.error("Failed to start multipart upload for entry %d: %s", index, e)
+                results.append({"index": index, "status": 500, "message": "Internal server error",
+                                "error": str(e)})
+                continue
+        items.append(item)
+        results.append({"index": index, "status": 200, "item": item})
+
+    rejected = set()
+    chunk_size = TRANSACT_MAX_ITEMS - 1  # one slot for the usage update
+    for i in range(0, len(items), chunk_size):
+        chunk = items[i:i + chunk_size]
+        if not _put_with_usage(chunk):
+            rejected.update(item["fileId"] for item in chunk)
+            for item in chunk:
+                if item.get("uploadId"):
+                    _abort_multipart_quietly(bucket, item)
+
+    for result in results:
+        item = result.pop("item", None)
+        if item is None:
+            continue
+        if item["fileId"] in rejected:
+            result.update({"status": 403, "message": "Storage quota exceeded"})
+            continue
+        result["fileId"] = item["fileId"]
+        result["originalFileName"] = item["originalFileName"]
+        result["upload"] = _upload_instructions(bucket, item)
+
+    created = sum(1 for result in results if result["status"] == 200 and not result.get("alreadyPresent"))
+    return build_response(200, {
+        "created": created,
+        "alreadyPresent": len(duplicates),
+        "failed": len(results) - created - len(duplicates),
+        "files": results,
+    })
+
+def public_file_metadata(ctx: RequestContext):
     """Public: return file metadata by fileId (no redirect)."""
-    file_id = (event.get("pathParameters") or {}).get("id")
+    file_id = ctx.path_params.get("id")
     if not file_id:
         return build_response(400, {"message": "Missing file id"})
 
     try:
-        resp = table.query(
-            IndexName="GSI1",
-            KeyConditionExpression=Key("fileId").eq(file_id),
-            Limit=1,
-        )
-        items = resp.get("Items", [])
-        if not items:
+        item = _get_item_by_file_id(file_id)
+        if not item:
             return build_response(404, {"message": "Not found"})
 
-        item = items[0]
         status = item.get("status")
-        expires_at = item.get("expiresAt")
 
         # Deleted: keep your semantics (you already use 403)
         if status == "deleted":
             return build_response(403, {"message": "Deleted"})
 
         # Expired logic: if expiresAt exists and is in the past => 410
-        if expires_at:
-            try:
-                exp_dt = dt_parser.isoparse(expires_at)
-                if exp_dt <= datetime.now(timezone.utc):
-                    return build_response(410, {"message": "Expired"})
-            except Exception:
-                # If expiresAt is malformed, treat as server error
-                logger.exception("Invalid expiresAt format")
-                return build_response(500, {"message": "Internal server error"})
+        if item.get("expiresAt") and _expiry_epoch(item) is None:
+            # If expiresAt is malformed, treat as server error
+            logger.error("Invalid expiresAt format for fileId=%s: %r", file_id, item.get("expiresAt"))
+            return build_response(500, {"message": "Internal server error"})
+        if _is_expired(item):
+            return build_response(410, {"message": "Expired"})
 
-        return build_response(200, _map_file_item(item))
+        item = _with_fields(item, PUBLIC_METADATA_FIELDS)
+        if not item:
+            return build_response(404, {"message": "Not found"})
+        body = _map_file_item(item)
+        return build_conditional_response(ctx.event, body, _compute_etag(tuple(body.values())))
 
     except Exception as e:
         logger.exception("Failed to fetch public metadata")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
 
 
+def _log_event_sampled(event) -> None:
+    """Full-event logging is debug-only and sampled; it costs CPU and log ingestion."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < EVENT_LOG_SAMPLE_RATE:
+        logger.debug("Received event: %s", json.dumps(event, default=str))
+
+
+def _require_owner(ctx: RequestContext, call_next):
+    """Middleware: the caller must be signed in (owner-scoped routes)."""
+    if not ctx.owner_id:
+        return build_response(401, {"message": "Unauthorized"})
+    return call_next(ctx)
+
+
+def _require_admin(ctx: RequestContext, call_next):
+    """Middleware: the caller must be in the Admins group."""
+    if not ctx.is_admin:
+        return build_response(403, {"message": "Forbidden: Admin access only"})
+    return call_next(ctx)
+
+
+def _compile(view, middlewares: tuple):
+    """Wrap view in its middlewares (first one outermost) once, at import time."""
+    call = view
+    for middleware in reversed(middlewares):
+        call = partial(middleware, call_next=call)
+    return call
+
+
+_PUBLIC = ()
+_OWNER = (_require_owner,)
+_ADMIN = (_require_admin,)
+
+# (method, resource) -> (view name, compiled pipeline). resource is API Gateway's route
+# template, so lookup is one dict access however many endpoints there are.
+ROUTES = {
+    (method, resource): (view.__name__, _compile(view, middlewares))
+    for method, resource, view, middlewares in (
+        ("GET", "/files", user_files_view, _OWNER),                 # 7.3 list my files
+        ("POST", "/files", post_files, _OWNER),                     # 7.x init upload(s)
+        ("DELETE", "/files", bulk_delete_files, _OWNER),            # bulk delete {"fileIds": [...]}
+        ("GET", "/usage", _usage_view, _OWNER),                     # own totals and quotas
+        ("POST", "/files/export", export_files, _OWNER),            # whole inventory as NDJSON/CSV (async)
+        ("GET", "/files/export/{id}", export_status, _OWNER),       # export status and link
+        ("GET", "/admin/files", admin_view, _ADMIN),                # all users, parallel scan
+        ("GET", "/public/files/{id}", public_file_metadata, _PUBLIC),
+        ("GET", "/files/{id}", public_download, _PUBLIC),           # 7.5 public download
+        ("DELETE", "/files/{id}", delete_file, _OWNER),             # 7.4
+        ("POST", "/files/{id}/parts", multipart_parts, _OWNER),     # multipart companions
+        ("POST", "/files/{id}/complete", multipart_complete, _OWNER),
+        ("POST", "/files/{id}/abort", multipart_abort, _OWNER),
+    )
+}
+
+
 def handler(event, context):  # pylint: disable=unused-argument
     """Lambda handler for this module."""
-    logger.info("Received event:\n%s", json.dumps(event, indent=2))
-    http_method = event.get("httpMethod", "")
-    path = event.get("resource", "")
+    _log_event_sampled(event)
+    ctx = RequestContext.from_event(event)
 
+    metrics.start(f"{ctx.method} {ctx.resource}")
+    resp = None
     try:
-        # Preflight CORS
-        if http_method == "OPTIONS":
-            return build_response(200, {"message": "ok"})
-
-        # 7.3 GET /files
-        if http_method == "GET" and path == "/files":
-            logger.info("Invoking user_files_view (non-admin)")
-            return user_files_view(event)
-
-        # 7.x POST /files (init upload)
-        if http_method == "POST" and path == "/files":
-            logger.info("Invoking post_files")
-            return post_files(event)
-
-        # Public metadata: GET /public/files/{id}
-        if http_method == "GET" and path == "/public/files/{id}":
-            logger.info("Invoking public_file_metadata")
-            return public_file_metadata(event)
-
-        # 7.4 DELETE /files/{id}
-        if http_method == "DELETE" and path == "/files/{id}":
-            logger.info("Invoking delete_file")
-            return delete_file(event)
-
-        # 7.5 Public download: GET /files/{id}
-        if http_method == "GET" and path == "/files/{id}":
-            logger.info("Invoking public_download")
-            return public_download(event)
+        resp = _dispatch(ctx)
+        return resp
+    finally:
+        metrics.emit(resp.get("statusCode") if resp else 500)
+
 
+def _dispatch(ctx: RequestContext):
+    """Route the request through its compiled pipeline."""
+    # Preflight CORS
+    if ctx.method == "OPTIONS":
+        return build_response(200, {"message": "ok"})
+
+    route = ROUTES.get((ctx.method, ctx.resource))
+    if route is None:
         return build_response(405, {"message": "Method not allowed"})
 
+    name, pipeline = route
+    try:
+        logger.info("Invoking %s", name)
+        return pipeline(ctx)
     except Exception as e:
         logger.exception("Unhandled exception in handler")
         return build_response(500, {"message": "Internal server error", "error": str(e)})
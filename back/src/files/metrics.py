@@ -0,0 +1,117 @@
+"""Lightweight per-request instrumentation for the RIRIS files API.
+
+Collects route latency, AWS call counts/timings (via botocore event hooks, so call sites
+stay untouched) and named counters such as cache hits, then writes one record per request
+in CloudWatch Embedded Metric Format (EMF). EMF records must be bare JSON lines on stdout,
+which is why they are written with sys.stdout.write() rather than the logging module.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "RIRIS")
+SERVICE_NAME = os.getenv("AWS_LAMBDA_FUNCTION_NAME", "riris-files")
+
+_SERVICE_NAMES = {"dynamodb": "DynamoDB", "s3": "S3"}
+
+# Lambda runs one request per container at a time, but handlers may fan out to threads,
+# so the current request's data is module-global and guarded by a lock.
+_lock = threading.Lock()
+_route = None
+_started = None
+_calls = defaultdict(lambda: [0, 0.0])  # "DynamoDB.Query" -> [count, total ms]
+_counters = defaultdict(int)
+
+
+def start(route: str) -> None:
+    """Begin collecting for a new request."""
+    global _route, _started
+    with _lock:
+        _route = route
+        _started = time.perf_counter()
+        _calls.clear()
+        _counters.clear()
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increment a named counter (e.g. FileCacheHit) for the current request."""
+    with _lock:
+        _counters[name] += value
+
+
+def _before_call(model, context, **kwargs):
+    context["riris_t0"] = time.perf_counter()
+
+
+def _after_call(model, context, **kwargs):
+    t0 = context.get("riris_t0")
+    if t0 is None:
+        return
+    name = f"{_SERVICE_NAMES.get(model.service_model.service_name, model.service_model.service_name)}.{model.name}"
+    with _lock:
+        entry = _calls[name]
+        entry[0] += 1
+        entry[1] += (time.perf_counter() - t0) * 1000
+
+
+def instrument(client) -> None:
+    """Register timing hooks on a botocore client or boto3 resource.
+
+    Objects without botocore event hooks (e.g. test stubs) are left alone.
+    """
+    client = getattr(getattr(client, "meta", None), "client", client)
+    events = getattr(getattr(client, "meta", None), "events", None)
+    if events is None:
+        return
+    events.register("before-call.*.*", _before_call, unique_id="riris-metrics-before")
+    events.register("after-call.*.*", _after_call, unique_id="riris-metrics-after")
+
+
+def snapshot(status_code=None) -> dict:
+    """Build the EMF record for the current request."""
+    with _lock:
+        latency_ms = (time.perf_counter() - _started) * 1000 if _started is not None else 0.0
+        values = {"Latency": round(latency_ms, 3), "AwsCalls": sum(c for c, _ in _calls.values())}
+        units = {"Latency": "Milliseconds", "AwsCalls": "Count"}
+        for name, (n, total_ms) in sorted(_calls.items()):
+            values[f"{name}.Count"] = n
+            values[f"{name}.Ms"] = round(total_ms, 3)
+            units[f"{name}.Count"] = "Count"
+            units[f"{name}.Ms"] = "Milliseconds"
+        for name, n in sorted(_counters.items()):
+            values[name] = n
+            units[name] = "Count"
+        route = _route or "unknown"
+
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Service", "Route"]],
+                "Metrics": [{"Name": name, "Unit": units[name]} for name in values],
+            }],
+        },
+        "Service": SERVICE_NAME,
+        "Route": route,
+        **values,
+    }
+    if status_code is not None:
+        record["StatusCode"] = status_code
+    return record
+
+
+def emit(status_code=None) -> None:
+    """Print the current request's EMF record (no-op when disabled)."""
+    if not METRICS_ENABLED:
+        return
+    try:
+        record = snapshot(status_code)
+    except Exception:  # metrics must never break a request
+        return
+    sys.stdout.write(json.dumps(record, separators=(",", ":")) + "\n")
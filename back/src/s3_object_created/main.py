@@ -3,18 +3,72 @@
 import os
 import json
 import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-import boto3
-from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger()
 logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
-ddb = boto3.resource("dynamodb")
-table = ddb.Table(os.environ["BACKEND_TABLE"])
-
 S3_PREFIX = os.environ.get("S3_PREFIX", "files")
+TABLE_NAME = os.environ["BACKEND_TABLE"]
+# fileId index (legacy keys); must project sizeBytes. See the files function.
+FILE_ID_INDEX = os.getenv("FILE_ID_INDEX", "GSI4")
+# Bounded pool for per-record DynamoDB work. One low-level client is shared across
+# threads (clients are thread-safe, boto3 resources are not).
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+# Per-user usage aggregate maintained together with the files function (same SK).
+USAGE_SK = "usage"
+# Fraction of invocations whose full event is logged when LOG_LEVEL=DEBUG.
+EVENT_LOG_SAMPLE_RATE = float(os.getenv("EVENT_LOG_SAMPLE_RATE", "0.1"))
+
+# Verification: the first SNIFF_BYTES of each new object are read (one ranged GET) to
+# detect its content type; 0 disables sniffing.
+FILES_BUCKET = os.environ.get("FILES_BUCKET")
+SNIFF_BYTES = int(os.getenv("SNIFF_BYTES", "512"))
+# (offset, magic bytes, content type) for formats worth telling apart.
+_MAGIC = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"\x7fELF", "application/x-executable"),
+    (0, b"MZ", "application/x-msdownload"),
+)
+
+# Created on first use: importing boto3 dominates cold start.
+ddb_client = None
+s3_client = None
+
+
+def _ddb_client():
+    global ddb_client
+    if ddb_client is None:
+        import boto3
+        from botocore.config import Config
+        ddb_client = boto3.client("dynamodb", config=Config(max_pool_connections=max(MAX_WORKERS, 10)))
+    return ddb_client
+
+
+def _s3_client():
+    global s3_client
+    if s3_client is None:
+        import boto3
+        from botocore.config import Config
+        s3_client = boto3.client("s3", config=Config(max_pool_connections=max(MAX_WORKERS, 10)))
+    return s3_client
+
+
+class RecordProcessingError(RuntimeError):
+    """Raised so the platform retries an invocation in which some records failed."""
 
 
 def _now_iso() -> str:
@@ -22,100 +76,386 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def _extract_file_id_from_key(key: str) -> str | None:
+def _parse_object_key(key: str) -> tuple[str | None, str] | None:
     """
-    Expect key format: <prefix>/<fileId>
-    Return fileId or None if key does not match prefix.
+    Expect key format: <prefix>/<ownerId>/<fileId> (current) or <prefix>/<fileId> (legacy).
+    Return (ownerId, fileId) - ownerId is None for legacy keys - or None if key does not match.
     """
     if not key:
         return None
 
-    # Normalize: allow keys like 'files/<id>' only
     expected_prefix = f"{S3_PREFIX}/"
     if not key.startswith(expected_prefix):
         return None
 
-    file_id = key[len(expected_prefix):]
-    if not file_id:
+    parts = key[len(expected_prefix):].split("/")
+    if any(not p for p in parts):
         return None
+    if len(parts) == 1:
+        return None, parts[0]
+    if len(parts) == 2:
+        return parts[0], parts[1]
+
+    # Guard against deeper nested keys
+    return None
 
-    # Guard against nested keys
-    if "/" in file_id:
+
+def _sniff_content_type(key: str) -> str | None:
+    """Detect the content type from the object's first bytes: one small ranged GET."""
+    if not (FILES_BUCKET and SNIFF_BYTES):
         return None
+    try:
+        head = _s3_client().get_object(Bucket=FILES_BUCKET, Key=key, Range=f"bytes=0-{SNIFF_BYTES - 1}")["Body"].read()
+    except ClientError as e:
+        logger.warning("Could not read head of %s for sniffing: %s", key, e)
+        return None
+    for offset, magic, content_type in _MAGIC:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+    if head and b"\x00" not in head:
+        try:
+            head.decode("utf-8")
+            return "text/plain"
+        except UnicodeDecodeError:
+            # A multi-byte character may be cut at the range end; judge the rest.
+            try:
+                head[:-3].decode("utf-8")
+                return "text/plain"
+            except UnicodeDecodeError:
+                pass
+    return None
 
-    return file_id
 
+def _verified_attributes(size: int, etag: str | None, detected: str | None) -> tuple[str, dict]:
+    """SET clause and values persisting what S3 reported about the stored object."""
+    clause = "storedBytes = :size"
+    values = {":size": {"N": str(size)}}
+    if etag:
+        clause += ", etag = :etag"
+        values[":etag"] = {"S": etag}
+    if detected:
+        clause += ", detectedContentType = :detected"
+        values[":detected"] = {"S": detected}
+    return clause, values
 
-def _mark_ready(file_id: str) -> None:
-    """Find DDB record by fileId (GSI1) and mark it ready if currently uploading."""
-    resp = table.query(
-        IndexName="GSI1",
-        KeyConditionExpression=Key("fileId").eq(file_id),
-        Limit=1,
-    )
-    items = resp.get("Items", [])
-    if not items:
-        logger.warning("No DDB record found for fileId=%s", file_id)
-        return
 
-    item = items[0]
-    pk = item["PK"]
-    sk = item["SK"]
+def _mark_ready_direct(owner_id: str, file_id: str, key: str, size: int = 0, etag: str | None = None) -> None:
+    """Verify an owner-scoped upload and mark it ready with one conditional transaction.
 
+    The declared size is part of the condition, so a truncated or oversized object fails it
+    and the record comes back in the cancellation reason - no extra read to decide between
+    "someone got here first" and "reject". The user's usage item gains the stored bytes in
+    the same transaction, so the ready totals move exactly once per upload.
+    """
+    pk = f"u#{owner_id}"
+    sk = f"f#{file_id}"
+    now = _now_iso()
+    stored_clause, stored_values = _verified_attributes(size, etag, _sniff_content_type(key))
+    file_update = {
+        "TableName": TABLE_NAME,
+        "Key": {"PK": {"S": pk}, "SK": {"S": sk}},
+        "UpdateExpression": f"SET #s = :ready, readyAt = :now, {stored_clause} REMOVE pendingShard",
+        # s3Key check ties the object to the record post_files wrote for it.
+        "ConditionExpression": "#s = :uploading AND s3Key = :key AND sizeBytes = :size AND usageTracked = :true",
+        "ExpressionAttributeNames": {"#s": "status"},
+        "ExpressionAttributeValues": {
+            ":ready": {"S": "ready"},
+            ":uploading": {"S": "uploading"},
+            ":key": {"S": key},
+            ":now": {"S": now},
+            ":true": {"BOOL": True},
+            **stored_values,
+        },
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+    }
+    usage_update = {
+        "TableName": TABLE_NAME,
+        "Key": {"PK": {"S": pk}, "SK": {"S": USAGE_SK}},
+        "UpdateExpression": "ADD readyCount :one, readyBytes :size SET updatedAt = :now",
+        "ExpressionAttributeValues": {":one": {"N": "1"}, ":size": {"N": str(size)}, ":now": {"S": now}},
+    }
     try:
-        table.update_item(
-            Key={"PK": pk, "SK": sk},
-            UpdateExpression="SET #s = :ready, readyAt = :now",
-            ConditionExpression="#s = :uploading",
-            ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues={
-                ":ready": "ready",
-                ":uploading": "uploading",
-                ":now": _now_iso(),
-            },
-        )
+        _ddb_client().transact_write_items(TransactItems=[{"Update": file_update}, {"Update": usage_update}])
         logger.info("Marked fileId=%s ready (PK=%s, SK=%s)", file_id, pk, sk)
 
     except ClientError as e:
         code = e.response.get("Error", {}).get("Code", "")
-        if code == "ConditionalCheckFailedException":
-            # Status was not 'uploading' (already ready/deleted/etc.) – do not treat as error.
-            logger.info(
-                "Skipping mark-ready for fileId=%s because status was not uploading (PK=%s, SK=%s)",
-                file_id, pk, sk
-            )
+        reasons = e.response.get("CancellationReasons") or []
+        if code == "TransactionCanceledException" and reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+            old = reasons[0].get("Item")
+            if not old:
+                logger.warning("No DDB record found for fileId=%s (PK=%s, SK=%s)", file_id, pk, sk)
+            elif old.get("status", {}).get("S") != "uploading" or old.get("s3Key", {}).get("S") != key:
+                logger.info(
+                    "Skipping mark-ready for fileId=%s because status was not uploading (PK=%s, SK=%s)",
+                    file_id, pk, sk
+                )
+            elif old.get("sizeBytes", {}).get("N") != str(size):
+                _reject(file_id, key, old, size, stored_clause, stored_values)
+            else:
+                # Started before usage tracking existed: nothing to add to the aggregate.
+                file_update.pop("ReturnValuesOnConditionCheckFailure")
+                file_update["ConditionExpression"] = "#s = :uploading AND s3Key = :key AND sizeBytes = :size"
+                del file_update["ExpressionAttributeValues"][":true"]
+                _update_if_uploading(file_id, file_update)
+            return
+
+        logger.exception("Failed to update DDB record for fileId=%s", file_id)
+        raise
+
+
+def _reject(file_id: str, key: str, old: dict, size: int, stored_clause: str, stored_values: dict,
+            key_on_record: bool = True) -> None:
+    """Size mismatch: mark the record rejected, give back its usage and drop the object.
+
+    Legacy records carry no s3Key (key_on_record=False), so only their status is checked.
+    """
+    declared = old.get("sizeBytes", {}).get("N", "0")
+    logger.warning("Rejecting fileId=%s: stored %s bytes, declared %s", file_id, size, declared)
+    update = {
+        "TableName": TABLE_NAME,
+        "Key": {"PK": old["PK"], "SK": old["SK"]},
+        "UpdateExpression": f"SET #s = :rejected, rejectedAt = :now, rejectReason = :reason, {stored_clause} "
+                            "REMOVE pendingShard",
+        "ConditionExpression": "#s = :uploading",
+        "ExpressionAttributeNames": {"#s": "status"},
+        "ExpressionAttributeValues": {
+            ":rejected": {"S": "rejected"},
+            ":uploading": {"S": "uploading"},
+            ":now": {"S": _now_iso()},
+            ":reason": {"S": "size_mismatch"},
+            **stored_values,
+        },
+    }
+    if key_on_record:
+        update["ConditionExpression"] += " AND s3Key = :key"
+        update["ExpressionAttributeValues"][":key"] = {"S": key}
+    if old.get("usageTracked", {}).get("BOOL"):
+        try:
+            _ddb_client().transact_write_items(TransactItems=[
+                {"Update": update},
+                {"Update": {
+                    "TableName": TABLE_NAME,
+                    "Key": {"PK": old["PK"], "SK": {"S": USAGE_SK}},
+                    "UpdateExpression": "ADD fileCount :n, usedBytes :b SET updatedAt = :now",
+                    "ExpressionAttributeValues": {
+                        ":n": {"N": "-1"},
+                        ":b": {"N": str(-int(declared))},
+                        ":now": {"S": _now_iso()},
+                    },
+                }},
+            ])
+        except ClientError as e:
+            reasons = e.response.get("CancellationReasons") or []
+            if not (reasons and reasons[0].get("Code") == "ConditionalCheckFailed"):
+                raise
+            logger.info("Skipping reject for fileId=%s because status was not uploading", file_id)
             return
+    else:
+        try:
+            _ddb_client().update_item(**update)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code", "") != "ConditionalCheckFailedException":
+                raise
+            logger.info("Skipping reject for fileId=%s because status was not uploading", file_id)
+            return
+
+    if FILES_BUCKET:
+        try:
+            _s3_client().delete_object(Bucket=FILES_BUCKET, Key=key)
+        except ClientError:
+            logger.warning("Could not delete rejected object %s", key, exc_info=True)
+
 
+def _update_if_uploading(file_id: str, update: dict) -> None:
+    """Conditional single-item mark-ready; a failed condition means someone got there first."""
+    try:
+        _ddb_client().update_item(**update)
+        logger.info("Marked fileId=%s ready (PK=%s, SK=%s)", file_id, update["Key"]["PK"]["S"], update["Key"]["SK"]["S"])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") == "ConditionalCheckFailedException":
+            logger.info("Skipping mark-ready for fileId=%s because status was not uploading", file_id)
+            return
         logger.exception("Failed to update DDB record for fileId=%s", file_id)
         raise
 
 
+def _mark_ready_by_index(file_id: str, key: str, size: int = 0, etag: str | None = None) -> None:
+    """Legacy keys: find DDB record by fileId (fileId index), verify its size and mark it ready if
+    currently uploading. Legacy records predate usage tracking, so no usage update."""
+    resp = _ddb_client().query(
+        TableName=TABLE_NAME,
+        IndexName=FILE_ID_INDEX,
+        KeyConditionExpression="fileId = :fid",
+        ExpressionAttributeValues={":fid": {"S": file_id}},
+        ProjectionExpression="PK, SK, sizeBytes",
+        Limit=1,
+    )
+    items = resp.get("Items", [])
+    if not items:
+        logger.warning("No DDB record found for fileId=%s", file_id)
+        return
+
+    item = items[0]
+    stored_clause, stored_values = _verified_attributes(size, etag, _sniff_content_type(key))
+    if "sizeBytes" in item and item["sizeBytes"]["N"] != str(size):
+        _reject(file_id, key, item, size, stored_clause, stored_values, key_on_record=False)
+        return
+
+    _update_if_uploading(file_id, {
+        "TableName": TABLE_NAME,
+        "Key": {"PK": item["PK"], "SK": item["SK"]},
+        "UpdateExpression": f"SET #s = :ready, readyAt = :now, {stored_clause} REMOVE pendingShard",
+        "ConditionExpression": "#s = :uploading",
+        "ExpressionAttributeNames": {"#s": "status"},
+        "ExpressionAttributeValues": {
+            ":ready": {"S": "ready"},
+            ":uploading": {"S": "uploading"},
+            ":now": {"S": _now_iso()},
+            **stored_values,
+        },
+    })
+
+
+def _mark_ready(file_id: str, owner_id: str | None = None, key: str | None = None, size: int = 0,
+                etag: str | None = None) -> None:
+    """Verify an upload against its record and mark it ready (or rejected): direct key update
+    for owner-scoped keys, fileId index lookup for legacy ones."""
+    if owner_id:
+        _mark_ready_direct(owner_id, file_id, key, size, etag)
+    else:
+        _mark_ready_by_index(file_id, key or f"{S3_PREFIX}/{file_id}", size, etag)
+
+
+def _record_id(rec: dict) -> str:
+    """Stable identifier for a record in the failure report."""
+    obj = rec.get("s3", {}).get("object", {})
+    key = obj.get("key", "")
+    sequencer = obj.get("sequencer")
+    return f"{key}@{sequencer}" if sequencer else key
+
+
+def _unpack_queue_messages(messages: list) -> tuple[list, list, list]:
+    """Flatten SQS messages (IngestionMode=queue) into S3 records.
+
+    Returns (records, ids, malformed): ids[i] is the messageId record i came from, so a
+    failed record fails its message; malformed lists messageIds whose body was unusable.
+    s3:TestEvent messages, sent once when the notification is configured, are dropped.
+    """
+    records, ids, malformed = [], [], []
+    for message in messages:
+        message_id = message.get("messageId", "")
+        try:
+            body = json.loads(message.get("body") or "")
+        except ValueError:
+            logger.error("Unparseable SQS message messageId=%s", message_id)
+            malformed.append(message_id)
+            continue
+        if not isinstance(body, dict):
+            malformed.append(message_id)
+            continue
+        if body.get("Event") == "s3:TestEvent":
+            continue
+        for rec in body.get("Records") or []:
+            records.append(rec)
+            ids.append(message_id)
+    return records, ids, malformed
+
+
+def _process_records(records: list, ids: list | None = None) -> dict:
+    """Mark the records' files ready concurrently and return a per-record report.
+
+    Records for the same object key are collapsed into one task (S3 can deliver repeats),
+    so each file costs one conditional update (plus an index query for legacy keys).
+    ids, when given, replaces _record_id() as the failure identifier of each record.
+    """
+    by_key: dict[str, tuple[str | None, str]] = {}
+    sizes: dict[str, int] = {}
+    etags: dict[str, str | None] = {}
+    record_ids: dict[str, list[str]] = {}
+    skipped = 0
+
+    for i, rec in enumerate(records):
+        key = rec.get("s3", {}).get("object", {}).get("key", "")
+
+        # S3 may URL-encode the key; boto3 events typically provide raw key, but keep safe:
+        # We will not decode here; since our keys are UUIDs, encoding is unlikely.
+
+        parsed = _parse_object_key(key)
+        if not parsed:
+            logger.info("Ignoring object key=%s (not matching prefix %s)", key, S3_PREFIX)
+            skipped += 1
+            continue
+        by_key[key] = parsed
+        sizes[key] = int(rec.get("s3", {}).get("object", {}).get("size") or 0)
+        etags[key] = rec.get("s3", {}).get("object", {}).get("eTag")
+        record_ids.setdefault(key, []).append(ids[i] if ids is not None else _record_id(rec))
+
+    failures = []
+    if by_key:
+        _ddb_client()  # create the shared clients before the pool starts using them
+        if FILES_BUCKET and SNIFF_BYTES:
+            _s3_client()
+        workers = max(1, min(MAX_WORKERS, len(by_key)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                key: pool.submit(_mark_ready, file_id, owner_id, key, sizes[key], etags[key])
+                for key, (owner_id, file_id) in by_key.items()
+            }
+            for key, future in futures.items():
+                file_id = by_key[key][1]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Failed processing fileId=%s: %s", file_id, e)
+                    for record_id in record_ids[key]:
+                        failures.append({"itemIdentifier": record_id, "fileId": file_id, "error": str(e)})
+
+    return {
+        "ok": not failures,
+        "received": len(records),
+        "processed": sum(len(ids) for ids in record_ids.values()) - len(failures),
+        "skipped": skipped,
+        "batchItemFailures": failures,
+    }
+
+
 def handler(event, context):  # pylint: disable=unused-argument
     """Lambda handler for S3 object-created events."""
-    logger.info("Received event:\n%s", json.dumps(event, indent=2))
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < EVENT_LOG_SAMPLE_RATE:
+        logger.debug("Received event: %s", json.dumps(event, default=str))
 
     records = event.get("Records", [])
     if not records:
         logger.info("No Records found; nothing to do.")
         return {"ok": True}
 
-    for rec in records:
-        try:
-            s3_info = rec.get("s3", {})
-            obj = s3_info.get("object", {})
-            key = obj.get("key", "")
+    if records[0].get("eventSource") == "aws:sqs":
+        return _handle_queue_batch(records)
+
+    report = _process_records(records)
+    logger.info("Processed S3 records: %s", json.dumps({k: v for k, v in report.items() if k != "batchItemFailures"}))
 
-            # S3 may URL-encode the key; boto3 events typically provide raw key, but keep safe:
-            # We will not decode here; since our keys are UUIDs, encoding is unlikely.
+    if report["batchItemFailures"]:
+        # Direct S3 invocations are async: raising is the only way to get a retry. mark-ready is
+        # conditional and idempotent, so records that already succeeded are safe to replay.
+        raise RecordProcessingError(json.dumps(report["batchItemFailures"]))
 
-            file_id = _extract_file_id_from_key(key)
-            if not file_id:
-                logger.info("Ignoring object key=%s (not matching prefix %s)", key, S3_PREFIX)
-                continue
+    return report
 
-            _mark_ready(file_id)
 
-        except Exception:
-            logger.exception("Failed processing record: %s", rec)
+def _handle_queue_batch(messages: list) -> dict:
+    """SQS batch (IngestionMode=queue): report failed messages instead of raising.
+
+    The event source mapping uses ReportBatchItemFailures, so only the listed messages
+    return to the queue (and on to the dead-letter queue after maxReceiveCount).
+    """
+    records, ids, malformed = _unpack_queue_messages(messages)
+    report = _process_records(records, ids)
+    report["messages"] = len(messages)
+    logger.info("Processed SQS batch: %s", json.dumps({k: v for k, v in report.items() if k != "batchItemFailures"}))
 
-    return {"ok": True}
+    failed = list(dict.fromkeys(malformed + [f["itemIdentifier"] for f in report["batchItemFailures"]]))
+    if failed:
+        logger.warning("Failed SQS messages: %s", json.dumps(report["batchItemFailures"][:50]))
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
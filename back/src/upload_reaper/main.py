@@ -0,0 +1,216 @@
+"""Lambda handler for reaping abandoned RIRIS uploads (scheduled)."""
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+
+TABLE_NAME = os.environ["BACKEND_TABLE"]
+FILES_BUCKET = os.environ.get("FILES_BUCKET")
+S3_PREFIX = os.environ.get("S3_PREFIX", "files")
+PENDING_INDEX = "GSI2"
+# Must match the files function, which assigns pendingShard on upload init.
+PENDING_INDEX_SHARDS = int(os.getenv("PENDING_INDEX_SHARDS", "8"))
+
+# A single-PUT upload is stale once its presigned URL expired plus a grace period for
+# slow transfers and delayed object-created notifications.
+PRESIGN_PUT_EXPIRES_SECONDS = int(os.getenv("PRESIGN_PUT_EXPIRES_SECONDS", "900"))
+UPLOAD_STALE_GRACE_SECONDS = int(os.getenv("UPLOAD_STALE_GRACE_SECONDS", "3600"))
+# Multipart uploads can be resumed with fresh part URLs, so they get a longer window.
+MULTIPART_STALE_SECONDS = int(os.getenv("MULTIPART_STALE_SECONDS", str(24 * 3600)))
+
+MAX_ITEMS_PER_RUN = int(os.getenv("MAX_ITEMS_PER_RUN", "5000"))
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+S3_DELETE_BATCH = 1000  # DeleteObjects limit
+# Per-user usage aggregate maintained together with the files function (same SK).
+USAGE_SK = "usage"
+
+# Created on first use: importing boto3 dominates cold start.
+ddb_client = None
+s3_client = None
+
+
+def _ddb_client():
+    global ddb_client
+    if ddb_client is None:
+        import boto3
+        from botocore.config import Config
+        ddb_client = boto3.client("dynamodb", config=Config(max_pool_connections=max(MAX_WORKERS, 10)))
+    return ddb_client
+
+
+def _s3_client():
+    global s3_client
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+    return s3_client
+
+
+def _iso(dt: datetime) -> str:
+    """UTC timestamp in ISO8601 (Z), same format post_files writes to createdAt."""
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _s(item: dict, name: str) -> str | None:
+    value = item.get(name)
+    return value.get("S") if value else None
+
+
+def _find_stale(now: datetime) -> list[dict]:
+    """Query every GSI2 shard for uploads created before the stale cutoff."""
+    single_cutoff = _iso(now - timedelta(seconds=PRESIGN_PUT_EXPIRES_SECONDS + UPLOAD_STALE_GRACE_SECONDS))
+    multipart_cutoff = _iso(now - timedelta(seconds=MULTIPART_STALE_SECONDS))
+    # The index is queried up to the later cutoff; multipart items are then held to theirs.
+    query_cutoff = max(single_cutoff, multipart_cutoff)
+
+    stale = []
+    paginator = _ddb_client().get_paginator("query")
+    for shard in range(PENDING_INDEX_SHARDS):
+        pages = paginator.paginate(
+            TableName=TABLE_NAME,
+            IndexName=PENDING_INDEX,
+            KeyConditionExpression="pendingShard = :shard AND createdAt < :cutoff",
+            ExpressionAttributeValues={":shard": {"S": f"up#{shard}"}, ":cutoff": {"S": query_cutoff}},
+        )
+        for page in pages:
+            for raw in page.get("Items", []):
+                item = {
+                    "PK": _s(raw, "PK"),
+                    "SK": _s(raw, "SK"),
+                    "fileId": _s(raw, "fileId"),
+                    "s3Key": _s(raw, "s3Key") or f"{_s(raw, 's3Prefix') or S3_PREFIX}/{_s(raw, 'fileId')}",
+                    "uploadId": _s(raw, "uploadId"),
+                    "createdAt": _s(raw, "createdAt"),
+                    "sizeBytes": int(raw.get("sizeBytes", {}).get("N", "0")),
+                    "usageTracked": raw.get("usageTracked", {}).get("BOOL", False),
+                }
+                cutoff = multipart_cutoff if item["uploadId"] else single_cutoff
+                if item["createdAt"] < cutoff:
+                    stale.append(item)
+                if len(stale) >= MAX_ITEMS_PER_RUN:
+                    return stale
+    return stale
+
+
+def _delete_record(item: dict) -> bool:
+    """Delete a record only if it is still uploading. False if it moved on meanwhile.
+
+    Tracked records also give their reservation back to the user's usage item, in the same
+    transaction so a record that raced to ready keeps its share.
+    """
+    delete = {
+        "TableName": TABLE_NAME,
+        "Key": {"PK": {"S": item["PK"]}, "SK": {"S": item["SK"]}},
+        "ConditionExpression": "#s = :uploading",
+        "ExpressionAttributeNames": {"#s": "status"},
+        "ExpressionAttributeValues": {":uploading": {"S": "uploading"}},
+    }
+    try:
+        if not item.get("usageTracked"):
+            _ddb_client().delete_item(**delete)
+            return True
+        _ddb_client().transact_write_items(TransactItems=[
+            {"Delete": delete},
+            {"Update": {
+                "TableName": TABLE_NAME,
+                "Key": {"PK": {"S": item["PK"]}, "SK": {"S": USAGE_SK}},
+                "UpdateExpression": "ADD fileCount :n, usedBytes :b SET updatedAt = :now",
+                "ExpressionAttributeValues": {
+                    ":n": {"N": "-1"},
+                    ":b": {"N": str(-item["sizeBytes"])},
+                    ":now": {"S": _iso(datetime.now(timezone.utc))},
+                },
+            }},
+        ])
+        return True
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        reasons = e.response.get("CancellationReasons") or []
+        if code == "ConditionalCheckFailedException" or (
+                code == "TransactionCanceledException" and reasons
+                and reasons[0].get("Code") == "ConditionalCheckFailed"):
+            logger.info("Skipping fileId=%s: no longer uploading", item["fileId"])
+            return False
+        raise
+
+
+def _delete_objects(keys: list[str]) -> list[dict]:
+    """Delete leftover objects with DeleteObjects, 1000 keys per call. Returns per-key errors.
+
+    Never raises: the records are already gone, so a failed call is the last trace of these
+    keys. They are logged (ORPHANED_OBJECTS) for manual cleanup and reported as errors.
+    """
+    errors = []
+    for i in range(0, len(keys), S3_DELETE_BATCH):
+        chunk = keys[i:i + S3_DELETE_BATCH]
+        try:
+            resp = _s3_client().delete_objects(
+                Bucket=FILES_BUCKET,
+                Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+            )
+        except Exception as e:
+            logger.error("ORPHANED_OBJECTS bucket=%s error=%s keys=%s", FILES_BUCKET, e, json.dumps(chunk))
+            errors.extend({"key": k, "error": str(e)} for k in chunk)
+            continue
+        errors.extend({"key": e.get("Key"), "error": e.get("Code")} for e in resp.get("Errors", []))
+    return errors
+
+
+def _abort_multipart(item: dict) -> None:
+    try:
+        _s3_client().abort_multipart_upload(Bucket=FILES_BUCKET, Key=item["s3Key"], UploadId=item["uploadId"])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "") != "NoSuchUpload":
+            raise
+
+
+def reap(now: datetime | None = None) -> dict:
+    """Remove stale 'uploading' records and whatever their uploads left in S3."""
+    stale = _find_stale(now or datetime.now(timezone.utc))
+    report = {"stale": len(stale), "reaped": 0, "objectsDeleted": 0, "multipartAborted": 0, "errors": []}
+    if not stale:
+        return report
+
+    # Records first (conditionally, in parallel - BatchWriteItem cannot carry conditions), so
+    # an upload that completed in the meantime keeps both its record and its object.
+    reaped = []
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(stale)))) as pool:
+        for item, future in [(item, pool.submit(_delete_record, item)) for item in stale]:
+            try:
+                if future.result():
+                    reaped.append(item)
+            except Exception as e:
+                logger.error("Failed to delete record for fileId=%s: %s", item["fileId"], e)
+                report["errors"].append({"fileId": item["fileId"], "error": str(e)})
+    report["reaped"] = len(reaped)
+
+    if FILES_BUCKET:
+        for item in (i for i in reaped if i["uploadId"]):
+            try:
+                _abort_multipart(item)
+                report["multipartAborted"] += 1
+            except Exception as e:
+                logger.error("Failed to abort multipart upload for fileId=%s: %s", item["fileId"], e)
+                report["errors"].append({"fileId": item["fileId"], "error": str(e)})
+
+        keys = [i["s3Key"] for i in reaped]
+        key_errors = _delete_objects(keys)
+        report["objectsDeleted"] = len(keys) - len(key_errors)
+        report["errors"].extend(key_errors)
+
+    return report
+
+
+def handler(event, context):  # pylint: disable=unused-argument
+    """Lambda handler for the scheduled upload reaper."""
+    report = reap()
+    logger.info("Upload reaper finished: %s", json.dumps({k: v for k, v in report.items() if k != "errors"}))
+    if report["errors"]:
+        logger.warning("Upload reaper errors: %s", json.dumps(report["errors"][:50]))
+    return report
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Local load-test / benchmark harness for the RIRIS Lambda handlers.
+
+Runs files.main.handler and s3_object_created.main.handler in-process against moto's
+in-memory DynamoDB and S3, with a table built from template.yaml and seeded with a
+synthetic dataset. Replays a mixed traffic stream of API Gateway proxy events (shaped like
+events/event.json) and reports p50/p95/p99 latency plus DynamoDB/S3 calls per request for
+every route.
+
+Absolute latencies include moto's overhead, so compare runs with each other, not with
+production. Everything is seeded, so two runs with the same parameters issue the same
+requests against the same data:
+
+    cd back
+    python -m tests.bench.bench_handlers --out bench-$(git rev-parse --short HEAD).json
+    python -m tests.bench.bench_handlers --compare bench-<old>.json
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+BACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+TABLE_NAME = "riris-bench-files-data"
+BUCKET = "riris-bench-files"
+S3_PREFIX = "files"
+REGION = "eu-central-1"
+
+# Route mix (weights) for the replayed traffic.
+DEFAULT_MIX = {
+    "GET /files": 30,
+    "GET /public/files/{id}": 25,
+    "GET /files/{id}": 25,
+    "POST /files": 10,
+    "DELETE /files/{id}": 5,
+    "GET /files?cursor": 5,
+}
+
+
+def _set_env():
+    os.environ.update({
+        "AWS_DEFAULT_REGION": REGION,
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "BACKEND_TABLE": TABLE_NAME,
+        "CURSOR_SECRET": "bench-secret",
+        "FILES_BUCKET": BUCKET,
+        "S3_PREFIX": S3_PREFIX,
+        "LOG_LEVEL": "WARNING",
+        "METRICS_ENABLED": "false",
+    })
+
+
+def _load_template_table_props() -> dict:
+    """BackendTable properties from template.yaml (CloudFormation tags are ignored)."""
+    import yaml
+
+    class _CfnLoader(yaml.SafeLoader):
+        pass
+
+    _CfnLoader.add_multi_constructor("!", lambda loader, suffix, node: None)
+    with open(os.path.join(BACK_DIR, "template.yaml"), encoding="utf-8") as f:
+        template = yaml.load(f, Loader=_CfnLoader)
+    return template["Resources"]["BackendTable"]["Properties"]
+
+
+def create_backend(ddb_client, s3_client):
+    props = _load_template_table_props()
+    kwargs = {
+        "TableName": TABLE_NAME,
+        "BillingMode": "PAY_PER_REQUEST",
+        "AttributeDefinitions": props["AttributeDefinitions"],
+        "KeySchema": props["KeySchema"],
+    }
+    # Indexes behind a false condition load as None (the tag constructors are stubbed out).
+    indexes = [i for i in props.get("GlobalSecondaryIndexes") or () if i and "IndexName" in i]
+    if indexes:
+        kwargs["GlobalSecondaryIndexes"] = indexes
+    ddb_client.create_table(**kwargs)
+    s3_client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION})
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _heavy_tailed_size(rng: random.Random) -> int:
+    # Log-normal around ~2 MB with a long tail into the GB range.
+    return max(1, min(int(rng.lognormvariate(math.log(2 * 1024 * 1024), 2.0)), 20 * 1024 ** 3))
+
+
+def seed_dataset(table, rng: random.Random, users: int, files_per_user: int) -> dict:
+    """Write a synthetic dataset; returns owners and the ready fileIds for public traffic."""
+    now = datetime.now(timezone.utc)
+    owners = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(users)]
+    ready, by_owner = [], defaultdict(list)
+
+    with table.batch_writer() as batch:
+        for owner in owners:
+            # Heavy-tailed per-user file counts: a few users own most files.
+            n_files = max(1, int(rng.paretovariate(1.5) * files_per_user / 3))
+            for _ in range(n_files):
+                file_id = str(uuid.UUID(int=rng.getrandbits(128)))
+                created = now - timedelta(days=rng.uniform(0, 6))
+                status = rng.choices(["ready", "uploading", "deleted"], weights=[85, 5, 10])[0]
+                item = {
+                    "PK": f"u#{owner}",
+                    "SK": f"f#{file_id}",
+                    "fileId": file_id,
+                    "ownerId": owner,
+                    "email": f"{owner[:8]}@example.com",
+                    "s3Prefix": S3_PREFIX,
+                    "s3Key": f"{S3_PREFIX}/{owner}/{file_id}",
+                    "originalFileName": f"file-{file_id[:8]}.bin",
+                    "contentType": "application/octet-stream",
+                    "sizeBytes": _heavy_tailed_size(rng),
+                    "status": status,
+                    "downloadShards": 4,
+                    "createdAt": _iso(created),
+                    "expiresAt": _iso(created + timedelta(days=7)),
+                    "passwordRequired": False,
+                }
+                batch.put_item(Item=item)
+                by_owner[owner].append(file_id)
+                if status == "ready":
+                    ready.append(file_id)
+    return {"owners": owners, "ready": ready, "byOwner": by_owner}
+
+
+def _import(name: str, path: str):
+    sys.path.insert(0, os.path.dirname(path))  # Lambda puts the code directory on sys.path
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class CallCounter:
+    """Counts AWS API calls per service through botocore's after-call hook."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+
+    def attach(self, client):
+        client.meta.events.register("after-call.*.*", self._after_call, unique_id="bench-call-counter")
+
+    def _after_call(self, model, **kwargs):
+        self.counts[model.service_model.service_name] += 1
+
+    def take(self) -> dict:
+        out = dict(self.counts)
+        self.counts.clear()
+        return out
+
+
+def _base_event() -> dict:
+    with open(os.path.join(BACK_DIR, "events", "event.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _api_event(base, method, resource, sub=None, path_id=None, query=None, body=None) -> dict:
+    event = copy.deepcopy(base)
+    event.update({
+        "httpMethod": method,
+        "resource": resource,
+        "path": resource.replace("{id}", path_id or ""),
+        "pathParameters": {"id": path_id} if path_id else None,
+        "queryStringParameters": query,
+        "body": json.dumps(body) if body is not None else None,
+    })
+    event["requestContext"]["authorizer"] = {"claims": {"sub": sub, "email": "bench@example.com"}} if sub else {}
+    return event
+
+
+def _s3_event(key: str, size: int, sequencer: str) -> dict:
+    return {"Records": [{
+        "eventSource": "aws:s3",
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": BUCKET}, "object": {"key": key, "size": size, "sequencer": sequencer}},
+    }]}
+
+
+def _percentile(sorted_ms, pct):
+    if not sorted_ms:
+        return 0.0
+    k = (len(sorted_ms) - 1) * pct / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_ms[lo] + (sorted_ms[hi] - sorted_ms[lo]) * (k - lo)
+
+
+def run(users=50, files_per_user=100, requests=2000, warmup=100, seed=1, mix=None) -> dict:
+    """Run one benchmark and return the report dict."""
+    _set_env()
+    import boto3
+    from moto import mock_aws
+
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    samples = defaultdict(list)
+    calls = defaultdict(lambda: defaultdict(int))
+
+    with mock_aws():
+        create_backend(boto3.client("dynamodb"), boto3.client("s3"))
+        raw_s3 = boto3.client("s3")
+        t0 = time.perf_counter()
+        data = seed_dataset(boto3.resource("dynamodb").Table(TABLE_NAME), rng, users, files_per_user)
+        seed_s = time.perf_counter() - t0
+
+        files_main = _import("bench_files_main", os.path.join(BACK_DIR, "src", "files", "main.py"))
+        created_main = _import("bench_s3_object_created_main", os.path.join(BACK_DIR, "src", "s3_object_created", "main.py"))
+
+        counter = CallCounter()
+        counter.attach(files_main._ddb().meta.client)
+        counter.attach(files_main._s3())
+        counter.attach(created_main._ddb_client())
+
+        base = _base_event()
+        owners, ready, by_owner = data["owners"], data["ready"], data["byOwner"]
+        # Zipf-like popularity: a handful of shared links get most public traffic.
+        popularity = [1 / (i + 1) for i in range(len(ready))]
+        routes, weights = zip(*mix.items())
+
+        for i in range(warmup + requests):
+            route = rng.choices(routes, weights=weights)[0]
+            owner = rng.choice(owners)
+
+            if route == "GET /files":
+                event = _api_event(base, "GET", "/files", sub=owner)
+            elif route == "GET /files?cursor":
+                first = json.loads(files_main.handler(_api_event(base, "GET", "/files", sub=owner, query={"limit": "25"}), None)["body"])
+                counter.take()
+                query = {"limit": "25", "cursor": first["nextCursor"]} if first.get("nextCursor") else {"limit": "25"}
+                event = _api_event(base, "GET", "/files", sub=owner, query=query)
+            elif route in ("GET /public/files/{id}", "GET /files/{id}"):
+                file_id = rng.choices(ready, weights=popularity)[0]
+                event = _api_event(base, "GET", route.split(" ")[1], path_id=file_id)
+            elif route == "DELETE /files/{id}":
+                file_id = rng.choice(by_owner[owner])
+                event = _api_event(base, "DELETE", "/files/{id}", sub=owner, path_id=file_id)
+            else:  # POST /files (+ upload + object-created notification)
+                size = _heavy_tailed_size(rng)
+                event = _api_event(base, "POST", "/files", sub=owner, body={
+                    "originalFileName": f"upload-{i}.bin",
+                    "contentType": "application/octet-stream",
+                    "sizeBytes": size,
+                })
+
+            started = time.perf_counter()
+            resp = files_main.handler(event, None)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            used = counter.take()
+
+            if i >= warmup:
+                samples[route].append(elapsed_ms)
+                calls[route]["requests"] += 1
+                for service, n in used.items():
+                    calls[route][service] += n
+
+            if route == "POST /files" and resp["statusCode"] == 200:
+                body = json.loads(resp["body"])
+                by_owner[owner].append(body["fileId"])
+                if body["upload"]["method"] == "PUT":
+                    key = f"{S3_PREFIX}/{owner}/{body['fileId']}"
+                    raw_s3.put_object(Bucket=BUCKET, Key=key, Body=b"x")
+                    started = time.perf_counter()
+                    created_main.handler(_s3_event(key, 1, f"{i:016X}"), None)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    used = counter.take()
+                    if i >= warmup:
+                        samples["S3 ObjectCreated"].append(elapsed_ms)
+                        calls["S3 ObjectCreated"]["requests"] += 1
+                        for service, n in used.items():
+                            calls["S3 ObjectCreated"][service] += n
+
+    report_routes = {}
+    for route, ms in sorted(samples.items()):
+        ms.sort()
+        n = calls[route]["requests"]
+        report_routes[route] = {
+            "requests": n,
+            "p50Ms": round(_percentile(ms, 50), 3),
+            "p95Ms": round(_percentile(ms, 95), 3),
+            "p99Ms": round(_percentile(ms, 99), 3),
+            "meanMs": round(sum(ms) / len(ms), 3),
+            "ddbCallsPerRequest": round(calls[route].get("dynamodb", 0) / n, 3),
+            "s3CallsPerRequest": round(calls[route].get("s3", 0) / n, 3),
+        }
+
+    return {
+        "meta": {
+            "commit": _git_rev(),
+            "python": platform.python_version(),
+            "params": {"users": users, "filesPerUser": files_per_user, "requests": requests,
+                       "warmup": warmup, "seed": seed, "mix": mix},
+            "items": sum(len(v) for v in data["byOwner"].values()),
+            "seedSeconds": round(seed_s, 2),
+        },
+        "routes": report_routes,
+    }
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report: dict, baseline: dict | None = None) -> None:
+    meta = report["meta"]
+    params = {k: v for k, v in meta["params"].items() if k != "mix"}
+    print(f"commit={meta['commit']} items={meta['items']} params={json.dumps(params)}")
+    header = f"{'route':<24} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ddb/req':>8} {'s3/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        line = (f"{route:<24} {r['requests']:>6} {r['p50Ms']:>9.2f} {r['p95Ms']:>9.2f} {r['p99Ms']:>9.2f} "
+                f"{r['ddbCallsPerRequest']:>8.2f} {r['s3CallsPerRequest']:>7.2f}")
+        old = (baseline or {}).get("routes", {}).get(route)
+        if old:
+            line += f"   p95 {r['p95Ms'] - old['p95Ms']:+.2f}ms  ddb/req {r['ddbCallsPerRequest'] - old['ddbCallsPerRequest']:+.2f}"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--files-per-user", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args(argv)
+
+    report = run(args.users, args.files_per_user, args.requests, args.warmup, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
 import importlib
+import importlib.util
 import os
 import sys
 from types import SimpleNamespace
@@ -8,6 +9,8 @@ import pytest
 
 class _DummyTable:
     """Stub DynamoDB Table used by unit tests."""
+    name = "dummy-table"
+
     def query(self, **kwargs):  # pragma: no cover
         return {"Items": []}
 
@@ -26,6 +29,7 @@ def lambda_main(monkeypatch):
     """
     # Ensure required env is set before import (main.py reads BACKEND_TABLE at import time)
     monkeypatch.setenv("BACKEND_TABLE", "dummy-table")
+    monkeypatch.setenv("CURSOR_SECRET", "test-secret")
     monkeypatch.setenv("LOG_LEVEL", "INFO")
 
     # Patch boto3.resource BEFORE importing main.py
@@ -45,3 +49,51 @@ def lambda_main(monkeypatch):
         mod = importlib.import_module("main")
 
     return mod
+
+
+class _DummyDdbClient:
+    """Stub low-level DynamoDB client; tests replace methods as needed."""
+    def query(self, **kwargs):  # pragma: no cover
+        return {"Items": []}
+
+    def update_item(self, **kwargs):  # pragma: no cover
+        return {}
+
+
+def _load_lambda(monkeypatch, dir_name: str, module_name: str):
+    """
+    Imports back/src/<dir_name>/main.py under a distinct module name (every Lambda
+    uses main.py) with boto3 patched so import has no AWS side effects.
+    """
+    monkeypatch.setenv("BACKEND_TABLE", "dummy-table")
+    monkeypatch.setenv("LOG_LEVEL", "INFO")
+
+    import boto3
+    monkeypatch.setattr(boto3, "client", lambda service_name, **kwargs: _DummyDdbClient())
+    monkeypatch.setattr(boto3, "resource", lambda service_name, **kwargs: _DummyDdbResource())
+
+    path = os.path.join(os.getcwd(), "src", dir_name, "main.py")
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+@pytest.fixture()
+def s3_created_main(monkeypatch):
+    """Imports back/src/s3_object_created/main.py (see _load_lambda)."""
+    return _load_lambda(monkeypatch, "s3_object_created", "s3_object_created_main")
+
+
+@pytest.fixture()
+def upload_reaper_main(monkeypatch):
+    """Imports back/src/upload_reaper/main.py (see _load_lambda)."""
+    monkeypatch.setenv("FILES_BUCKET", "dummy-bucket")
+    return _load_lambda(monkeypatch, "upload_reaper", "upload_reaper_main")
+
+
+@pytest.fixture()
+def expired_files_main(monkeypatch):
+    """Imports back/src/expired_files/main.py (see _load_lambda)."""
+    monkeypatch.setenv("FILES_BUCKET", "dummy-bucket")
+    return _load_lambda(monkeypatch, "expired_files", "expired_files_main")
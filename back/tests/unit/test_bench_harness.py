@@ -0,0 +1,25 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("moto")
+
+
+def test_bench_harness_smoke(tmp_path):
+    # Separate interpreter: the harness sets process env and imports the Lambdas under moto.
+    out = tmp_path / "bench.json"
+    subprocess.run(
+        [sys.executable, "-m", "tests.bench.bench_handlers",
+         "--users", "3", "--files-per-user", "6", "--requests", "60", "--warmup", "5", "--seed", "7",
+         "--out", str(out)],
+        check=True, capture_output=True, text=True,
+    )
+    report = json.loads(out.read_text())
+
+    assert report["meta"]["items"] > 0
+    for route, stats in report["routes"].items():
+        assert stats["requests"] > 0, route
+        assert stats["p50Ms"] <= stats["p95Ms"] <= stats["p99Ms"], route
+    assert report["routes"]["POST /files"]["ddbCallsPerRequest"] >= 1
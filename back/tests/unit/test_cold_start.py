@@ -0,0 +1,83 @@
+"""Cold-start budget for the Lambda modules.
+
+Each measurement runs in a fresh interpreter so module import cost is real. The default
+suite only checks what does not depend on machine load (boto3 stays unimported). The
+wall-clock budgets are marked `perf` and run with `pytest -m perf -s`; tune them per machine
+with COLD_START_IMPORT_BUDGET_MS / COLD_START_INVOKE_BUDGET_MS.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+IMPORT_BUDGET_MS = float(os.getenv("COLD_START_IMPORT_BUDGET_MS", "150"))
+INVOKE_BUDGET_MS = float(os.getenv("COLD_START_INVOKE_BUDGET_MS", "25"))
+RUNS = int(os.getenv("COLD_START_RUNS", "5"))
+
+_PROBE = r"""
+import importlib.util, json, os, sys, time
+os.environ.setdefault("BACKEND_TABLE", "dummy-table")
+os.environ.setdefault("CURSOR_SECRET", "cold-start-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+path, event = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, os.path.dirname(path))  # Lambda puts the code directory on sys.path
+
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lambda_main", path)
+mod = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mod)
+t1 = time.perf_counter()
+mod.handler(event, None)
+t2 = time.perf_counter()
+
+print(json.dumps({
+    "importMs": (t1 - t0) * 1000,
+    "invokeMs": (t2 - t1) * 1000,
+    "boto3Loaded": "boto3" in sys.modules,
+}))
+"""
+
+CASES = {
+    "files-options": ("files", {"httpMethod": "OPTIONS", "resource": "/files"}),
+    "files-405": ("files", {"httpMethod": "PATCH", "resource": "/files"}),
+    "s3-object-created-empty": ("s3_object_created", {"Records": []}),
+}
+
+
+def _measure(module_dir, event, runs=RUNS):
+    path = os.path.join(os.getcwd(), "src", module_dir, "main.py")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE, path, json.dumps(event)],
+            check=True, capture_output=True, text=True,
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "importMs": statistics.median(s["importMs"] for s in samples),
+        "invokeMs": statistics.median(s["invokeMs"] for s in samples),
+        "boto3Loaded": any(s["boto3Loaded"] for s in samples),
+    }
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_cold_start_paths_do_not_import_boto3(case):
+    # Paths that never touch AWS must not pay for importing boto3.
+    module_dir, event = CASES[case]
+    assert _measure(module_dir, event, runs=1)["boto3Loaded"] is False
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_cold_start_within_budget(case):
+    module_dir, event = CASES[case]
+    result = _measure(module_dir, event)
+    print(f"\n{case}: {json.dumps({k: round(v, 2) if isinstance(v, float) else v for k, v in result.items()})}")
+
+    assert result["boto3Loaded"] is False
+    assert result["importMs"] <= IMPORT_BUDGET_MS, f"import took {result['importMs']:.1f}ms"
+    assert result["invokeMs"] <= INVOKE_BUDGET_MS, f"first invocation took {result['invokeMs']:.1f}ms"
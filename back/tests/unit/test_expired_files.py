@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+TTL_IDENTITY = {"type": "Service", "principalId": "dynamodb.amazonaws.com"}
+
+
+def _removal(file_id, seq, status="ready", owner="o", shards=0, identity=TTL_IDENTITY, sk=None):
+    image = {
+        "PK": {"S": f"u#{owner}"},
+        "SK": {"S": sk or f"f#{file_id}"},
+        "fileId": {"S": file_id},
+        "status": {"S": status},
+        "s3Key": {"S": f"files/{owner}/{file_id}"},
+        "sizeBytes": {"N": "100"},
+        "storedBytes": {"N": "90"},
+        "downloadShards": {"N": str(shards)},
+        "usageTracked": {"BOOL": True},
+    }
+    rec = {"eventName": "REMOVE", "dynamodb": {"SequenceNumber": seq, "OldImage": image}}
+    if identity:
+        rec["userIdentity"] = identity
+    return rec
+
+
+class _FakeS3:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.batches = []
+
+    def delete_objects(self, Bucket, Delete):  # noqa: N803 (boto3 naming)
+        keys = [o["Key"] for o in Delete["Objects"]]
+        self.batches.append(keys)
+        return {"Errors": [{"Key": k, "Code": "InternalError"} for k in keys if k in self.failing]}
+
+
+class _FakeDdb:
+    def __init__(self, failing_pk=None):
+        self.failing_pk = failing_pk
+        self.updates = []
+        self.deleted = []
+
+    def update_item(self, **kwargs):
+        if kwargs["Key"]["PK"]["S"] == self.failing_pk:
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem")
+        self.updates.append((kwargs["Key"]["PK"]["S"], kwargs["ExpressionAttributeValues"]))
+
+    def batch_write_item(self, RequestItems):  # noqa: N803 (boto3 naming)
+        for requests in RequestItems.values():
+            self.deleted.extend(r["DeleteRequest"]["Key"]["PK"]["S"] for r in requests)
+        return {"UnprocessedItems": {}}
+
+
+def _use(mod, monkeypatch, s3, ddb):
+    monkeypatch.setattr(mod, "_s3_client", lambda: s3)
+    monkeypatch.setattr(mod, "_ddb_client", lambda: ddb)
+
+
+def test_ttl_removals_delete_objects_in_one_batch_and_release_usage(expired_files_main, monkeypatch):
+    s3, ddb = _FakeS3(), _FakeDdb()
+    _use(expired_files_main, monkeypatch, s3, ddb)
+    records = [
+        _removal("a", "1", shards=2),
+        _removal("b", "2", status="deleted"),                 # object already gone, usage already released
+        _removal("c", "3", identity={"type": "User"}),        # a user delete, not TTL
+        _removal("d", "4", sk="dc"),                          # not a file record
+    ]
+
+    result = expired_files_main.handler({"Records": records}, None)
+
+    assert result == {"batchItemFailures": []}
+    assert s3.batches == [["files/o/a"]]
+    assert ddb.updates == [("u#o", {":n": {"N": "-1"}, ":b": {"N": "-100"}, ":ts": ddb.updates[0][1][":ts"],
+                                    ":rb": {"N": "-90"}})]
+    assert ddb.deleted == ["dc#a#0", "dc#a#1"]
+
+
+def test_expired_objects_are_invalidated_on_the_distribution(expired_files_main, monkeypatch):
+    s3, ddb = _FakeS3(failing={"files/o/b"}), _FakeDdb()
+    _use(expired_files_main, monkeypatch, s3, ddb)
+    invalidations = []
+    monkeypatch.setattr(expired_files_main, "CLOUDFRONT_DISTRIBUTION_ID", "E123")
+    monkeypatch.setattr(expired_files_main, "cloudfront_client", SimpleNamespace(
+        create_invalidation=lambda **kw: invalidations.append(kw["InvalidationBatch"]["Paths"]["Items"])))
+
+    expired_files_main.process([_removal("a", "1"), _removal("b", "2"), _removal("c", "3", status="deleted")])
+
+    assert invalidations == [["/files/o/a"]]
+
+
+def test_failures_stop_at_first_unfinished_record(expired_files_main, monkeypatch):
+    s3, ddb = _FakeS3(failing={"files/o/c"}), _FakeDdb(failing_pk="u#p")
+    _use(expired_files_main, monkeypatch, s3, ddb)
+
+    report = expired_files_main.process([_removal("a", "1"), _removal("b", "2", owner="p"), _removal("c", "3")])
+    assert report["batchItemFailures"] == [{"itemIdentifier": "2"}]
+    assert [pk for pk, _ in ddb.updates] == ["u#o"]
+
+    ddb = _FakeDdb()
+    _use(expired_files_main, monkeypatch, s3, ddb)
+    report = expired_files_main.process([_removal("b", "2", owner="p"), _removal("c", "3")])
+    assert report["batchItemFailures"] == [{"itemIdentifier": "3"}]
+    assert [pk for pk, _ in ddb.updates] == ["u#p"]
@@ -0,0 +1,50 @@
+import importlib.util
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+
+@pytest.fixture()
+def generator():
+    path = os.path.join(os.getcwd(), "scripts", "generate-ddb-test-data.py")
+    spec = importlib.util.spec_from_file_location("generate_ddb_test_data", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_items_are_deterministic_and_usage_matches_files(generator):
+    args = generator.parse_args(["--users", "3", "--files-per-user", "30", "--seed", "7"])
+    mix = generator.parse_status_mix(args.status_mix)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    first = list(generator.user_items(2, args, mix, now))
+    assert first == list(generator.user_items(2, args, mix, now))
+
+    *files, usage = first
+    held = [f for f in files if f["status"] in ("uploading", "ready")]
+    assert usage["SK"] == "usage"
+    assert usage["fileCount"] == len(held)
+    assert usage["usedBytes"] == sum(f["sizeBytes"] for f in held)
+    assert all(("pendingShard" in f) == (f["status"] == "uploading") for f in files)
+
+    with pytest.raises(ValueError):
+        generator.parse_status_mix("ready=-1")
+
+
+def test_load_users_writes_through_batch_writer(generator, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        args = generator.parse_args(["--users", "10", "--files-per-user", "5", "--table", "gen-test"])
+        generator.create_table(args)
+
+        written, _ = generator.load_users(0, 10, args, generator.parse_status_mix(args.status_mix),
+                                          datetime.now(timezone.utc))
+
+        client = boto3.session.Session(region_name=args.region).client("dynamodb")
+        assert client.scan(TableName="gen-test", Select="COUNT")["Count"] == written > 10
@@ -1,4 +1,8 @@
 import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
 
 
 def test_build_response_shape(lambda_main):
@@ -44,6 +48,50 @@ def test_is_admin_user_false_when_admins_group_absent(lambda_main):
     assert lambda_main.is_admin_user(event) is False
 
 
+@pytest.mark.parametrize("groups, expected", [
+    ("Users,Admins", True),
+    ("[Users Admins]", True),
+    (["Admins"], True),
+    ("NotAdmins", False),
+    ("", False),
+])
+def test_request_context_parses_claims_once(lambda_main, groups, expected):
+    event = {
+        "httpMethod": "DELETE",
+        "resource": "/files/{id}",
+        "pathParameters": {"id": "f1"},
+        "requestContext": {"authorizer": {"claims": {
+            "sub": "owner-1", "cognito:username": "alice", "cognito:groups": groups,
+        }}},
+    }
+    ctx = lambda_main.RequestContext.from_event(event)
+
+    assert (ctx.method, ctx.resource, ctx.owner_id, ctx.email, ctx.file_id) == (
+        "DELETE", "/files/{id}", "owner-1", "alice", "f1")
+    assert ctx.is_admin is expected
+    assert dict(ctx.query) == {}
+    with pytest.raises(AttributeError):
+        ctx.owner_id = "someone-else"
+    with pytest.raises(TypeError):
+        ctx.path_params["id"] = "f2"
+
+
+def test_route_table_applies_middlewares(lambda_main):
+    assert ("GET", "/admin/files") in lambda_main.ROUTES
+    anonymous = {"requestContext": {"authorizer": {"claims": {}}}}
+
+    for (method, resource) in lambda_main.ROUTES:
+        resp = lambda_main.handler(dict(anonymous, httpMethod=method, resource=resource), None)
+        if resource == "/admin/files":
+            assert resp["statusCode"] == 403
+        elif resource.startswith("/public/") or (method, resource) == ("GET", "/files/{id}"):
+            assert resp["statusCode"] == 400  # public, reached the view: no id in path
+        else:
+            assert resp["statusCode"] == 401
+
+    assert lambda_main.handler(dict(anonymous, httpMethod="PUT", resource="/files"), None)["statusCode"] == 405
+
+
 def test_handler_get_files_non_admin_routes_to_user_view(lambda_main, monkeypatch):
     # Force non-admin path to avoid calling admin_view (currently incomplete)
     monkeypatch.setattr(lambda_main, "is_admin_user", lambda event: False)
@@ -70,3 +118,884 @@ def test_handler_method_not_allowed(lambda_main):
     resp = lambda_main.handler(event, None)
 
     assert resp["statusCode"] == 401
+
+
+class _RecordingTable:
+    """Table stub that records query kwargs and returns canned pages (and items by key)."""
+    def __init__(self, pages, items=()):
+        self.pages = list(pages)
+        self.calls = []
+        self.items = {(i["PK"], i["SK"]): i for i in items}
+        self.gets = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.pages.pop(0) if self.pages else {"Items": []}
+
+    def get_item(self, Key, **kwargs):  # noqa: N803 (boto3 naming)
+        self.gets.append(kwargs)
+        item = self.items.get((Key["PK"], Key["SK"]))
+        return {"Item": item} if item else {}
+
+
+def _user_event(sub="owner-1", query=None):
+    return {
+        "httpMethod": "GET",
+        "resource": "/files",
+        "queryStringParameters": query,
+        "requestContext": {"authorizer": {"claims": {"sub": sub}}},
+    }
+
+
+def test_cursor_roundtrip_and_tamper(lambda_main):
+    key = {"PK": "u#owner-1", "SK": "f#abc"}
+    cursor = lambda_main._encode_cursor(key)
+
+    assert lambda_main._decode_cursor(cursor, "u#owner-1") == key
+
+    payload, sig = cursor.split(".")
+    forged = lambda_main._b64url(b'{"PK":"u#owner-1","SK":"f#zzz"}') + "." + sig
+    for bad in (forged, "garbage", cursor + "x"):
+        with pytest.raises(ValueError):
+            lambda_main._decode_cursor(bad, "u#owner-1")
+
+    # Valid signature but someone else's partition
+    with pytest.raises(ValueError):
+        lambda_main._decode_cursor(cursor, "u#owner-2")
+
+
+def test_missing_cursor_secret_fails_cold_start(lambda_main, monkeypatch):
+    import importlib
+    monkeypatch.delenv("CURSOR_SECRET")
+    with pytest.raises(RuntimeError, match="CURSOR_SECRET"):
+        importlib.reload(lambda_main)
+
+
+def test_user_files_view_paginates_with_projection(lambda_main, monkeypatch):
+    last_key = {"PK": "u#owner-1", "SK": "f#1"}
+    table = _RecordingTable([
+        {"Items": [{"fileId": "1", "sizeBytes": 5}], "LastEvaluatedKey": last_key},
+        {"Items": [{"fileId": "2"}]},
+    ])
+    monkeypatch.setattr(lambda_main, "table", table)
+
+    resp = lambda_main.handler(_user_event(query={"limit": "1"}), None)
+    body = json.loads(resp["body"])
+    assert resp["statusCode"] == 200
+    assert [i["fileId"] for i in body["items"]] == ["1"]
+    assert body["nextCursor"]
+    assert table.calls[0]["Limit"] == 1
+    assert "fileId" in table.calls[0]["ExpressionAttributeNames"].values()
+    assert "ExclusiveStartKey" not in table.calls[0]
+
+    resp = lambda_main.handler(_user_event(query={"limit": "1", "cursor": body["nextCursor"]}), None)
+    body = json.loads(resp["body"])
+    assert [i["fileId"] for i in body["items"]] == ["2"]
+    assert body["nextCursor"] is None
+    assert table.calls[1]["ExclusiveStartKey"] == last_key
+
+
+def test_user_files_view_rejects_bad_cursor_and_limit(lambda_main):
+    assert lambda_main.handler(_user_event(query={"cursor": "nope"}), None)["statusCode"] == 400
+    assert lambda_main.handler(_user_event(query={"limit": "ten"}), None)["statusCode"] == 400
+
+
+def test_file_cache_ttl_lru_and_negative_entries(lambda_main):
+    now = [0.0]
+    cache = lambda_main._FileMetaCache(2, ttl_seconds=30, negative_ttl_seconds=5, clock=lambda: now[0])
+
+    cache.put("a", {"status": "ready"})
+    cache.put("missing", None)
+    assert cache.get("a") == (True, {"status": "ready"})
+    assert cache.get("missing") == (True, None)
+
+    cache.put("b", {"status": "ready"})  # evicts least recently used ("a" was touched before "missing")
+    assert cache.get("a") == (False, None)
+
+    now[0] = 6.0  # negative entry expired, ready entry still valid
+    assert cache.get("missing") == (False, None)
+    assert cache.get("b")[0] is True
+
+    cache.invalidate("b")
+    assert cache.get("b") == (False, None)
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["negativeHits"] == 1 and stats["misses"] == 3
+    assert stats["evictions"] == 1 and stats["invalidations"] == 1
+    assert cache.lookups == 6
+
+
+def test_public_paths_share_file_cache(lambda_main, monkeypatch):
+    # What the slim fileId index projects; metadata fields come from the table by key, once.
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "expiresAt": "2999-01-01T00:00:00Z"}
+    table = _RecordingTable([{"Items": [item]}], items=[{**item, "originalFileName": "a.txt", "createdAt": "x"}])
+    table.update_item = lambda **kwargs: {}
+    monkeypatch.setattr(lambda_main, "table", table)
+    monkeypatch.setattr(lambda_main._s3(), "generate_presigned_url", lambda **kwargs: "https://signed")
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    dl = lambda_main.handler({"httpMethod": "GET", "resource": "/files/{id}", "pathParameters": {"id": "f1"}}, None)
+    assert dl["statusCode"] == 302
+    assert table.gets == []
+
+    meta_event = {"httpMethod": "GET", "resource": "/public/files/{id}", "pathParameters": {"id": "f1"}}
+    meta = lambda_main.handler(meta_event, None)
+    again = lambda_main.handler(meta_event, None)
+
+    assert meta["statusCode"] == 200
+    assert json.loads(meta["body"])["originalFileName"] == "a.txt"
+    assert json.loads(again["body"]) == json.loads(meta["body"])
+    assert len(table.calls) == 1
+    assert len(table.gets) == 1
+    assert set(table.gets[0]["ExpressionAttributeNames"].values()) == set(lambda_main.PUBLIC_METADATA_FIELDS)
+
+
+def test_public_metadata_caches_not_found(lambda_main, monkeypatch):
+    table = _RecordingTable([])
+    monkeypatch.setattr(lambda_main, "table", table)
+    event = {"httpMethod": "GET", "resource": "/public/files/{id}", "pathParameters": {"id": "nope"}}
+
+    assert lambda_main.handler(event, None)["statusCode"] == 404
+    assert lambda_main.handler(event, None)["statusCode"] == 404
+    assert len(table.calls) == 1
+
+
+class _FakeS3:
+    """Minimal S3 client stub for multipart tests."""
+    def __init__(self):
+        self.completed = None
+        self.aborted = []
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):  # noqa: N803 (boto3 naming)
+        return f"https://s3/{ClientMethod}/{Params['Key']}?part={Params.get('PartNumber', '')}"
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "up-1"}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.completed = kwargs
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted.append(kwargs)
+
+
+class _FakeTransactClient:
+    """Low-level client stub recording TransactWriteItems calls."""
+    def __init__(self, fail_entry=None):
+        self.transactions = []
+        self.written = []
+        self.fail_entry = fail_entry
+
+    def transact_write_items(self, TransactItems):  # noqa: N803 (boto3 naming)
+        if self.fail_entry is not None:
+            reasons = [{"Code": "None"}] * len(TransactItems)
+            reasons[self.fail_entry] = {"Code": "ConditionalCheckFailed"}
+            raise ClientError({"Error": {"Code": "TransactionCanceledException"}, "CancellationReasons": reasons},
+                              "TransactWriteItems")
+        self.transactions.append(TransactItems)
+        self.written.extend(e["Put"]["Item"] for e in TransactItems if "Put" in e)
+
+
+def _use_transact_client(lambda_main, monkeypatch, client):
+    monkeypatch.setattr(lambda_main._ddb(), "meta", SimpleNamespace(client=client), raising=False)
+    return client
+
+
+def _owner_event(method, resource, file_id=None, body=None, sub="owner-1"):
+    return {
+        "httpMethod": method,
+        "resource": resource,
+        "pathParameters": {"id": file_id} if file_id else None,
+        "body": json.dumps(body) if body is not None else None,
+        "requestContext": {"authorizer": {"claims": {"sub": sub}}},
+    }
+
+
+def test_resolve_part_size_respects_s3_part_limit(lambda_main):
+    assert lambda_main._resolve_part_size(200 * 1024 * 1024) == lambda_main.MULTIPART_PART_SIZE_BYTES
+    huge = 4 * 1024 ** 4
+    part = lambda_main._resolve_part_size(huge)
+    assert -(-huge // part) <= lambda_main.S3_MAX_PARTS
+    assert part % (1024 * 1024) == 0
+
+
+def test_post_files_switches_to_multipart_above_threshold(lambda_main, monkeypatch):
+    fake_s3 = _FakeS3()
+    written = _use_transact_client(lambda_main, monkeypatch, _FakeTransactClient()).written
+    monkeypatch.setattr(lambda_main, "s3", fake_s3)
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    small = lambda_main.handler(_owner_event("POST", "/files", body={"originalFileName": "a", "sizeBytes": 10}), None)
+    assert json.loads(small["body"])["upload"]["method"] == "PUT"
+
+    size = lambda_main.MULTIPART_THRESHOLD_BYTES + 1
+    resp = lambda_main.handler(_owner_event("POST", "/files", body={"originalFileName": "b", "sizeBytes": size}), None)
+    upload = json.loads(resp["body"])["upload"]
+
+    assert resp["statusCode"] == 200
+    assert upload["method"] == "MULTIPART"
+    assert upload["partCount"] == -(-size // upload["partSizeBytes"])
+    assert [p["partNumber"] for p in upload["parts"]] == list(range(1, min(upload["partCount"], lambda_main.MULTIPART_URL_BATCH) + 1))
+    assert written[-1]["uploadId"] == "up-1"
+    assert written[-1]["uploadMode"] == "multipart"
+    assert written[-1]["s3Key"] == f"files/owner-1/{written[-1]['fileId']}"
+    assert written[-1]["pendingShard"] == lambda_main._pending_shard(written[-1]["fileId"])
+
+
+def test_multipart_complete_requires_all_parts(lambda_main, monkeypatch):
+    fake_s3 = _FakeS3()
+    item = {"PK": "u#owner-1", "SK": "f#f1", "fileId": "f1", "status": "uploading",
+            "uploadMode": "multipart", "uploadId": "up-1", "partCount": 2, "partSizeBytes": 5}
+    monkeypatch.setattr(lambda_main, "s3", fake_s3)
+    monkeypatch.setattr(lambda_main._table(), "get_item", lambda Key: {"Item": item}, raising=False)
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    partial = _owner_event("POST", "/files/{id}/complete", "f1", {"parts": [{"partNumber": 1, "etag": "e1"}]})
+    assert lambda_main.handler(partial, None)["statusCode"] == 400
+    assert fake_s3.completed is None
+
+    full = _owner_event("POST", "/files/{id}/complete", "f1",
+                        {"parts": [{"partNumber": 2, "etag": "e2"}, {"partNumber": 1, "etag": "e1"}]})
+    assert lambda_main.handler(full, None)["statusCode"] == 200
+    assert [p["PartNumber"] for p in fake_s3.completed["MultipartUpload"]["Parts"]] == [1, 2]
+
+    bad_range = _owner_event("POST", "/files/{id}/parts", "f1", {"partNumbers": [3]})
+    assert lambda_main.handler(bad_range, None)["statusCode"] == 400
+
+
+def test_public_download_increments_a_counter_shard(lambda_main, monkeypatch):
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "downloadShards": 4}
+    updates = []
+    table = _RecordingTable([{"Items": [item]}])
+    table.update_item = lambda **kwargs: updates.append(kwargs)
+    monkeypatch.setattr(lambda_main, "table", table)
+    monkeypatch.setattr(lambda_main, "_fold_download_shards", lambda *args: None)
+    monkeypatch.setattr(lambda_main._s3(), "generate_presigned_url", lambda **kwargs: "https://signed")
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    resp = lambda_main.handler({"httpMethod": "GET", "resource": "/files/{id}", "pathParameters": {"id": "f1"}}, None)
+
+    assert resp["statusCode"] == 302
+    assert updates[0]["Key"]["PK"] in {f"dc#f1#{n}" for n in range(4)}
+    assert updates[0]["ConditionExpression"] == "attribute_not_exists(closedAt)"
+
+
+def test_buffered_download_counts_flush_as_one_write(lambda_main, monkeypatch):
+    updates = []
+    monkeypatch.setattr(lambda_main, "DOWNLOAD_COUNTER_FLUSH_SECONDS", 60)
+    monkeypatch.setattr(lambda_main._table(), "update_item", lambda **kw: updates.append(kw), raising=False)
+    monkeypatch.setattr(lambda_main, "_fold_download_shards", lambda *args: None)
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "downloadShards": 4}
+
+    for _ in range(3):
+        lambda_main._record_download(item)
+    assert updates == []
+    assert lambda_main._unfolded == {}  # nothing to fold until the increments are written
+
+    lambda_main._flush_download_counters(force=True)
+    assert len(updates) == 1
+    assert updates[0]["ExpressionAttributeValues"][":n"] == 3
+
+
+def test_user_files_view_adds_folded_shard_downloads(lambda_main, monkeypatch):
+    items = [
+        {"fileId": "f1", "status": "ready", "downloadCount": 1, "shardDownloads": 5, "downloadedAt": "2025-02-01T00:00:00Z"},
+        {"fileId": "f2", "status": "uploading"},
+    ]
+    table = _RecordingTable([{"Items": items}])
+    monkeypatch.setattr(lambda_main, "table", table)
+    monkeypatch.setattr(lambda_main._ddb(), "batch_get_item", lambda **kw: pytest.fail("listing read shards"), raising=False)
+
+    body = json.loads(lambda_main.handler(_user_event(), None)["body"])
+
+    assert [i["downloadCount"] for i in body["items"]] == [6, 0]
+    assert body["items"][0]["downloadedAt"] == "2025-02-01T00:00:00Z"
+    assert "shardDownloads" not in body["items"][0]
+    assert "shardDownloads" in table.calls[0]["ExpressionAttributeNames"].values()
+
+
+def test_download_shards_fold_onto_file_item_once_per_interval(lambda_main, monkeypatch):
+    updates, requested = [], []
+    monkeypatch.setattr(lambda_main._table(), "update_item", lambda **kw: updates.append(kw), raising=False)
+    monkeypatch.setattr(lambda_main._table(), "name", "dummy-table", raising=False)
+
+    def batch_get_item(RequestItems):  # noqa: N803 (boto3 naming)
+        (req,) = RequestItems.values()
+        requested.append([k["PK"] for k in req["Keys"]])
+        return {"Responses": {"dummy-table": [
+            {"downloadCount": 2, "downloadedAt": "2025-02-01T00:00:00Z"},
+            {"downloadCount": 3, "downloadedAt": "2025-01-01T00:00:00Z"},
+        ]}}
+
+    monkeypatch.setattr(lambda_main._ddb(), "batch_get_item", batch_get_item, raising=False)
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "downloadShards": 2}
+
+    for _ in range(3):
+        lambda_main._record_download(item)
+
+    shard_adds = [u for u in updates if u["Key"]["PK"].startswith("dc#")]
+    folds = [u for u in updates if u["Key"] == {"PK": "u#o", "SK": "f#f1"}]
+    assert len(shard_adds) == 3
+    assert requested == [["dc#f1#0", "dc#f1#1"]]  # later downloads fall inside the fold interval
+    assert folds[0]["ExpressionAttributeValues"] == {":n": 5, ":last": "2025-02-01T00:00:00Z"}
+    assert "shardDownloads < :n" in folds[0]["ConditionExpression"]
+
+    lambda_main._flush_download_counters(force=True)
+    assert len(requested) == 2
+
+def test_presigned_url_cache_reuse_window(lambda_main):
+    now = [1000.0]
+    cache = lambda_main._PresignedUrlCache(10, min_remaining_seconds=300, clock=lambda: now[0])
+
+    cache.put("f1", "files/o/f1", "https://u1", signed_at=1000.0, expires_in=900)
+    assert cache.get("f1", "files/o/f1") == "https://u1"
+    assert cache.get("f1", "files/o/other") is None
+
+    now[0] = 1000.0 + 601  # only 299s left: too little to hand out
+    assert cache.get("f1", "files/o/f1") is None
+
+    cache.put("f1", "files/o/f1", "https://u2", signed_at=now[0], expires_in=900)
+    cache.invalidate("f1")
+    assert cache.get("f1", "files/o/f1") is None
+
+
+def test_public_download_reuses_signed_url(lambda_main, monkeypatch):
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "s3Key": "files/o/f1"}
+    table = _RecordingTable([{"Items": [item]}])
+    table.update_item = lambda **kwargs: {}
+    signed = []
+    monkeypatch.setattr(lambda_main, "table", table)
+    monkeypatch.setattr(lambda_main._s3(), "generate_presigned_url", lambda **kw: signed.append(kw) or f"https://s/{len(signed)}")
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+    event = {"httpMethod": "GET", "resource": "/files/{id}", "pathParameters": {"id": "f1"}}
+
+    first = lambda_main.handler(event, None)
+    second = lambda_main.handler(event, None)
+
+    assert first["headers"]["Location"] == second["headers"]["Location"] == "https://s/1"
+    assert len(signed) == 1
+
+
+def test_cloudfront_download_url_verifies_with_public_key(lambda_main, monkeypatch):
+    pytest.importorskip("cryptography")
+    import base64
+    from urllib.parse import parse_qs, urlsplit
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    loads = []
+    monkeypatch.setattr(lambda_main, "_load_cloudfront_private_key", lambda: loads.append(1) or pem)
+    monkeypatch.setattr(lambda_main, "DOWNLOAD_MODE", "cloudfront")
+    monkeypatch.setattr(lambda_main, "CLOUDFRONT_DOMAIN", "d111.cloudfront.net")
+    monkeypatch.setattr(lambda_main, "CLOUDFRONT_KEY_ID", "K2JCJMDEHXQW5F")
+    monkeypatch.setattr(lambda_main, "cloudfront_signer", None)
+
+    urls = [lambda_main._signed_download_url("bucket", f"files/o/f{n} x", 1_700_000_000) for n in range(2)]
+    assert len(loads) == 1  # key fetched and parsed once per container
+
+    parts = urlsplit(urls[0])
+    query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    resource = f"https://{parts.netloc}{parts.path}"
+    assert resource == "https://d111.cloudfront.net/files/o/f0%20x"
+    assert query["Key-Pair-Id"] == "K2JCJMDEHXQW5F"
+    expires = 1_700_000_000 + lambda_main.PRESIGN_GET_EXPIRES_SECONDS
+    assert query["Expires"] == str(expires)
+
+    # Canned policy as CloudFront reconstructs it, and its URL-safe signature alphabet.
+    policy = ('{"Statement":[{"Resource":"%s","Condition":{"DateLessThan":{"AWS:EpochTime":%d}}}]}'
+              % (resource, expires)).encode()
+    signature = base64.b64decode(query["Signature"].translate(str.maketrans("-_~", "+=/")))
+    key.public_key().verify(signature, policy, padding.PKCS1v15(), hashes.SHA1())
+
+
+def test_handler_emits_one_emf_record(lambda_main, capsys):
+    lambda_main.handler({"httpMethod": "OPTIONS", "resource": "/files"}, None)
+
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Service", "Route"]]
+    assert record["Route"] == "OPTIONS /files"
+    assert record["StatusCode"] == 200
+    assert {m["Name"] for m in directive["Metrics"]} <= set(record)
+
+
+def test_metrics_hooks_time_aws_calls(lambda_main):
+    import boto3
+    from botocore.stub import Stubber
+
+    client = boto3.client("s3", region_name="eu-central-1", aws_access_key_id="x", aws_secret_access_key="x")
+    lambda_main.metrics.instrument(client)
+    lambda_main.metrics.start("GET /test")
+    lambda_main.metrics.count("FileCacheHit")
+
+    with Stubber(client) as stub:
+        stub.add_response("head_object", {}, {"Bucket": "b", "Key": "k"})
+        stub.add_response("head_object", {}, {"Bucket": "b", "Key": "k"})
+        client.head_object(Bucket="b", Key="k")
+        client.head_object(Bucket="b", Key="k")
+
+    record = lambda_main.metrics.snapshot()
+    assert record["S3.HeadObject.Count"] == 2
+    assert record["AwsCalls"] == 2
+    assert record["FileCacheHit"] == 1
+
+
+def test_bulk_delete_marks_only_owned_and_removed_files(lambda_main, monkeypatch):
+    owned = [{"PK": "u#owner-1", "SK": f"f#{i}", "fileId": i, "status": "ready", "s3Key": f"files/owner-1/{i}"}
+             for i in ("a", "b", "c")]
+    batches, updates = [], []
+
+    def batch_get_item(RequestItems):  # noqa: N803 (boto3 naming)
+        (req,) = RequestItems.values()
+        wanted = {k["SK"] for k in req["Keys"]}
+        return {"Responses": {"dummy-table": [i for i in owned if i["SK"] in wanted]}}
+
+    class _S3(_FakeS3):
+        def delete_objects(self, Bucket, Delete):  # noqa: N803 (boto3 naming)
+            batches.append([o["Key"] for o in Delete["Objects"]])
+            return {"Errors": [{"Key": "files/owner-1/b", "Code": "AccessDenied"}]}
+
+    monkeypatch.setattr(lambda_main._table(), "name", "dummy-table", raising=False)
+    monkeypatch.setattr(lambda_main._ddb(), "batch_get_item", batch_get_item, raising=False)
+    monkeypatch.setattr(lambda_main._ddb(), "meta", SimpleNamespace(client=SimpleNamespace(
+        transact_write_items=lambda TransactItems: updates.append(TransactItems[0]["Update"]["Key"]["SK"]))),
+        raising=False)
+    monkeypatch.setattr(lambda_main, "s3", _S3())
+    monkeypatch.setattr(lambda_main, "S3_DELETE_BATCH", 2)
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+    invalidations = []
+    monkeypatch.setattr(lambda_main, "DOWNLOAD_MODE", "cloudfront")
+    monkeypatch.setattr(lambda_main, "CLOUDFRONT_DISTRIBUTION_ID", "E123")
+    monkeypatch.setattr(lambda_main, "cloudfront", SimpleNamespace(create_invalidation=lambda **kw: invalidations.append(kw)))
+
+    resp = lambda_main.handler(_owner_event("DELETE", "/files", body={"fileIds": ["a", "b", "c", "x", "a"]}), None)
+    body = json.loads(resp["body"])
+
+    assert resp["statusCode"] == 200
+    assert [r["status"] for r in body["results"]] == [200, 500, 200, 403]
+    assert (body["deleted"], body["failed"]) == (2, 2)
+    assert [len(b) for b in batches] == [2, 1]
+    assert sorted(updates) == ["f#a", "f#c"]
+    # One invalidation for the objects actually removed; b's object is still there.
+    assert len(invalidations) == 1 and invalidations[0]["DistributionId"] == "E123"
+    assert invalidations[0]["InvalidationBatch"]["Paths"] == {"Quantity": 2, "Items": ["/files/owner-1/a", "/files/owner-1/c"]}
+
+
+def test_bulk_delete_rejects_bad_payload(lambda_main):
+    for body in ({}, {"fileIds": []}, {"fileIds": "a"}, {"fileIds": [1]}):
+        assert lambda_main.handler(_owner_event("DELETE", "/files", body=body), None)["statusCode"] == 400
+
+
+def test_post_files_batch_reports_per_entry(lambda_main, monkeypatch):
+    client = _use_transact_client(lambda_main, monkeypatch, _FakeTransactClient())
+    written = client.written
+    monkeypatch.setattr(lambda_main, "s3", _FakeS3())
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+    entries = [
+        {"originalFileName": "a.txt", "sizeBytes": 1},
+        {"originalFileName": "b.txt"},
+        "junk",
+        {"originalFileName": "big.bin", "sizeBytes": lambda_main.MULTIPART_THRESHOLD_BYTES + 1},
+    ]
+
+    resp = lambda_main.handler(_owner_event("POST", "/files", body=entries), None)
+    body = json.loads(resp["body"])
+
+    assert resp["statusCode"] == 200
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [f["status"] for f in body["files"]] == [200, 400, 400, 200]
+    assert body["files"][1]["message"] == "Missing sizeBytes"
+    assert [f["upload"]["method"] for f in body["files"] if f["status"] == 200] == ["PUT", "MULTIPART"]
+    assert [w["fileId"] for w in written] == [body["files"][0]["fileId"], body["files"][3]["fileId"]]
+    assert len(client.transactions) == 1
+    usage = client.transactions[0][-1]["Update"]
+    assert usage["Key"]["SK"] == "usage"
+    assert usage["ExpressionAttributeValues"][":n"] == 2
+
+
+def test_post_files_batch_limits(lambda_main, monkeypatch):
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+    monkeypatch.setattr(lambda_main, "BATCH_UPLOAD_MAX", 2)
+    too_many = [{"originalFileName": "a", "sizeBytes": 1}] * 3
+
+    assert lambda_main.handler(_owner_event("POST", "/files", body=[]), None)["statusCode"] == 400
+    assert lambda_main.handler(_owner_event("POST", "/files", body=too_many), None)["statusCode"] == 400
+
+
+def test_public_metadata_honors_if_none_match(lambda_main, monkeypatch):
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", "expiresAt": "2999-01-01T00:00:00Z"}
+    monkeypatch.setattr(lambda_main, "table", _RecordingTable([{"Items": [item]}], items=[item]))
+    event = {"httpMethod": "GET", "resource": "/public/files/{id}", "pathParameters": {"id": "f1"}}
+
+    first = lambda_main.handler(event, None)
+    etag = first["headers"]["ETag"]
+    again = lambda_main.handler({**event, "headers": {"if-none-match": f'"other", {etag}'}}, None)
+
+    assert first["statusCode"] == 200 and etag.startswith('W/"')
+    assert again["statusCode"] == 304
+    assert again["body"] == "" and again["headers"]["ETag"] == etag
+
+
+@pytest.mark.parametrize("expiry, status", [
+    ({"expiresAtEpoch": 1, "expiresAt": "2999-01-01T00:00:00Z"}, 410),  # the epoch attribute wins
+    ({"expiresAtEpoch": 32503680000}, 200),
+    ({"expiresAt": "2000-01-01T00:00:00Z"}, 410),                       # legacy record without it
+    ({"expiresAt": "not-a-date"}, 500),
+])
+def test_public_metadata_compares_epoch_expiry(lambda_main, monkeypatch, expiry, status):
+    item = {"PK": "u#o", "SK": "f#f1", "fileId": "f1", "status": "ready", **expiry}
+    monkeypatch.setattr(lambda_main, "table", _RecordingTable([{"Items": [item]}], items=[item]))
+    event = {"httpMethod": "GET", "resource": "/public/files/{id}", "pathParameters": {"id": "f1"}}
+
+    assert lambda_main.handler(event, None)["statusCode"] == status
+
+
+def test_listing_etag_changes_with_items(lambda_main, monkeypatch):
+    item = {"fileId": "f1", "status": "uploading"}
+    monkeypatch.setattr(lambda_main, "table", _RecordingTable([{"Items": [item]}, {"Items": [{**item, "status": "ready"}]}]))
+
+    first = lambda_main.handler(_user_event(), None)
+    changed = lambda_main.handler({**_user_event(), "headers": {"If-None-Match": first["headers"]["ETag"]}}, None)
+
+    assert changed["statusCode"] == 200
+    assert changed["headers"]["ETag"] != first["headers"]["ETag"]
+
+
+def _admin_event(query=None):
+    return {
+        "httpMethod": "GET",
+        "resource": "/admin/files",
+        "queryStringParameters": query,
+        "requestContext": {"authorizer": {"claims": {"sub": "admin-1", "cognito:groups": "Admins"}}},
+    }
+
+
+def test_admin_listing_pages_through_all_segments(lambda_main, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        ddb = boto3.session.Session(region_name="eu-central-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="admin-test",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as batch:
+            for n in range(30):
+                batch.put_item(Item={"PK": f"u#{n % 4}", "SK": f"f#{n}", "fileId": str(n), "sizeBytes": n,
+                                     "status": "ready" if n % 3 else "deleted"})
+                batch.put_item(Item={"PK": f"dc#{n}#0", "SK": "dc", "downloadCount": 1})
+        monkeypatch.setattr(lambda_main, "ddb", ddb)
+        monkeypatch.setattr(lambda_main, "table", table)
+        monkeypatch.setattr(lambda_main, "ADMIN_SCAN_SEGMENTS", 3)
+        monkeypatch.setattr(lambda_main, "ADMIN_SCAN_PAGE_ITEMS", 7)
+
+        seen, pages, query = [], 0, {"limit": "4", "status": "ready", "minSize": "2"}
+        while True:
+            resp = lambda_main.handler(_admin_event(query), None)
+            assert resp["statusCode"] == 200
+            body = json.loads(resp["body"])
+            assert len(body["items"]) <= 4
+            seen.extend(i["fileId"] for i in body["items"])
+            pages += 1
+            if not body["nextCursor"]:
+                break
+            query = {**query, "cursor": body["nextCursor"]}
+
+    assert sorted(seen, key=int) == [str(n) for n in range(2, 30) if n % 3]
+    assert pages > 1
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7])
+def test_admin_listing_pages_never_exceed_limit_on_dense_data(lambda_main, monkeypatch, limit):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        ddb = boto3.session.Session(region_name="eu-central-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="admin-dense",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as batch:
+            for n in range(25):
+                batch.put_item(Item={"PK": f"u#{n}", "SK": f"f#{n}", "fileId": str(n), "status": "ready"})
+        monkeypatch.setattr(lambda_main, "ddb", ddb)
+        monkeypatch.setattr(lambda_main, "table", table)
+        monkeypatch.setattr(lambda_main, "ADMIN_SCAN_SEGMENTS", 3)
+
+        seen, query = [], {"limit": str(limit)}
+        while True:
+            body = json.loads(lambda_main.handler(_admin_event(query), None)["body"])
+            assert len(body["items"]) <= limit
+            seen.extend(i["fileId"] for i in body["items"])
+            if not body["nextCursor"]:
+                break
+            query = {**query, "cursor": body["nextCursor"]}
+
+    assert sorted(seen, key=int) == [str(n) for n in range(25)]
+
+
+def test_admin_listing_requires_admin_and_valid_cursor(lambda_main):
+    assert lambda_main.handler({**_admin_event(), "requestContext": {}}, None)["statusCode"] == 403
+    forged = lambda_main._encode_token({"n": 99, "p": {}})
+    assert lambda_main.handler(_admin_event({"cursor": forged}), None)["statusCode"] == 400
+    assert lambda_main.handler(_admin_event({"minSize": "x"}), None)["statusCode"] == 400
+
+
+def test_usage_item_tracks_uploads_deletes_and_quota(lambda_main, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        ddb = boto3.session.Session(region_name="eu-central-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="usage-test",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setattr(lambda_main, "ddb", ddb)
+        monkeypatch.setattr(lambda_main, "table", table)
+        monkeypatch.setattr(lambda_main, "s3", _FakeS3())
+        monkeypatch.setattr(lambda_main, "USER_QUOTA_BYTES", 100)
+        monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+        def post(size):
+            return lambda_main.handler(_owner_event("POST", "/files", body={"originalFileName": "f", "sizeBytes": size}), None)
+
+        def usage():
+            return json.loads(lambda_main.handler({**_owner_event("GET", "/usage")}, None)["body"])
+
+        first = post(60)
+        assert first["statusCode"] == 200
+        assert post(50)["statusCode"] == 403
+        assert post(101)["statusCode"] == 403
+        assert (usage()["fileCount"], usage()["usedBytes"], usage()["quotaBytes"]) == (1, 60, 100)
+
+        monkeypatch.delenv("FILES_BUCKET")
+        file_id = json.loads(first["body"])["fileId"]
+        assert lambda_main.handler(_owner_event("DELETE", "/files/{id}", file_id=file_id), None)["statusCode"] == 200
+        assert lambda_main.handler(_owner_event("DELETE", "/files/{id}", file_id=file_id), None)["statusCode"] == 200
+        assert (usage()["fileCount"], usage()["usedBytes"]) == (0, 0)
+
+        monkeypatch.setenv("FILES_BUCKET", "bucket")
+        assert post(100)["statusCode"] == 200
+
+
+def test_deleted_sharded_file_is_not_served_from_a_stale_cache(lambda_main, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        ddb = boto3.session.Session(region_name="eu-central-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="stale-test",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setattr(lambda_main, "ddb", ddb)
+        monkeypatch.setattr(lambda_main, "table", table)
+        monkeypatch.setattr(lambda_main, "s3", _FakeS3())
+        monkeypatch.setattr(lambda_main, "_fold_download_shards", lambda *args: None)
+        monkeypatch.setenv("FILES_BUCKET", "bucket")
+        item = {"PK": "u#owner-1", "SK": "f#f1", "fileId": "f1", "ownerSub": "owner-1", "status": "ready",
+                "s3Key": "u/owner-1/f1", "downloadShards": 4}
+        table.put_item(Item=item)
+        download = {"httpMethod": "GET", "resource": "/files/{id}", "pathParameters": {"id": "f1"}}
+
+        lambda_main.file_cache.put("f1", dict(item))
+        assert lambda_main.handler(download, None)["statusCode"] == 302
+
+        monkeypatch.delenv("FILES_BUCKET")
+        assert lambda_main.handler(_owner_event("DELETE", "/files/{id}", file_id="f1"), None)["statusCode"] == 200
+
+        monkeypatch.setenv("FILES_BUCKET", "bucket")
+        lambda_main.file_cache.put("f1", dict(item))  # another warm container still holds the ready item
+        assert lambda_main.handler(download, None)["statusCode"] == 404
+        assert lambda_main.file_cache.get("f1") == (False, None)
+
+
+def test_normalize_sha256_accepts_hex_and_base64(lambda_main):
+    import base64
+    import hashlib
+
+    digest = hashlib.sha256(b"hello").digest()
+    b64 = base64.b64encode(digest).decode()
+    assert lambda_main._normalize_sha256(digest.hex()) == b64
+    assert lambda_main._normalize_sha256(b64) == b64
+    for bad in ("abc", "z" * 64, base64.b64encode(b"short").decode(), 42):
+        assert lambda_main._normalize_sha256(bad) is None
+
+
+class _DedupClient(_FakeTransactClient):
+    def __init__(self, existing):
+        super().__init__()
+        self.existing = existing
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return {"Items": self.existing}
+
+
+def test_post_files_skips_upload_for_known_checksum(lambda_main, monkeypatch):
+    sha = "ab" * 32
+    existing = [{"fileId": "old", "status": "ready", "expiresAt": "2999-01-01T00:00:00Z", "originalFileName": "a.bin"}]
+    client = _use_transact_client(lambda_main, monkeypatch, _DedupClient(existing))
+    monkeypatch.setattr(lambda_main, "s3", _FakeS3())
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    body = json.loads(lambda_main.handler(
+        _owner_event("POST", "/files", body={"originalFileName": "a.bin", "sizeBytes": 5, "sha256": sha}), None)["body"])
+
+    assert body["alreadyPresent"] is True and body["fileId"] == "old"
+    assert body["upload"] == {"method": "NONE"}
+    assert client.written == []
+    assert client.queries[0]["IndexName"] == "GSI3"
+    assert client.queries[0]["ExpressionAttributeValues"][":k"].startswith("owner-1#")
+
+
+def test_post_files_signs_checksum_into_put(lambda_main, monkeypatch):
+    signed = []
+    client = _use_transact_client(lambda_main, monkeypatch, _DedupClient([{"fileId": "gone", "status": "deleted"}]))
+    monkeypatch.setattr(lambda_main._s3(), "generate_presigned_url", lambda **kw: signed.append(kw) or "https://put")
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    resp = lambda_main.handler(
+        _owner_event("POST", "/files", body={"originalFileName": "a.bin", "sizeBytes": 5, "sha256": "ab" * 32}), None)
+    upload = json.loads(resp["body"])["upload"]
+
+    checksum = lambda_main._normalize_sha256("ab" * 32)
+    assert signed[0]["Params"]["ChecksumSHA256"] == checksum
+    assert upload["headers"]["x-amz-checksum-sha256"] == checksum
+    assert client.written[0]["contentKey"] == f"owner-1#{checksum}#5"
+    assert client.written[0]["expiresAtEpoch"] > 0
+
+
+class _ExportS3(_FakeS3):
+    """_FakeS3 that keeps what an export writes (single PUT or parts)."""
+    def __init__(self):
+        super().__init__()
+        self.put = None
+        self.parts = []
+
+    def put_object(self, **kwargs):
+        self.put = kwargs
+
+    def upload_part(self, **kwargs):
+        self.parts.append(kwargs)
+        return {"ETag": f"e{kwargs['PartNumber']}"}
+
+
+def _file_row(i):
+    return {"fileId": f"id-{i}", "originalFileName": f"f{i}, \"q\".txt", "sizeBytes": i, "status": "ready"}
+
+
+def test_export_streams_pages_into_multipart_ndjson(lambda_main, monkeypatch):
+    table = _RecordingTable([
+        {"Items": [_file_row(i) for i in range(3)], "LastEvaluatedKey": {"PK": "u#owner-1", "SK": "f#id-2"}},
+        {"Items": [_file_row(i) for i in range(3, 5)]},
+    ])
+    updates = []
+    table.update_item = lambda **kwargs: updates.append(kwargs)
+    fake_s3 = _ExportS3()
+    monkeypatch.setattr(lambda_main, "table", table)
+    monkeypatch.setattr(lambda_main, "s3", fake_s3)
+    monkeypatch.setattr(lambda_main, "EXPORT_PART_BYTES", 200)
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    result = lambda_main.export_handler({"ownerId": "owner-1", "exportId": "x1", "format": "ndjson"}, None)
+
+    assert result == {"exportId": "x1", "status": "ready"}
+    assert table.calls[1]["ExclusiveStartKey"] == {"PK": "u#owner-1", "SK": "f#id-2"}
+    assert fake_s3.put is None and len(fake_s3.parts) > 1
+    assert fake_s3.completed["MultipartUpload"]["Parts"] == [
+        {"PartNumber": p["PartNumber"], "ETag": f"e{p['PartNumber']}"} for p in fake_s3.parts]
+    data = b"".join(p["Body"] for p in fake_s3.parts)
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert [r["fileId"] for r in rows] == [f"id-{i}" for i in range(5)]
+    assert fake_s3.completed["Key"] == "exports/owner-1/x1.ndjson"
+
+    assert updates[0]["Key"] == {"PK": "u#owner-1", "SK": "x#x1"}
+    recorded = {updates[0]["ExpressionAttributeNames"][f"#a{i}"]: v
+                for i, v in enumerate(updates[0]["ExpressionAttributeValues"].values())}
+    assert recorded["status"] == "ready" and recorded["files"] == 5 and recorded["sizeBytes"] == len(data)
+
+
+def test_export_small_csv_is_one_put(lambda_main, monkeypatch):
+    import csv
+    table = _RecordingTable([{"Items": [_file_row(1), _file_row(2)]}])
+    table.update_item = lambda **kwargs: None
+    monkeypatch.setattr(lambda_main, "table", table)
+    fake_s3 = _ExportS3()
+    monkeypatch.setattr(lambda_main, "s3", fake_s3)
+    monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+    assert lambda_main.export_handler({"ownerId": "owner-1", "exportId": "x1", "format": "csv"}, None)["status"] == "ready"
+    assert fake_s3.put["ContentType"] == "text/csv" and fake_s3.completed is None
+    rows = list(csv.DictReader(fake_s3.put["Body"].decode().splitlines()))
+    assert [r["originalFileName"] for r in rows] == ['f1, "q".txt', 'f2, "q".txt']
+    assert rows[0]["downloadedAt"] == ""
+
+    bad = lambda_main.handler(_owner_event("POST", "/files/export") | {"queryStringParameters": {"format": "xml"}}, None)
+    assert bad["statusCode"] == 400
+
+
+def test_export_is_started_async_and_polled(lambda_main, monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        ddb = boto3.session.Session(region_name="eu-central-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="export-test",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        table.put_item(Item={"PK": "u#owner-1", "SK": "f#id-1", **_file_row(1)})
+        invokes = []
+        monkeypatch.setattr(lambda_main, "ddb", ddb)
+        monkeypatch.setattr(lambda_main, "table", table)
+        monkeypatch.setattr(lambda_main, "s3", _ExportS3())
+        monkeypatch.setattr(lambda_main, "lambda_client", SimpleNamespace(invoke=lambda **kw: invokes.append(kw)))
+        monkeypatch.setenv("EXPORT_FUNCTION_NAME", "stack-ExportFilesFunction")
+        monkeypatch.setenv("FILES_BUCKET", "bucket")
+
+        def status(export_id, sub="owner-1"):
+            resp = lambda_main.handler(_owner_event("GET", "/files/export/{id}", export_id, sub=sub), None)
+            return resp["statusCode"], json.loads(resp["body"])
+
+        started = lambda_main.handler(_owner_event("POST", "/files/export"), None)
+        export_id = json.loads(started["body"])["exportId"]
+        assert started["statusCode"] == 202
+        assert invokes[0]["FunctionName"] == "stack-ExportFilesFunction" and invokes[0]["InvocationType"] == "Event"
+        assert status(export_id)[1]["status"] == "pending"
+        assert status(export_id, sub="owner-2")[0] == 404
+        listing = json.loads(lambda_main.handler(_owner_event("GET", "/files"), None)["body"])
+        assert [f["fileId"] for f in listing["items"]] == ["id-1"]  # export records stay out of listings
+
+        lambda_main.export_handler(json.loads(invokes[0]["Payload"]), None)
+        code, body = status(export_id)
+        assert code == 200 and body["status"] == "ready" and body["files"] == 1
+        assert body["url"].startswith(f"https://s3/get_object/exports/owner-1/{export_id}.ndjson")
+
+        monkeypatch.setattr(lambda_main, "EXPORT_STALE_SECONDS", -1)
+        stuck = json.loads(lambda_main.handler(_owner_event("POST", "/files/export"), None)["body"])["exportId"]
+        assert status(stuck)[1]["status"] == "failed"
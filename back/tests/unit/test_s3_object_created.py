@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+def _record(key, sequencer="0A"):
+    return {"s3": {"bucket": {"name": "b"}, "object": {"key": key, "sequencer": sequencer}}}
+
+
+def test_parse_object_key(s3_created_main):
+    assert s3_created_main._parse_object_key("files/abc") == (None, "abc")
+    assert s3_created_main._parse_object_key("files/owner/abc") == ("owner", "abc")
+    assert s3_created_main._parse_object_key("other/abc") is None
+    assert s3_created_main._parse_object_key("files/a/b/c") is None
+    assert s3_created_main._parse_object_key("files/") is None
+    assert s3_created_main._parse_object_key("files//abc") is None
+
+
+def test_handler_dedupes_and_reports_success(s3_created_main, monkeypatch):
+    seen = []
+    lock = threading.Lock()
+
+    def mark_ready(file_id, owner_id=None, key=None, size=0, etag=None):
+        with lock:
+            seen.append(file_id)
+
+    monkeypatch.setattr(s3_created_main, "_mark_ready", mark_ready)
+    event = {"Records": [_record("files/o/a"), _record("files/o/a", "0B"), _record("files/b"), _record("nope/c")]}
+
+    report = s3_created_main.handler(event, None)
+
+    assert sorted(seen) == ["a", "b"]
+    assert report["ok"] is True
+    assert report["received"] == 4
+    assert report["processed"] == 3
+    assert report["skipped"] == 1
+    assert report["batchItemFailures"] == []
+
+
+def test_handler_reports_failed_records_and_raises(s3_created_main, monkeypatch):
+    def mark_ready(file_id, owner_id=None, key=None, size=0, etag=None):
+        if file_id == "bad":
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem")
+
+    monkeypatch.setattr(s3_created_main, "_mark_ready", mark_ready)
+
+    report = s3_created_main._process_records([_record("files/good"), _record("files/bad", "07")])
+    assert report["ok"] is False
+    assert [f["itemIdentifier"] for f in report["batchItemFailures"]] == ["files/bad@07"]
+
+    with pytest.raises(s3_created_main.RecordProcessingError):
+        s3_created_main.handler({"Records": [_record("files/bad")]}, None)
+
+
+def test_mark_ready_skips_when_not_uploading(s3_created_main, monkeypatch):
+    client = s3_created_main._ddb_client()
+    monkeypatch.setattr(client, "query", lambda **kw: {"Items": [{"PK": {"S": "u#o"}, "SK": {"S": "f#x"}}]}, raising=False)
+
+    def update_item(**kwargs):
+        raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+
+    monkeypatch.setattr(client, "update_item", update_item, raising=False)
+    s3_created_main._mark_ready("x")  # does not raise
+
+
+def test_owner_scoped_key_updates_by_primary_key_without_query(s3_created_main, monkeypatch):
+    client = s3_created_main._ddb_client()
+    updates = []
+
+    def query(**kwargs):
+        raise AssertionError("the fileId index must not be queried for owner-scoped keys")
+
+    monkeypatch.setattr(client, "query", query, raising=False)
+    monkeypatch.setattr(client, "transact_write_items", lambda TransactItems: updates.append(TransactItems),
+                        raising=False)
+    record = _record("files/owner-1/f1")
+    record["s3"]["object"]["size"] = 42
+
+    report = s3_created_main.handler({"Records": [record]}, None)
+
+    assert report["ok"] is True
+    file_update, usage_update = (entry["Update"] for entry in updates[0])
+    assert file_update["Key"] == {"PK": {"S": "u#owner-1"}, "SK": {"S": "f#f1"}}
+    assert file_update["ExpressionAttributeValues"][":key"] == {"S": "files/owner-1/f1"}
+    assert usage_update["Key"] == {"PK": {"S": "u#owner-1"}, "SK": {"S": "usage"}}
+    assert usage_update["ExpressionAttributeValues"][":size"] == {"N": "42"}
+
+
+def test_untracked_upload_is_marked_ready_without_usage(s3_created_main, monkeypatch):
+    client = s3_created_main._ddb_client()
+    updates = []
+    old = {"PK": {"S": "u#o"}, "SK": {"S": "f#f1"}, "status": {"S": "uploading"}, "s3Key": {"S": "files/o/f1"},
+           "sizeBytes": {"N": "5"}}
+
+    def transact_write_items(TransactItems):  # noqa: N803 (boto3 naming)
+        raise ClientError({"Error": {"Code": "TransactionCanceledException"},
+                           "CancellationReasons": [{"Code": "ConditionalCheckFailed", "Item": old}, {"Code": "None"}]},
+                          "TransactWriteItems")
+
+    monkeypatch.setattr(client, "transact_write_items", transact_write_items, raising=False)
+    monkeypatch.setattr(client, "update_item", lambda **kw: updates.append(kw), raising=False)
+
+    s3_created_main._mark_ready("f1", "o", "files/o/f1", 5)
+
+    assert len(updates) == 1
+    assert "usageTracked" not in updates[0]["ConditionExpression"]
+
+
+def test_size_mismatch_rejects_and_releases_usage(s3_created_main, monkeypatch):
+    client = s3_created_main._ddb_client()
+    calls = []
+    old = {"PK": {"S": "u#o"}, "SK": {"S": "f#f1"}, "status": {"S": "uploading"}, "s3Key": {"S": "files/o/f1"},
+           "sizeBytes": {"N": "100"}, "usageTracked": {"BOOL": True}}
+
+    def transact_write_items(TransactItems):  # noqa: N803 (boto3 naming)
+        calls.append(TransactItems)
+        if len(calls) == 1:
+            raise ClientError({"Error": {"Code": "TransactionCanceledException"},
+                               "CancellationReasons": [{"Code": "ConditionalCheckFailed", "Item": old}, {"Code": "None"}]},
+                              "TransactWriteItems")
+
+    monkeypatch.setattr(client, "transact_write_items", transact_write_items, raising=False)
+    monkeypatch.setattr(s3_created_main, "FILES_BUCKET", None)
+
+    s3_created_main._mark_ready("f1", "o", "files/o/f1", 60, '"abc"')
+
+    file_update, usage_update = (entry["Update"] for entry in calls[1])
+    values = file_update["ExpressionAttributeValues"]
+    assert values[":rejected"] == {"S": "rejected"}
+    assert values[":size"] == {"N": "60"} and values[":etag"] == {"S": '"abc"'}
+    assert usage_update["ExpressionAttributeValues"][":b"] == {"N": "-100"}
+
+
+@pytest.mark.parametrize("head, expected", [
+    (b"\x89PNG\r\n\x1a\n....", "image/png"),
+    (b"%PDF-1.7", "application/pdf"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8", "image/webp"),
+    ("plain text ž".encode(), "text/plain"),
+    (b"\x00\x01\x02", None),
+])
+def test_sniff_content_type_uses_one_ranged_get(s3_created_main, monkeypatch, head, expected):
+    from io import BytesIO
+
+    gets = []
+
+    class _S3:
+        def get_object(self, **kwargs):
+            gets.append(kwargs)
+            return {"Body": BytesIO(head)}
+
+    monkeypatch.setattr(s3_created_main, "s3_client", _S3())
+    monkeypatch.setattr(s3_created_main, "FILES_BUCKET", "bucket")
+
+    assert s3_created_main._sniff_content_type("files/o/f1") == expected
+    assert len(gets) == 1
+    assert gets[0]["Range"] == f"bytes=0-{s3_created_main.SNIFF_BYTES - 1}"
+
+
+def _sqs_event():
+    with open(os.path.join(os.getcwd(), "events", "s3_object_created_sqs.json")) as f:
+        return json.load(f)
+
+
+def test_queue_batch_dedupes_across_messages(s3_created_main, monkeypatch):
+    seen = []
+    lock = threading.Lock()
+
+    def mark_ready(file_id, owner_id=None, key=None, size=0, etag=None):
+        with lock:
+            seen.append((owner_id, file_id, size))
+
+    monkeypatch.setattr(s3_created_main, "_mark_ready", mark_ready)
+
+    result = s3_created_main.handler(_sqs_event(), None)
+
+    # msg-1 and msg-2 carry the same object; msg-4 is the S3 test event.
+    assert sorted(seen) == [
+        ("owner-1", "11111111-1111-4111-8111-111111111111", 1024),
+        ("owner-1", "22222222-2222-4222-8222-222222222222", 2048),
+    ]
+    assert result == {"batchItemFailures": []}
+
+
+def test_queue_batch_reports_failed_and_malformed_messages(s3_created_main, monkeypatch):
+    def mark_ready(file_id, owner_id=None, key=None, size=0, etag=None):
+        if file_id.startswith("1111"):
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "TransactWriteItems")
+
+    monkeypatch.setattr(s3_created_main, "_mark_ready", mark_ready)
+    event = _sqs_event()
+    event["Records"].append(dict(event["Records"][0], messageId="msg-5", body="not json"))
+
+    result = s3_created_main.handler(event, None)
+
+    assert sorted(f["itemIdentifier"] for f in result["batchItemFailures"]) == ["msg-1", "msg-2", "msg-5"]
@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class _Paginator:
+    def __init__(self, pages_by_shard):
+        self.pages_by_shard = pages_by_shard
+        self.queries = []
+
+    def paginate(self, **kwargs):
+        self.queries.append(kwargs)
+        shard = kwargs["ExpressionAttributeValues"][":shard"]["S"]
+        return [{"Items": self.pages_by_shard.get(shard, [])}]
+
+
+class _FakeDdb:
+    def __init__(self, pages_by_shard, moved_on=()):
+        self.paginator = _Paginator(pages_by_shard)
+        self.moved_on = set(moved_on)
+        self.deleted = []
+
+    def get_paginator(self, name):
+        assert name == "query"
+        return self.paginator
+
+    def delete_item(self, **kwargs):
+        sk = kwargs["Key"]["SK"]["S"]
+        if sk in self.moved_on:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "DeleteItem")
+        self.deleted.append(sk)
+
+    def transact_write_items(self, TransactItems):  # noqa: N803 (boto3 naming)
+        delete, usage = TransactItems
+        self.delete_item(**delete["Delete"])
+        self.released = getattr(self, "released", []) + [usage["Update"]["ExpressionAttributeValues"][":b"]["N"]]
+
+
+class _FakeS3:
+    def __init__(self):
+        self.delete_batches = []
+        self.aborted = []
+
+    def delete_objects(self, Bucket, Delete):  # noqa: N803 (boto3 naming)
+        self.delete_batches.append([o["Key"] for o in Delete["Objects"]])
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted.append(kwargs["UploadId"])
+
+
+def _raw(file_id, created_at, upload_id=None):
+    item = {
+        "PK": {"S": "u#o"},
+        "SK": {"S": f"f#{file_id}"},
+        "fileId": {"S": file_id},
+        "s3Key": {"S": f"files/o/{file_id}"},
+        "createdAt": {"S": created_at},
+    }
+    if upload_id:
+        item["uploadId"] = {"S": upload_id}
+    return item
+
+
+def test_reap_deletes_stale_records_and_objects(upload_reaper_main, monkeypatch):
+    ddb = _FakeDdb({
+        "up#0": [_raw("old", "2025-06-01T09:00:00Z"), _raw("raced", "2025-06-01T09:00:00Z")],
+        "up#3": [
+            _raw("mp-young", "2025-06-01T09:00:00Z", upload_id="u1"),  # multipart gets 24h
+            _raw("mp-old", "2025-05-30T09:00:00Z", upload_id="u2"),
+        ],
+    }, moved_on={"f#raced"})
+    s3 = _FakeS3()
+    monkeypatch.setattr(upload_reaper_main, "ddb_client", ddb)
+    monkeypatch.setattr(upload_reaper_main, "s3_client", s3)
+
+    report = upload_reaper_main.reap(NOW)
+
+    assert len(ddb.paginator.queries) == upload_reaper_main.PENDING_INDEX_SHARDS
+    assert all(q["IndexName"] == "GSI2" for q in ddb.paginator.queries)
+    assert sorted(ddb.deleted) == ["f#mp-old", "f#old"]
+    assert s3.aborted == ["u2"]
+    assert [sorted(b) for b in s3.delete_batches] == [["files/o/mp-old", "files/o/old"]]
+    assert report["stale"] == 3
+    assert report["reaped"] == 2
+    assert report["objectsDeleted"] == 2
+    assert report["errors"] == []
+
+
+def test_delete_objects_chunks_by_1000(upload_reaper_main, monkeypatch):
+    s3 = _FakeS3()
+    monkeypatch.setattr(upload_reaper_main, "s3_client", s3)
+
+    upload_reaper_main._delete_objects([f"files/o/{i}" for i in range(2500)])
+
+    assert [len(b) for b in s3.delete_batches] == [1000, 1000, 500]
+
+
+def test_delete_objects_failure_logs_keys_and_continues(upload_reaper_main, monkeypatch, caplog):
+    s3 = _FakeS3()
+    calls = []
+    real_delete = s3.delete_objects
+
+    def delete_objects(Bucket, Delete):  # noqa: N803 (boto3 naming)
+        calls.append(Delete)
+        if len(calls) == 1:
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "DeleteObjects")
+        return real_delete(Bucket, Delete)
+
+    monkeypatch.setattr(s3, "delete_objects", delete_objects)
+    monkeypatch.setattr(upload_reaper_main, "s3_client", s3)
+
+    errors = upload_reaper_main._delete_objects([f"files/o/{i}" for i in range(1500)])
+
+    assert [e["key"] for e in errors] == [f"files/o/{i}" for i in range(1000)]
+    assert [len(b) for b in s3.delete_batches] == [500]
+    assert "ORPHANED_OBJECTS" in caplog.text and "files/o/999" in caplog.text
+
+
+def test_reap_releases_tracked_usage(upload_reaper_main, monkeypatch):
+    raw = _raw("tracked", "2025-06-01T09:00:00Z")
+    raw.update({"sizeBytes": {"N": "70"}, "usageTracked": {"BOOL": True}})
+    ddb = _FakeDdb({"up#1": [raw]})
+    monkeypatch.setattr(upload_reaper_main, "ddb_client", ddb)
+    monkeypatch.setattr(upload_reaper_main, "s3_client", _FakeS3())
+
+    report = upload_reaper_main.reap(NOW)
+
+    assert report["reaped"] == 1
+    assert ddb.deleted == ["f#tracked"]
+    assert ddb.released == ["-70"]
@@ -3,6 +3,7 @@ import type { FileRow } from '../components/files/FilesTable';
 
 export type ListFilesResponse = {
     items: FileRow[];
+    nextCursor?: string | null;
 };
 
 export type InitUploadRequest = {
@@ -10,19 +11,141 @@ export type InitUploadRequest = {
     contentType: string;
     sizeBytes: number;
     expiresInDays?: number;
+    // base64 SHA-256 of the content: enables deduplication and S3 integrity checks
+    sha256?: string;
+};
+
+export type PresignedPart = {
+    partNumber: number;
+    url: string;
 };
 
 export type InitUploadResponse = {
     fileId: string;
-    upload: {
-        method: 'PUT';
-        url: string;
-        headers?: Record<string, string>;
-    };
+    // The owner already has a file with identical content; nothing to upload.
+    alreadyPresent?: boolean;
+    upload:
+        | {
+              method: 'NONE';
+          }
+        | {
+              method: 'PUT';
+              url: string;
+              headers?: Record<string, string>;
+          }
+        | {
+              method: 'MULTIPART';
+              partSizeBytes: number;
+              partCount: number;
+              parts: PresignedPart[];
+          };
+};
+
+export type InitUploadBatchEntry =
+    | ({ index: number; status: 200; originalFileName: string } & InitUploadResponse)
+    | { index: number; status: number; message: string; error?: string };
+
+export type InitUploadBatchResponse = {
+    created: number;
+    failed: number;
+    files: InitUploadBatchEntry[];
 };
 
-export async function listFiles(idToken: string): Promise<ListFilesResponse> {
-    return apiFetch<ListFilesResponse>('/files', { method: 'GET', token: idToken });
+export type MultipartPartsResponse = {
+    fileId: string;
+    partSizeBytes: number;
+    partCount: number;
+    parts: PresignedPart[];
+    uploadedParts?: { partNumber: number; etag: string }[];
+};
+
+export async function listFiles(idToken: string, cursor?: string | null): Promise<ListFilesResponse> {
+    const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    return apiFetch<ListFilesResponse>(`/files${qs}`, { method: 'GET', token: idToken });
+}
+
+export async function listAllFiles(idToken: string): Promise<FileRow[]> {
+    const all: FileRow[] = [];
+    let cursor: string | null | undefined = undefined;
+    do {
+        const page: ListFilesResponse = await listFiles(idToken, cursor);
+        all.push(...(page.items ?? []));
+        cursor = page.nextCursor;
+    } while (cursor);
+    return all;
+}
+
+export type UsageResponse = {
+    fileCount: number;
+    usedBytes: number;
+    readyCount: number;
+    readyBytes: number;
+    quotaBytes: number | null;
+    quotaFiles: number | null;
+};
+
+export async function getUsage(idToken: string): Promise<UsageResponse> {
+    return apiFetch<UsageResponse>('/usage', { method: 'GET', token: idToken });
+}
+
+export type ExportFormat = 'ndjson' | 'csv';
+
+export type ExportStatus = 'pending' | 'ready' | 'failed';
+
+export type ExportFilesResponse = {
+    exportId: string;
+    status: ExportStatus;
+    format: ExportFormat;
+};
+
+export type ExportStatusResponse = {
+    exportId: string;
+    status: ExportStatus;
+    format: ExportFormat;
+    createdAt: string;
+    completedAt?: string | null;
+    // Set once status is 'ready'.
+    url?: string;
+    files?: number;
+    sizeBytes?: number;
+    expiresIn?: number;
+};
+
+// Starts an export; poll getExportStatus with the returned exportId until it is ready or failed.
+export async function exportFiles(idToken: string, format: ExportFormat = 'ndjson'): Promise<ExportFilesResponse> {
+    return apiFetch<ExportFilesResponse>(`/files/export?format=${format}`, { method: 'POST', token: idToken });
+}
+
+export async function getExportStatus(idToken: string, exportId: string): Promise<ExportStatusResponse> {
+    return apiFetch<ExportStatusResponse>(`/files/export/${encodeURIComponent(exportId)}`, { method: 'GET', token: idToken });
+}
+
+export type AdminFileRow = Omit<FileRow, 'downloadCount' | 'downloadedAt'> & {
+    ownerId?: string;
+    email?: string;
+};
+
+export type AdminListFilesQuery = {
+    status?: string[];
+    minSize?: number;
+    maxSize?: number;
+    limit?: number;
+    cursor?: string | null;
+};
+
+// Admins only. Pages may come back short (the scan is time-boxed); follow nextCursor.
+export async function adminListFiles(
+    idToken: string,
+    query: AdminListFilesQuery = {}
+): Promise<{ items: AdminFileRow[]; nextCursor?: string | null }> {
+    const qs = new URLSearchParams();
+    if (query.status?.length) qs.set('status', query.status.join(','));
+    if (query.minSize !== undefined) qs.set('minSize', String(query.minSize));
+    if (query.maxSize !== undefined) qs.set('maxSize', String(query.maxSize));
+    if (query.limit !== undefined) qs.set('limit', String(query.limit));
+    if (query.cursor) qs.set('cursor', query.cursor);
+    const suffix = qs.toString() ? `?${qs}` : '';
+    return apiFetch(`/admin/files${suffix}`, { method: 'GET', token: idToken });
 }
 
 export async function deleteFile(idToken: string, fileId: string): Promise<unknown> {
@@ -32,6 +155,27 @@ export async function deleteFile(idToken: string, fileId: string): Promise<unkno
     });
 }
 
+export type BulkDeleteResult = {
+    fileId: string;
+    status: number;
+    message: string;
+    error?: string;
+};
+
+export type BulkDeleteResponse = {
+    deleted: number;
+    failed: number;
+    results: BulkDeleteResult[];
+};
+
+export async function deleteFiles(idToken: string, fileIds: string[]): Promise<BulkDeleteResponse> {
+    return apiFetch<BulkDeleteResponse>('/files', {
+        method: 'DELETE',
+        token: idToken,
+        body: { fileIds },
+    });
+}
+
 export async function initUpload(
     idToken: string,
     req: InitUploadRequest
@@ -43,15 +187,49 @@ export async function initUpload(
     });
 }
 
+// Files above this size go multipart, where S3 does not verify a whole-object SHA-256,
+// so hashing them would not enable deduplication.
+export const CHECKSUM_MAX_BYTES = 100 * 1024 * 1024;
+
+export async function sha256Base64(file: Blob): Promise<string> {
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', await file.arrayBuffer()));
+    let binary = '';
+    digest.forEach(b => (binary += String.fromCharCode(b)));
+    return btoa(binary);
+}
+
+// Initializes many uploads with as few requests as possible (the API accepts up to 1000
+// files per call). Results come back in input order; `index` refers to the input array.
+export async function initUploads(
+    idToken: string,
+    reqs: InitUploadRequest[],
+    chunkSize = 500
+): Promise<InitUploadBatchResponse> {
+    const merged: InitUploadBatchResponse = { created: 0, failed: 0, files: [] };
+    for (let offset = 0; offset < reqs.length; offset += chunkSize) {
+        const res = await apiFetch<InitUploadBatchResponse>('/files', {
+            method: 'POST',
+            token: idToken,
+            body: reqs.slice(offset, offset + chunkSize),
+        });
+        merged.created += res.created;
+        merged.failed += res.failed;
+        merged.files.push(...res.files.map(entry => ({ ...entry, index: entry.index + offset })));
+    }
+    return merged;
+}
+
 export async function putObjectToPresignedUrl(
     url: string,
     file: File,
-    headers?: Record<string, string>
+    headers?: Record<string, string>,
+    signal?: AbortSignal
 ): Promise<void> {
     const resp = await fetch(url, {
         method: 'PUT',
         headers,
         body: file,
+        signal,
     });
 
     if (!resp.ok) {
@@ -59,6 +237,153 @@ export async function putObjectToPresignedUrl(
     }
 }
 
+export async function getMultipartParts(
+    idToken: string,
+    fileId: string,
+    partNumbers?: number[]
+): Promise<MultipartPartsResponse> {
+    return apiFetch<MultipartPartsResponse>(`/files/${encodeURIComponent(fileId)}/parts`, {
+        method: 'POST',
+        token: idToken,
+        body: partNumbers ? { partNumbers } : {},
+    });
+}
+
+export async function completeMultipartUpload(
+    idToken: string,
+    fileId: string,
+    parts: { partNumber: number; etag: string }[]
+): Promise<unknown> {
+    return apiFetch<unknown>(`/files/${encodeURIComponent(fileId)}/complete`, {
+        method: 'POST',
+        token: idToken,
+        body: { parts },
+    });
+}
+
+export async function abortMultipartUpload(idToken: string, fileId: string): Promise<unknown> {
+    return apiFetch<unknown>(`/files/${encodeURIComponent(fileId)}/abort`, {
+        method: 'POST',
+        token: idToken,
+    });
+}
+
+// PUT attempts per part (with backoff) before the part is left to the resume pass.
+const PART_ATTEMPTS = 3;
+// Resume passes before the multipart upload is given up and aborted.
+const RESUME_ROUNDS = 3;
+
+const sleep = (ms: number) => new Promise<void>(resolve => setTimeout(resolve, ms));
+
+// Uploads parts concurrently; fetches more presigned URLs from the API as batches run out.
+// The part ETag must be exposed by the bucket CORS config (it is).
+//
+// Failures do not throw the upload away:
+//  1. a failed part PUT is retried PART_ATTEMPTS times; after a 403 (typically an expired
+//     signature) the part gets a fresh URL;
+//  2. parts that still fail are left for a resume pass: POST /files/{id}/parts without
+//     partNumbers returns the parts S3 already has (taken as authoritative, which also covers
+//     PUTs whose response was lost) and re-signs the missing ones, which are uploaded again;
+//  3. after RESUME_ROUNDS passes with parts still missing, or when `signal` is aborted (an
+//     explicit cancel), the multipart upload is aborted so its parts stop being billed.
+export async function uploadMultipart(
+    idToken: string,
+    fileId: string,
+    file: File,
+    partSizeBytes: number,
+    partCount: number,
+    firstParts: PresignedPart[],
+    concurrency = 4,
+    signal?: AbortSignal
+): Promise<void> {
+    const urls = new Map<number, string>(firstParts.map(p => [p.partNumber, p.url]));
+    const etags = new Map<number, string>();
+    const allParts = Array.from({ length: partCount }, (_, i) => i + 1);
+
+    async function urlFor(partNumber: number): Promise<string> {
+        let url = urls.get(partNumber);
+        if (!url) {
+            const wanted: number[] = [];
+            for (let n = partNumber; n <= partCount && wanted.length < 20; n++) {
+                if (!urls.has(n)) wanted.push(n);
+            }
+            const batch = await getMultipartParts(idToken, fileId, wanted);
+            batch.parts.forEach(p => urls.set(p.partNumber, p.url));
+            url = urls.get(partNumber);
+        }
+        if (!url) throw new Error(`No upload URL for part ${partNumber}`);
+        return url;
+    }
+
+    async function putPart(partNumber: number): Promise<void> {
+        const start = (partNumber - 1) * partSizeBytes;
+        const blob = file.slice(start, Math.min(start + partSizeBytes, file.size));
+        for (let attempt = 1; ; attempt++) {
+            signal?.throwIfAborted();
+            let failure = 'network error';
+            try {
+                const resp = await fetch(await urlFor(partNumber), { method: 'PUT', body: blob, signal });
+                if (resp.ok) {
+                    etags.set(partNumber, resp.headers.get('ETag') ?? '');
+                    return;
+                }
+                failure = String(resp.status);
+                if (resp.status === 403) urls.delete(partNumber);
+            } catch (e) {
+                if (signal?.aborted) throw e;
+                if (e instanceof Error) failure = e.message;
+            }
+            if (attempt >= PART_ATTEMPTS) {
+                throw new Error(`S3 part ${partNumber} upload failed (${failure})`);
+            }
+            await sleep(500 * 2 ** (attempt - 1));
+        }
+    }
+
+    // Uploads the given parts; parts that exhaust their retries are left missing.
+    async function uploadParts(partNumbers: number[]): Promise<void> {
+        let next = 0;
+        async function worker(): Promise<void> {
+            while (next < partNumbers.length) {
+                const partNumber = partNumbers[next++];
+                try {
+                    await putPart(partNumber);
+                } catch (e) {
+                    if (signal?.aborted) throw e;
+                }
+            }
+        }
+        await Promise.all(Array.from({ length: Math.min(concurrency, partNumbers.length) }, () => worker()));
+    }
+
+    try {
+        await uploadParts(allParts);
+        for (let round = 1; etags.size < partCount; round++) {
+            if (round > RESUME_ROUNDS) {
+                throw new Error(`Upload failed: ${partCount - etags.size} of ${partCount} parts could not be uploaded`);
+            }
+            try {
+                const state = await getMultipartParts(idToken, fileId);
+                state.uploadedParts?.forEach(p => etags.set(p.partNumber, p.etag));
+                state.parts.forEach(p => urls.set(p.partNumber, p.url));
+            } catch (e) {
+                if (signal?.aborted) throw e;
+                await sleep(1000 * round);
+                continue;
+            }
+            await uploadParts(allParts.filter(n => !etags.has(n)));
+        }
+    } catch (e) {
+        await abortMultipartUpload(idToken, fileId).catch(() => undefined);
+        throw e;
+    }
+
+    const parts = Array.from(etags.entries())
+        .sort(([a], [b]) => a - b)
+        .map(([partNumber, etag]) => ({ partNumber, etag }));
+    await completeMultipartUpload(idToken, fileId, parts);
+}
+
 export type PublicFileMeta = {
     fileId: string;
     originalFileName?: string;
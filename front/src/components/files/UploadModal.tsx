@@ -1,28 +1,45 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useAuth } from 'react-oidc-context';
 import Modal from '../modals/Modal';
-import { initUpload, putObjectToPresignedUrl } from '../../api/files';
+import {
+    abortMultipartUpload,
+    CHECKSUM_MAX_BYTES,
+    deleteFile,
+    initUploads,
+    putObjectToPresignedUrl,
+    sha256Base64,
+    uploadMultipart,
+} from '../../api/files';
+import type { InitUploadResponse } from '../../api/files';
 
 type Props = {
     open: boolean;
     onClose: () => void;
-    onUploadBegin: () => void;
-    onUploadFinished: (result: { ok: boolean; error?: string }) => void;
+    // `cancel` stops the uploads in flight; the modal closes once they begin.
+    onUploadBegin: (cancel: () => void) => void;
+    onUploadFinished: (result: { ok: boolean; error?: string; cancelled?: boolean }) => void;
 };
 
+const CANCELLED_MESSAGE = 'Nalaganje preklicano.';
+
 export default function UploadModal({ open, onClose, onUploadBegin, onUploadFinished }: Props) {
     const auth = useAuth();
 
-    const [file, setFile] = useState<File | null>(null);
+    const [files, setFiles] = useState<File[]>([]);
     const [expiresInDays, setExpiresInDays] = useState<number>(7);
     const [error, setError] = useState<string | null>(null);
     const [submitting, setSubmitting] = useState(false);
+    // Cancels uploads in flight: their requests are aborted and their records aborted or
+    // deleted server-side, so nothing is left to resume or to linger as 'uploading'.
+    const cancelRef = useRef<AbortController | null>(null);
+    // Remounts the file input so a cancelled selection is cleared from it too.
+    const [inputKey, setInputKey] = useState(0);
 
     // Reset transient modal state on open so each upload starts clean.
     useEffect(() => {
         if (!open) return;
 
-        setFile(null);
+        setFiles([]);
         setError(null);
         setSubmitting(false);
         // Intentionally keep expiresInDays as-is to preserve user preference across uploads.
@@ -31,34 +48,110 @@ export default function UploadModal({ open, onClose, onUploadBegin, onUploadFini
     async function onUpload() {
         if (!auth.user?.id_token) return;
 
-        if (!file) {
+        if (files.length === 0) {
             setError('Izberi datoteko.');
             return;
         }
 
         setSubmitting(true);
         setError(null);
+        const cancel = new AbortController();
+        cancelRef.current = cancel;
 
         try {
-            onUploadBegin();
-
-            const init = await initUpload(auth.user.id_token, {
-                originalFileName: file.name,
-                contentType: file.type || 'application/octet-stream',
-                sizeBytes: file.size,
-                expiresInDays,
-            });
-
-            await putObjectToPresignedUrl(init.upload.url, file, init.upload.headers);
+            onUploadBegin(() => cancel.abort());
+
+            const idToken = auth.user.id_token;
+            const requests = [];
+            for (const file of files) {
+                cancel.signal.throwIfAborted();
+                requests.push({
+                    originalFileName: file.name,
+                    contentType: file.type || 'application/octet-stream',
+                    sizeBytes: file.size,
+                    expiresInDays,
+                    sha256: file.size <= CHECKSUM_MAX_BYTES ? await sha256Base64(file) : undefined,
+                });
+            }
+            const init = await initUploads(idToken, requests);
+
+            const failed: string[] = [];
+            const started = init.files.filter(entry => {
+                if (entry.status === 200) return true;
+                failed.push(`${files[entry.index].name}: ${'message' in entry ? entry.message : entry.status}`);
+                return false;
+            }) as (InitUploadResponse & { index: number })[];
+
+            // A few uploads at a time: browsers cap connections per host anyway.
+            const finished = new Set<string>();
+            let next = 0;
+            async function worker(): Promise<void> {
+                while (next < started.length && !cancel.signal.aborted) {
+                    const entry = started[next++];
+                    const file = files[entry.index];
+                    try {
+                        if (entry.upload.method === 'NONE') {
+                            continue; // identical content already uploaded
+                        }
+                        if (entry.upload.method === 'MULTIPART') {
+                            await uploadMultipart(
+                                idToken,
+                                entry.fileId,
+                                file,
+                                entry.upload.partSizeBytes,
+                                entry.upload.partCount,
+                                entry.upload.parts,
+                                undefined,
+                                cancel.signal
+                            );
+                        } else {
+                            await putObjectToPresignedUrl(entry.upload.url, file, entry.upload.headers, cancel.signal);
+                        }
+                        finished.add(entry.fileId);
+                    } catch (e: unknown) {
+                        if (cancel.signal.aborted) continue;
+                        failed.push(`${file.name}: ${e instanceof Error ? e.message : 'upload failed'}`);
+                    }
+                }
+            }
+            await Promise.all(Array.from({ length: Math.min(4, started.length) }, () => worker()));
+
+            if (cancel.signal.aborted) {
+                // Uploads that did not finish (in flight or not yet started) give up their records.
+                // uploadMultipart already aborted the ones it was running; a repeat is a no-op.
+                await Promise.all(
+                    started
+                        .filter(entry => entry.upload.method !== 'NONE' && !finished.has(entry.fileId))
+                        .map(entry =>
+                            (entry.upload.method === 'MULTIPART'
+                                ? abortMultipartUpload(idToken, entry.fileId)
+                                : deleteFile(idToken, entry.fileId)
+                            ).catch(() => undefined)
+                        )
+                );
+                cancel.signal.throwIfAborted();
+            }
+
+            if (failed.length > 0) {
+                throw new Error(failed.join('\n'));
+            }
 
             onUploadFinished({ ok: true });
             onClose();
         } catch (e: unknown) {
+            if (cancel.signal.aborted) {
+                setFiles([]);
+                setInputKey(key => key + 1);
+                setError(CANCELLED_MESSAGE);
+                onUploadFinished({ ok: false, error: CANCELLED_MESSAGE, cancelled: true });
+                return;
+            }
             const msg = e instanceof Error ? e.message : 'Nalaganje ni uspelo';
             setError(msg);
             onUploadFinished({ ok: false, error: msg });
         } finally {
             // Ensure buttons are re-enabled after any attempt (success or failure).
+            cancelRef.current = null;
             setSubmitting(false);
         }
     }
@@ -66,7 +159,7 @@ export default function UploadModal({ open, onClose, onUploadBegin, onUploadFini
     return (
         <Modal open={open} title="Naloži novo" onClose={onClose}>
             <div style={{ display: 'flex', flexDirection: 'column', gap: '0.75rem' }}>
-                <input type="file" onChange={e => setFile(e.target.files?.[0] ?? null)} />
+                <input key={inputKey} type="file" multiple onChange={e => setFiles(Array.from(e.target.files ?? []))} />
 
                 <label>
                     Veljavnost (dni):
@@ -86,7 +179,7 @@ export default function UploadModal({ open, onClose, onUploadBegin, onUploadFini
                     <button onClick={onUpload} disabled={submitting}>
                         Naloži
                     </button>
-                    <button onClick={onClose} disabled={submitting}>
+                    <button onClick={submitting ? () => cancelRef.current?.abort() : onClose}>
                         Prekliči
                     </button>
                 </div>
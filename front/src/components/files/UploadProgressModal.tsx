@@ -4,10 +4,11 @@ type Props = {
     open: boolean;
     done: boolean;
     error?: string | null;
+    onCancel?: () => void;
     onClose: () => void;
 };
 
-export default function UploadProgressModal({ open, done, error, onClose }: Props) {
+export default function UploadProgressModal({ open, done, error, onCancel, onClose }: Props) {
     const title = done ? 'Nalaganje končano' : 'Nalaganje...';
 
     return (
@@ -31,6 +32,11 @@ export default function UploadProgressModal({ open, done, error, onClose }: Prop
                 )}
 
                 <div style={{ display: 'flex', justifyContent: 'flex-end', gap: '0.5rem' }}>
+                    {onCancel && !done && !error && (
+                        <button onClick={onCancel}>
+                            Prekliči
+                        </button>
+                    )}
                     <button onClick={onClose} disabled={!done && !error}>
                         Zapri
                     </button>
@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from 'react';
+import { useEffect, useMemo, useRef, useState } from 'react';
 import { useAuth } from 'react-oidc-context';
 import FilesToolbar from '../components/files/FilesToolbar';
 import FilesTable from '../components/files/FilesTable';
@@ -6,7 +6,7 @@ import type { FileRow } from '../components/files/FilesTable';
 import FileDetailsModal from '../components/files/FileDetailsModal';
 import UploadModal from '../components/files/UploadModal';
 import UploadProgressModal from '../components/files/UploadProgressModal';
-import { listFiles, deleteFile } from '../api/files';
+import { listAllFiles, deleteFiles } from '../api/files';
 
 export default function FilesDashboard() {
     const auth = useAuth();
@@ -47,14 +47,15 @@ export default function FilesDashboard() {
 
     const [uploadDone, setUploadDone] = useState(false);
     const [uploadErr, setUploadErr] = useState<string | null>(null);
+    // Cancels the upload in progress (set by UploadModal when it begins).
+    const cancelUploadRef = useRef<(() => void) | null>(null);
 
     async function refresh() {
         if (!auth.user?.id_token) return;
         setLoading(true);
         setError(null);
         try {
-            const resp = await listFiles(auth.user.id_token);
-            setItems(resp.items ?? []);
+            setItems(await listAllFiles(auth.user.id_token));
             setSelectedIds([]); // reset selection on refresh for simplicity
         } catch (e: unknown) {
             setError(e instanceof Error ? e.message : 'Failed to load files');
@@ -75,10 +76,11 @@ export default function FilesDashboard() {
         setLoading(true);
         setError(null);
         try {
-            for (const id of selectedIds) {
-                await deleteFile(auth.user.id_token, id);
-            }
+            const res = await deleteFiles(auth.user.id_token, selectedIds);
             await refresh();
+            if (res.failed > 0) {
+                setError(`${res.failed} of ${selectedIds.length} files could not be deleted`);
+            }
         } catch (e: unknown) {
             setError(e instanceof Error ? e.message : 'Delete failed');
             setLoading(false);
@@ -137,13 +139,15 @@ export default function FilesDashboard() {
             <UploadModal
                 open={showUpload}
                 onClose={() => setShowUpload(false)}
-                onUploadBegin={() => {
+                onUploadBegin={cancel => {
+                    cancelUploadRef.current = cancel;
                     setShowUpload(false);
                     setUploadDone(false);
                     setUploadErr(null);
                     setShowUploadProgress(true);
                 }}
                 onUploadFinished={async (res) => {
+                    cancelUploadRef.current = null;
                     if (res.ok) {
                         setUploadDone(true);
                         setUploadErr(null);
@@ -151,6 +155,7 @@ export default function FilesDashboard() {
                     } else {
                         setUploadDone(true);
                         setUploadErr(res.error ?? 'Nalaganje ni uspelo');
+                        if (res.cancelled) await refresh(); // drop the rows of cancelled uploads
                     }
                 }}
             />
@@ -159,6 +164,7 @@ export default function FilesDashboard() {
                 open={showUploadProgress}
                 done={uploadDone}
                 error={uploadErr}
+                onCancel={() => cancelUploadRef.current?.()}
                 onClose={() => {
                     setShowUploadProgress(false);
                     void refresh();
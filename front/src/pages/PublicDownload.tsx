@@ -6,6 +6,7 @@ import { getPublicFileMetadata } from '../api/files';
 type UiState =
     | { kind: 'loading' }
     | { kind: 'uploading'; meta: MetaVm }
+    | { kind: 'rejected'; meta: MetaVm }
     | { kind: 'ready'; meta: MetaVm; auto: boolean }
     | { kind: 'password'; meta: MetaVm }
     | { kind: 'expired'; meta?: MetaVm }
@@ -86,6 +87,12 @@ export default function PublicDownload() {
                     return;
                 }
 
+                // Upload failed verification (e.g. truncated); it will never become downloadable.
+                if (status === 'rejected') {
+                    setState({ kind: 'rejected', meta: vm });
+                    return;
+                }
+
 // Not downloadable yet (e.g., uploading)
                 setState({ kind: 'uploading', meta: vm });
             } catch (e: unknown) {
@@ -142,6 +149,15 @@ export default function PublicDownload() {
                     </>
                 )}
 
+                {state.kind === 'rejected' && (
+                    <>
+                        <p className="placeholder">
+                            Nalaganje datoteke ni uspelo preverjanja (velikost se ne ujema). Datoteka ni na voljo.
+                        </p>
+                        {renderMeta(state.meta)}
+                    </>
+                )}
+
                 {state.kind === 'ready' && (
                     <>
                         <p>